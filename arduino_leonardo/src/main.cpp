@@ -5,6 +5,7 @@
 #include <Arduino.h>
 #include <Mouse.h>
 #include <Keyboard.h>
+#include <HID.h>
 
 // ===== LED de Status =====
 #if defined(RXLED0) && defined(RXLED1)
@@ -47,239 +48,635 @@ void ledUpdate(unsigned long now) {
   }
 }
 
-// ===== Setup =====
-void setup() {
-#if !USE_RX_LED
-  pinMode(LED_PIN, OUTPUT);
-#endif
-  ledSolidOff();
+// ===== Ponteiro Absoluto (HID) =====
+// Segundo dispositivo de mouse no mesmo USB, com X/Y absolutos 0..32767:
+// o Windows mapeia a faixa inteira para a tela principal, então um único
+// relatório posiciona o cursor exatamente, qualquer que seja a distância.
+// Os cliques continuam pelo Mouse.h (relativo), na posição atual do cursor.
+const uint8_t ABS_REPORT_ID = 3;  // Mouse.h usa 1, Keyboard.h usa 2
+const int16_t ABS_MAX = 32767;
+
+static const uint8_t absPointerDescriptor[] PROGMEM = {
+  0x05, 0x01,              // Usage Page (Generic Desktop)
+  0x09, 0x02,              // Usage (Mouse)
+  0xA1, 0x01,              // Collection (Application)
+  0x85, ABS_REPORT_ID,     //   Report ID
+  0x09, 0x01,              //   Usage (Pointer)
+  0xA1, 0x00,              //   Collection (Physical)
+  0x05, 0x09,              //     Usage Page (Button)
+  0x19, 0x01,              //     Usage Minimum (1)
+  0x29, 0x03,              //     Usage Maximum (3)
+  0x15, 0x00,              //     Logical Minimum (0)
+  0x25, 0x01,              //     Logical Maximum (1)
+  0x95, 0x03,              //     Report Count (3)
+  0x75, 0x01,              //     Report Size (1)
+  0x81, 0x02,              //     Input (Data, Var, Abs)
+  0x95, 0x01,              //     Report Count (1)
+  0x75, 0x05,              //     Report Size (5)
+  0x81, 0x03,              //     Input (Const) - padding
+  0x05, 0x01,              //     Usage Page (Generic Desktop)
+  0x09, 0x30,              //     Usage (X)
+  0x09, 0x31,              //     Usage (Y)
+  0x16, 0x00, 0x00,        //     Logical Minimum (0)
+  0x26, 0xFF, 0x7F,        //     Logical Maximum (32767)
+  0x75, 0x10,              //     Report Size (16)
+  0x95, 0x02,              //     Report Count (2)
+  0x81, 0x02,              //     Input (Data, Var, Abs)
+  0xC0,                    //   End Collection
+  0xC0                     // End Collection
+};
+
+class AbsPointer_ {
+public:
+  AbsPointer_() {
+    // Registrado no construtor global, antes da enumeração USB (igual ao Mouse.h)
+    static HIDSubDescriptor node(absPointerDescriptor, sizeof(absPointerDescriptor));
+    HID().AppendDescriptor(&node);
+  }
 
-  Serial.begin(115200);
-  Serial.setTimeout(100);
-  delay(1200);  // Aguarda enumeração USB no Windows
+  void moveTo(int16_t x, int16_t y) {
+    uint8_t report[5] = {
+      0,  // Botões (cliques ficam com o Mouse.h)
+      (uint8_t)(x & 0xFF), (uint8_t)(x >> 8),
+      (uint8_t)(y & 0xFF), (uint8_t)(y >> 8)
+    };
+    HID().SendReport(ABS_REPORT_ID, report, sizeof(report));
+  }
+};
+AbsPointer_ AbsPointer;
+
+// ===== Fila de Passos HID =====
+// Cada comando vira uma sequência de passos curtos (apertar, soltar, esperar...)
+// executados por uma máquina de estados baseada em millis(), sem delay():
+// o loop continua lendo a serial enquanto um clique ou tecla está pressionado.
+// O OK é enviado quando o comando entra na fila; fila cheia -> "ERR FULL".
+// Duas filas independentes: a principal (tudo) e a de prioridade (só toques de
+// tecla marcados com "!", ex: cura), que não espera as pausas da principal.
+enum : uint8_t {
+  STEP_MOVE,         // a = dx, b = dy
+  STEP_MOVE_ABS,     // a = x, b = y (0..ABS_MAX)
+  STEP_BTN_PRESS,    // a = botão
+  STEP_BTN_RELEASE,  // a = botão
+  STEP_KEY_PRESS,    // a = tecla
+  STEP_KEY_RELEASE,  // a = tecla
+  STEP_RELEASE_ALL,
+  STEP_WRITE,        // a = caractere, b = espera depois (ms)
+  STEP_WAIT,         // a = ms
+  STEP_BUSY          // a = 1 running / 0 idle
+};
+
+struct Step {
+  uint8_t op;
+  int16_t a;
+  int16_t b;
+};
+
+struct StepQueue {
+  Step* steps;
+  uint8_t len;
+  uint8_t head;                     // Próximo passo a executar
+  uint8_t tail;                     // Próxima posição livre
+  uint8_t count;
+  unsigned long waitStart;
+  unsigned long waitMs;
+};
+
+const uint8_t STEP_QUEUE_LEN = 64;    // 64 x 5 bytes de RAM
+const uint8_t URGENT_QUEUE_LEN = 12;  // 4 toques de tecla (apertar, esperar, soltar)
+Step mainSteps[STEP_QUEUE_LEN];
+Step urgentSteps[URGENT_QUEUE_LEN];
+StepQueue mainQueue = { mainSteps, STEP_QUEUE_LEN, 0, 0, 0, 0, 0 };
+StepQueue urgentQueue = { urgentSteps, URGENT_QUEUE_LEN, 0, 0, 0, 0, 0 };
+
+// Enfileiramento atômico: um comando entra inteiro ou não entra
+StepQueue* cmdQueue = &mainQueue;  // Fila do comando em montagem (push escreve nela)
+uint8_t cmdTail = 0;
+uint8_t cmdCount = 0;
+bool cmdOverflow = false;
+
+void beginCmd(StepQueue* q = &mainQueue) {
+  cmdQueue = q;
+  cmdTail = q->tail;
+  cmdCount = q->count;
+  cmdOverflow = false;
+}
 
-  Mouse.begin();
-  Keyboard.begin();
+void push(uint8_t op, int16_t a = 0, int16_t b = 0) {
+  StepQueue* q = cmdQueue;
+  if (q->count >= q->len) { cmdOverflow = true; return; }
+  q->steps[q->tail] = { op, a, b };
+  q->tail = (q->tail + 1) % q->len;
+  q->count++;
+}
 
-  Serial.println(F("READY"));
+void cancelCmd() {
+  cmdQueue->tail = cmdTail;  // Desfaz os passos parciais
+  cmdQueue->count = cmdCount;
 }
 
-// ===== Loop Principal =====
-void loop() {
-  ledUpdate(millis());
-
-  if (!Serial.available()) return;
-
-  String line = Serial.readStringUntil('\n');
-  line.trim();
-  if (line.length() == 0) return;
-
-  // ===== PROTOCOLO DE COMANDOS =====
-  // B1 / B0          -> Define estado (running/idle) e LED
-  // M dx dy          -> Move mouse relativo [-127..127]
-  // MA x y           -> Move mouse absoluto (0-65535)
-  // CL               -> Clique esquerdo
-  // CR               -> Clique direito
-  // CM               -> Clique do meio
-  // CD               -> Duplo clique esquerdo
-  // AC               -> Alt + clique esquerdo
-  // K <KEY>          -> Pressiona tecla especial
-  // KT <key>         -> Pressiona tecla ASCII simples
-  // T <texto>        -> Digita texto ASCII
-  // P <mods> <key>   -> Pressiona combinação (ex: P CTRL a)
-  // S <ms>           -> Sleep/delay em milissegundos
+bool commitCmd() {
+  if (!cmdOverflow) return true;
+  cancelCmd();
+  return false;
+}
 
-  // ===== Estado LED =====
-  if (line == "B1") {
-    running = true;
-    ledSolidOn();
-    Serial.println(F("OK"));
-    return;
-  }
-  if (line == "B0") {
-    running = false;
-    ledSolidOff();
-    Serial.println(F("OK"));
-    return;
+void runSteps(StepQueue* q, unsigned long now) {
+  while (q->count > 0) {
+    if (now - q->waitStart < q->waitMs) return;  // Ainda esperando
+    q->waitMs = 0;
+
+    Step s = q->steps[q->head];
+    q->head = (q->head + 1) % q->len;
+    q->count--;
+
+    switch (s.op) {
+      case STEP_MOVE:        Mouse.move((int8_t)s.a, (int8_t)s.b, 0); break;
+      case STEP_MOVE_ABS:    AbsPointer.moveTo(s.a, s.b); break;
+      case STEP_BTN_PRESS:   Mouse.press((uint8_t)s.a); break;
+      case STEP_BTN_RELEASE: Mouse.release((uint8_t)s.a); break;
+      case STEP_KEY_PRESS:   Keyboard.press((uint8_t)s.a); break;
+      case STEP_KEY_RELEASE: Keyboard.release((uint8_t)s.a); break;
+      case STEP_RELEASE_ALL: Keyboard.releaseAll(); break;
+      case STEP_WRITE:
+        Keyboard.write((uint8_t)s.a);
+        q->waitStart = now;
+        q->waitMs = s.b;
+        break;
+      case STEP_WAIT:
+        q->waitStart = now;
+        q->waitMs = s.a;
+        break;
+      case STEP_BUSY:
+        running = (s.a != 0);
+        if (running) ledSolidOn(); else ledSolidOff();
+        break;
+    }
   }
+}
 
-  // ===== Movimento Mouse =====
-  // Movimento relativo
-  if (line.startsWith("M ")) {
-    int sp = line.indexOf(' ', 2);
-    if (sp <= 2) { Serial.println(F("ERR M")); return; }
+// ===== Ações HID (compartilhadas pelos modos texto e binário) =====
+void queueMove(int dx, int dy) {
+  push(STEP_MOVE, clamp(dx, -127, 127), clamp(dy, -127, 127));
+}
 
-    int dx = line.substring(2, sp).toInt();
-    int dy = line.substring(sp + 1).toInt();
-    dx = clamp(dx, -127, 127);
-    dy = clamp(dy, -127, 127);
+bool queueMoveAbs(long x, long y) {
+  if (x < 0 || x > ABS_MAX || y < 0 || y > ABS_MAX) return false;
+  push(STEP_MOVE_ABS, (int16_t)x, (int16_t)y);
+  return true;
+}
 
-    Mouse.move((int8_t)dx, (int8_t)dy, 0);
-    Serial.println(F("OK"));
-    return;
+void queueClick(uint8_t button) {
+  push(STEP_BTN_PRESS, button);
+  push(STEP_WAIT, 50);
+  push(STEP_BTN_RELEASE, button);
+}
+
+void queueDoubleClick() {
+  push(STEP_BTN_PRESS, MOUSE_LEFT);
+  push(STEP_BTN_RELEASE, MOUSE_LEFT);
+  push(STEP_WAIT, 50);
+  push(STEP_BTN_PRESS, MOUSE_LEFT);
+  push(STEP_BTN_RELEASE, MOUSE_LEFT);
+}
+
+void queueAltClick() {
+  push(STEP_KEY_PRESS, KEY_LEFT_ALT);
+  push(STEP_WAIT, 10);
+  queueClick(MOUSE_LEFT);
+  push(STEP_KEY_RELEASE, KEY_LEFT_ALT);
+}
+
+void queueKeyTap(uint8_t k, int holdMs) {
+  push(STEP_KEY_PRESS, k);
+  push(STEP_WAIT, holdMs);
+  push(STEP_KEY_RELEASE, k);
+}
+
+// Modificadores: 1 = CTRL, 2 = SHIFT, 4 = ALT, 8 = GUI
+void queueCombo(uint8_t mods, uint8_t key) {
+  if (mods & 1) push(STEP_KEY_PRESS, KEY_LEFT_CTRL);
+  if (mods & 2) push(STEP_KEY_PRESS, KEY_LEFT_SHIFT);
+  if (mods & 4) push(STEP_KEY_PRESS, KEY_LEFT_ALT);
+  if (mods & 8) push(STEP_KEY_PRESS, KEY_LEFT_GUI);
+  push(STEP_WAIT, 10);
+  if (key) push(STEP_KEY_PRESS, key);
+  push(STEP_WAIT, 50);
+  push(STEP_RELEASE_ALL);
+}
+
+void queueText(const char* txt) {
+  for (; *txt; txt++) push(STEP_WRITE, (uint8_t)*txt, 2);
+}
+
+void queueBusy(bool on) {
+  push(STEP_BUSY, on ? 1 : 0);
+}
+
+// ===== Protocolo Binário (opcional) =====
+// Ativado pelo comando de texto "BIN"; OP_TEXT_MODE volta ao modo texto.
+// Frame host -> placa (8 bytes):
+//   A5 | seq | opcode | arg0 (int16 LE) | arg1 (int16 LE) | xor(seq..arg1)
+// Resposta placa -> host (3 bytes):
+//   5A | seq | status (0 = OK)
+// Opcode com o bit OP_PRIORITY (só OP_KEY_TAP) vai para a fila de prioridade.
+const uint8_t BIN_SYNC = 0xA5;
+const uint8_t BIN_ACK = 0x5A;
+const uint8_t BIN_FRAME_LEN = 8;
+
+enum : uint8_t {
+  OP_PING = 0x00,
+  OP_MOVE = 0x01,         // arg0 = dx, arg1 = dy
+  OP_MOVE_ABS = 0x02,     // arg0 = x, arg1 = y (0..32767)
+  OP_CLICK = 0x03,        // arg0 = botão (1 esq, 2 dir, 4 meio)
+  OP_DOUBLE_CLICK = 0x04,
+  OP_ALT_CLICK = 0x05,
+  OP_KEY_TAP = 0x06,      // arg0 = tecla (ASCII ou KEY_*), arg1 = tempo pressionada (ms)
+  OP_BUSY = 0x07,         // arg0 = 1 running / 0 idle
+  OP_SLEEP = 0x08,        // arg0 = ms
+  OP_COMBO = 0x09,        // arg0 = modificadores, arg1 = tecla
+  OP_TEXT_MODE = 0x7F,
+  OP_PRIORITY = 0x80      // Bit somado ao opcode: fila de prioridade
+};
+
+enum : uint8_t {
+  ST_OK = 0,
+  ST_BAD_CHECKSUM = 1,
+  ST_BAD_OP = 2,
+  ST_BAD_ARG = 3,
+  ST_FULL = 4
+};
+
+bool binaryMode = false;
+uint8_t frame[BIN_FRAME_LEN];
+uint8_t frameLen = 0;
+
+void sendAck(uint8_t seq, uint8_t status) {
+  uint8_t ack[3] = { BIN_ACK, seq, status };
+  Serial.write(ack, 3);
+}
+
+uint8_t runFrame(uint8_t op, int16_t a, int16_t b) {
+  if (op & OP_PRIORITY) {
+    op &= ~OP_PRIORITY;
+    if (op != OP_KEY_TAP) return ST_BAD_OP;
+    beginCmd(&urgentQueue);
+  } else {
+    beginCmd(&mainQueue);
   }
+  switch (op) {
+    case OP_PING:
+      break;
+    case OP_MOVE_ABS:
+      if (!queueMoveAbs(a, b)) return ST_BAD_ARG;
+      break;
+    case OP_MOVE:
+      queueMove(a, b);
+      break;
+    case OP_CLICK:
+      if (a != MOUSE_LEFT && a != MOUSE_RIGHT && a != MOUSE_MIDDLE) return ST_BAD_ARG;
+      queueClick((uint8_t)a);
+      break;
+    case OP_DOUBLE_CLICK:
+      queueDoubleClick();
+      break;
+    case OP_ALT_CLICK:
+      queueAltClick();
+      break;
+    case OP_KEY_TAP:
+      if (a <= 0 || a > 255 || b < 0 || b > 1000) return ST_BAD_ARG;
+      queueKeyTap((uint8_t)a, b);
+      break;
+    case OP_BUSY:
+      queueBusy(a != 0);
+      break;
+    case OP_SLEEP:
+      if (a <= 0 || a > 10000) return ST_BAD_ARG;
+      push(STEP_WAIT, a);
+      break;
+    case OP_COMBO:
+      queueCombo((uint8_t)a, (uint8_t)b);
+      break;
+    case OP_TEXT_MODE:
+      binaryMode = false;
+      break;
+    default:
+      return ST_BAD_OP;
+  }
+  return commitCmd() ? ST_OK : ST_FULL;
+}
 
-  // Movimento absoluto (MA x y) - Usa PyAutoGUI do lado Python
-  // Arduino apenas confirma - o movimento é feito pelo Python
-  if (line.startsWith("MA ")) {
-    // Apenas confirma - Python usa PyAutoGUI para mover
-    Serial.println(F("OK"));
-    return;
+// Lê bytes disponíveis sem bloquear; enfileira quando um frame completo chega
+void pollBinary() {
+  while (Serial.available()) {
+    uint8_t c = (uint8_t)Serial.read();
+    if (frameLen == 0 && c != BIN_SYNC) continue;  // Ressincroniza no byte A5
+    frame[frameLen++] = c;
+    if (frameLen < BIN_FRAME_LEN) continue;
+    frameLen = 0;
+
+    uint8_t check = 0;
+    for (uint8_t i = 1; i < BIN_FRAME_LEN - 1; i++) check ^= frame[i];
+    uint8_t seq = frame[1];
+    if (check != frame[BIN_FRAME_LEN - 1]) { sendAck(seq, ST_BAD_CHECKSUM); continue; }
+
+    int16_t a = (int16_t)(frame[3] | (frame[4] << 8));
+    int16_t b = (int16_t)(frame[5] | (frame[6] << 8));
+    sendAck(seq, runFrame(frame[2], a, b));
+    if (!binaryMode) return;
   }
+}
 
-  // ===== Cliques Mouse =====
-  if (line == "CL") {
-    Mouse.press(MOUSE_LEFT);
-    delay(50);
-    Mouse.release(MOUSE_LEFT);
-    Serial.println(F("OK"));
-    return;
+// ===== Protocolo de Texto =====
+// Linha montada byte a byte em buffer fixo (sem String, sem readStringUntil)
+const uint8_t LINE_MAX = 96;  // Espaço para macros "X ..."
+char lineBuf[LINE_MAX];
+uint8_t lineLen = 0;
+bool lineOverflow = false;
+
+// Pula espaços; retorna o início do próximo token
+const char* skipSpaces(const char* p) {
+  while (*p == ' ') p++;
+  return p;
+}
+
+// Compara o comando (primeiro token) sem copiar a linha
+bool isCmd(const char* line, const char* name) {
+  size_t n = strlen(name);
+  return strncmp(line, name, n) == 0 && (line[n] == ' ' || line[n] == '\0');
+}
+
+uint8_t keyFromName(const char* key) {
+  if (!strcmp(key, "ENTER")) return KEY_RETURN;
+  if (!strcmp(key, "ESC")) return KEY_ESC;
+  if (!strcmp(key, "TAB")) return KEY_TAB;
+  if (!strcmp(key, "SPACE")) return ' ';
+  if (!strcmp(key, "BKSP")) return KEY_BACKSPACE;
+  if (!strcmp(key, "DEL")) return KEY_DELETE;
+  if (!strcmp(key, "UP")) return KEY_UP_ARROW;
+  if (!strcmp(key, "DOWN")) return KEY_DOWN_ARROW;
+  if (!strcmp(key, "LEFT")) return KEY_LEFT_ARROW;
+  if (!strcmp(key, "RIGHT")) return KEY_RIGHT_ARROW;
+  if (!strcmp(key, "HOME")) return KEY_HOME;
+  if (!strcmp(key, "END")) return KEY_END;
+  if (!strcmp(key, "PGUP")) return KEY_PAGE_UP;
+  if (!strcmp(key, "PGDN")) return KEY_PAGE_DOWN;
+  if (key[0] == 'F' && key[1] >= '1' && key[1] <= '9') {
+    int n = atoi(key + 1);  // F1..F12 são consecutivos no Keyboard.h
+    if (n >= 1 && n <= 12) return KEY_F1 + (n - 1);
   }
+  return 0;
+}
 
-  if (line == "CR") {
-    Mouse.press(MOUSE_RIGHT);
-    delay(50);
-    Mouse.release(MOUSE_RIGHT);
-    Serial.println(F("OK"));
-    return;
+// ===== PROTOCOLO DE COMANDOS =====
+// B1 / B0          -> Define estado (running/idle) e LED
+// M dx dy          -> Move mouse relativo [-127..127]
+// MA x y           -> Move mouse absoluto [0..32767] (escala da tela principal)
+// CL               -> Clique esquerdo
+// CR               -> Clique direito
+// CM               -> Clique do meio
+// CD               -> Duplo clique esquerdo
+// AC               -> Alt + clique esquerdo
+// K <KEY>          -> Pressiona tecla especial
+// KT <key>         -> Pressiona tecla ASCII simples
+// T <texto>        -> Digita texto ASCII
+// P <mods> <key>   -> Pressiona combinação (ex: P CTRL a)
+// S <ms>           -> Pausa de <ms> milissegundos entre os comandos da fila
+//                     (segura TUDO o que chegar depois: pausas longas ficam no host)
+// X <cmd>;<cmd>... -> Macro: vários comandos acima de uma vez (ex: X KT 2;S 50;CL)
+// !K <KEY> / !KT <key> -> Tecla pela fila de prioridade (não espera a fila principal)
+// BIN              -> Passa para o protocolo binário (frames de 8 bytes)
+// CAPS             -> Lista os comandos suportados ("OK B1 B0 M MA ...")
+// #<n> <cmd>       -> Qualquer comando acima com id 0..255: a resposta volta com
+//                     o mesmo id ("#7 OK", "#7 ERR KT") - capacidade SEQ
+//
+// Resposta: OK (comando na fila), ERR <cmd> (argumento inválido),
+//           ERR FULL (fila cheia), ERR CMD (comando desconhecido)
+typedef const __FlashStringHelper* CmdError;
+
+int16_t replyTag = -1;  // Id "#<n>" da linha atual (-1 = sem id)
+
+void reply(CmdError msg) {
+  if (replyTag >= 0) {
+    Serial.print('#');
+    Serial.print(replyTag);
+    Serial.print(' ');
   }
+  Serial.println(msg);
+}
 
-  if (line == "CM") {
-    Mouse.press(MOUSE_MIDDLE);
-    delay(50);
-    Mouse.release(MOUSE_MIDDLE);
-    Serial.println(F("OK"));
-    return;
+// Enfileira os passos de UM comando; retorna NULL ou a mensagem de erro
+CmdError parseCommand(char* line) {
+  // ===== Estado LED =====
+  if (!strcmp(line, "B1") || !strcmp(line, "B0")) {
+    queueBusy(line[1] == '1');
+    return NULL;
   }
 
-  if (line == "CD") {
-    Mouse.click(MOUSE_LEFT);
-    delay(50);
-    Mouse.click(MOUSE_LEFT);
-    Serial.println(F("OK"));
-    return;
+  // ===== Movimento Mouse =====
+  // Movimento relativo
+  if (isCmd(line, "M")) {
+    const char* arg = skipSpaces(line + 1);
+    char* end;
+    long dx = strtol(arg, &end, 10);
+    if (end == arg) return F("ERR M");
+    arg = end;
+    long dy = strtol(arg, &end, 10);
+    if (end == arg) return F("ERR M");
+    queueMove((int)constrain(dx, -127L, 127L), (int)constrain(dy, -127L, 127L));
+    return NULL;
   }
 
-  // ===== Alt + Clique =====
-  if (line == "AC") {
-    Keyboard.press(KEY_LEFT_ALT);
-    delay(10);
-    Mouse.press(MOUSE_LEFT);
-    delay(50);
-    Mouse.release(MOUSE_LEFT);
-    Keyboard.release(KEY_LEFT_ALT);
-    Serial.println(F("OK"));
-    return;
+  // Movimento absoluto (MA x y) - ponteiro HID absoluto
+  if (isCmd(line, "MA")) {
+    const char* arg = skipSpaces(line + 2);
+    char* end;
+    long x = strtol(arg, &end, 10);
+    if (end == arg) return F("ERR MA");
+    arg = end;
+    long y = strtol(arg, &end, 10);
+    if (end == arg || !queueMoveAbs(x, y)) return F("ERR MA");
+    return NULL;
   }
 
+  // ===== Cliques Mouse =====
+  if (!strcmp(line, "CL")) { queueClick(MOUSE_LEFT); return NULL; }
+  if (!strcmp(line, "CR")) { queueClick(MOUSE_RIGHT); return NULL; }
+  if (!strcmp(line, "CM")) { queueClick(MOUSE_MIDDLE); return NULL; }
+  if (!strcmp(line, "CD")) { queueDoubleClick(); return NULL; }
+
+  // ===== Alt + Clique =====
+  if (!strcmp(line, "AC")) { queueAltClick(); return NULL; }
+
   // ===== Teclas Especiais =====
-  if (line.startsWith("K ")) {
-    String key = line.substring(2);
-    key.trim();
-    uint8_t k = 0;
-
-    if (key == "ENTER") k = KEY_RETURN;
-    else if (key == "ESC") k = KEY_ESC;
-    else if (key == "TAB") k = KEY_TAB;
-    else if (key == "SPACE") k = ' ';
-    else if (key == "BKSP") k = KEY_BACKSPACE;
-    else if (key == "DEL") k = KEY_DELETE;
-    else if (key == "UP") k = KEY_UP_ARROW;
-    else if (key == "DOWN") k = KEY_DOWN_ARROW;
-    else if (key == "LEFT") k = KEY_LEFT_ARROW;
-    else if (key == "RIGHT") k = KEY_RIGHT_ARROW;
-    else if (key == "HOME") k = KEY_HOME;
-    else if (key == "END") k = KEY_END;
-    else if (key == "PGUP") k = KEY_PAGE_UP;
-    else if (key == "PGDN") k = KEY_PAGE_DOWN;
-    else if (key == "F1") k = KEY_F1;
-    else if (key == "F2") k = KEY_F2;
-    else if (key == "F3") k = KEY_F3;
-    else if (key == "F4") k = KEY_F4;
-    else if (key == "F5") k = KEY_F5;
-    else if (key == "F6") k = KEY_F6;
-    else if (key == "F7") k = KEY_F7;
-    else if (key == "F8") k = KEY_F8;
-    else if (key == "F9") k = KEY_F9;
-    else if (key == "F10") k = KEY_F10;
-    else if (key == "F11") k = KEY_F11;
-    else if (key == "F12") k = KEY_F12;
-
-    if (k == 0) { Serial.println(F("ERR K")); return; }
-
-    Keyboard.press(k);
-    delay(10);
-    Keyboard.release(k);
-    Serial.println(F("OK"));
-    return;
+  if (isCmd(line, "K")) {
+    uint8_t k = keyFromName(skipSpaces(line + 1));
+    if (k == 0) return F("ERR K");
+    queueKeyTap(k, 10);
+    return NULL;
   }
 
   // ===== Tecla ASCII Simples (KT) =====
-  if (line.startsWith("KT ")) {
-    String key = line.substring(3);
-    key.trim();
-    if (key.length() > 0) {
-      Keyboard.press(key[0]);
-      delay(50);
-      Keyboard.release(key[0]);
-      Serial.println(F("OK"));
-      return;
-    }
-    Serial.println(F("ERR KT"));
-    return;
+  if (isCmd(line, "KT")) {
+    const char* key = skipSpaces(line + 2);
+    if (*key == '\0') return F("ERR KT");
+    queueKeyTap((uint8_t)key[0], 50);
+    return NULL;
   }
 
   // ===== Digitar Texto =====
-  if (line.startsWith("T ")) {
-    String txt = line.substring(2);
-    for (size_t i = 0; i < txt.length(); i++) {
-      Keyboard.write((uint8_t)txt[i]);
-      delay(2);
-    }
-    Serial.println(F("OK"));
-    return;
+  if (isCmd(line, "T")) {
+    queueText(line[1] ? line + 2 : line + 1);
+    return NULL;
   }
 
   // ===== Combinação de Teclas =====
-  if (line.startsWith("P ")) {
+  if (isCmd(line, "P")) {
     // Formato: P CTRL a  ou  P CTRL+SHIFT s
-    int sp = line.indexOf(' ', 2);
-    if (sp <= 2) { Serial.println(F("ERR P")); return; }
-    
-    String mods = line.substring(2, sp);
-    String key = line.substring(sp + 1);
-    key.trim();
-    
-    // Pressiona modificadores
-    if (mods.indexOf("CTRL") >= 0) Keyboard.press(KEY_LEFT_CTRL);
-    if (mods.indexOf("SHIFT") >= 0) Keyboard.press(KEY_LEFT_SHIFT);
-    if (mods.indexOf("ALT") >= 0) Keyboard.press(KEY_LEFT_ALT);
-    if (mods.indexOf("GUI") >= 0 || mods.indexOf("WIN") >= 0) Keyboard.press(KEY_LEFT_GUI);
-    
-    delay(10);
-    
-    // Pressiona tecla principal
-    if (key.length() == 1) {
-      Keyboard.press(key[0]);
-    }
-    
-    delay(50);
-    Keyboard.releaseAll();
-    Serial.println(F("OK"));
-    return;
+    char* mods = (char*)skipSpaces(line + 1);
+    char* key = strchr(mods, ' ');
+    if (key == NULL || key == mods) return F("ERR P");
+    *key++ = '\0';
+    key = (char*)skipSpaces(key);
+
+    uint8_t modMask = 0;
+    if (strstr(mods, "CTRL")) modMask |= 1;
+    if (strstr(mods, "SHIFT")) modMask |= 2;
+    if (strstr(mods, "ALT")) modMask |= 4;
+    if (strstr(mods, "GUI") || strstr(mods, "WIN")) modMask |= 8;
+
+    queueCombo(modMask, (key[0] && !key[1]) ? (uint8_t)key[0] : 0);
+    return NULL;
   }
 
   // ===== Sleep/Delay =====
-  if (line.startsWith("S ")) {
-    int ms = line.substring(2).toInt();
-    if (ms > 0 && ms <= 10000) {
-      delay(ms);
-      Serial.println(F("OK"));
-      return;
+  if (isCmd(line, "S")) {
+    long ms = atol(line + 1);
+    if (ms <= 0 || ms > 10000) return F("ERR S");
+    push(STEP_WAIT, (int16_t)ms);
+    return NULL;
+  }
+
+  return F("ERR CMD");
+}
+
+// Macro: cada trecho entre ';' é um comando comum, sem aninhar X nem BIN
+CmdError parseMacro(char* body) {
+  char* part = body;
+  while (part) {
+    char* next = strchr(part, ';');
+    if (next) *next++ = '\0';
+
+    part = (char*)skipSpaces(part);
+    size_t len = strlen(part);
+    while (len > 0 && part[len - 1] == ' ') part[--len] = '\0';
+
+    if (*part) {
+      if (isCmd(part, "X") || !strcmp(part, "BIN")) return F("ERR X");
+      CmdError err = parseCommand(part);
+      if (err) return err;
     }
-    Serial.println(F("ERR S"));
+    part = next;
+  }
+  return NULL;
+}
+
+void handleLine(char* line) {
+  // ===== Id da Resposta =====
+  replyTag = -1;
+  if (line[0] == '#') {
+    char* end;
+    long tag = strtol(line + 1, &end, 10);
+    if (end == line + 1 || tag < 0 || tag > 255) { Serial.println(F("ERR #")); return; }
+    replyTag = (int16_t)tag;
+    line = (char*)skipSpaces(end);
+  }
+
+  // ===== Descoberta de Capacidades =====
+  if (!strcmp(line, "CAPS")) {
+    reply(F("OK B1 B0 M MA ABS CL CR CM CD AC K KT T P S X BIN PRI SEQ"));
     return;
   }
 
-  Serial.println(F("ERR CMD"));
+  // ===== Modo Binário =====
+  if (!strcmp(line, "BIN")) {
+    reply(F("OK"));
+    binaryMode = true;
+    frameLen = 0;
+    return;
+  }
+
+  // Macro ou comando simples: entra inteiro na fila ou é descartado
+  CmdError err;
+  if (line[0] == '!') {
+    // Prioridade: só toques de tecla, executados mesmo com a fila principal em pausa
+    line = (char*)skipSpaces(line + 1);
+    beginCmd(&urgentQueue);
+    err = (isCmd(line, "K") || isCmd(line, "KT")) ? parseCommand(line) : F("ERR !");
+  } else {
+    beginCmd(&mainQueue);
+    err = isCmd(line, "X") ? parseMacro(line + 1) : parseCommand(line);
+  }
+  if (err) {
+    cancelCmd();
+    reply(err);
+    return;
+  }
+
+  if (commitCmd()) reply(F("OK"));
+  else reply(F("ERR FULL"));
+}
+
+// Lê bytes disponíveis sem bloquear; processa a linha ao receber '\n'
+void pollText() {
+  while (Serial.available()) {
+    char c = (char)Serial.read();
+    if (c == '\r') continue;
+    if (c != '\n') {
+      if (lineLen < LINE_MAX - 1) lineBuf[lineLen++] = c;
+      else lineOverflow = true;
+      continue;
+    }
+
+    // Fim de linha: remove espaços nas pontas
+    while (lineLen > 0 && lineBuf[lineLen - 1] == ' ') lineLen--;
+    lineBuf[lineLen] = '\0';
+    char* line = (char*)skipSpaces(lineBuf);
+    bool overflow = lineOverflow;
+    lineLen = 0;
+    lineOverflow = false;
+
+    if (overflow) { Serial.println(F("ERR LONG")); continue; }
+    if (*line == '\0') continue;
+    handleLine(line);
+    if (binaryMode) return;
+  }
+}
+
+// ===== Setup =====
+void setup() {
+#if !USE_RX_LED
+  pinMode(LED_PIN, OUTPUT);
+#endif
+  ledSolidOff();
+
+  Serial.begin(115200);
+  delay(1200);  // Aguarda enumeração USB no Windows
+
+  Mouse.begin();
+  Keyboard.begin();
+
+  Serial.println(F("READY"));
+}
+
+// ===== Loop Principal =====
+// Nunca bloqueia: lê a serial, enfileira e avança a fila de passos
+void loop() {
+  unsigned long now = millis();
+  ledUpdate(now);
+
+  if (binaryMode) pollBinary();
+  else pollText();
+
+  runSteps(&urgentQueue, now);
+  runSteps(&mainQueue, now);
 }
@@ -4,13 +4,30 @@ A22929mazon Cave Bot - Sistema de navegação em caverna com combate inteligente
 Prioridades: Inimigos > Loot > Navegação
 """
 
+import argparse
 import serial
 import time
-import pyautogui as pg
-import os
 import sys
 import numpy as np
-from PIL import Image
+from frame_source import EndOfFrames, FrameSource, ReplaySource, SyntheticSource
+from healing_worker import HealingWorker
+from hp_detection import count_hp_pixels, decide_hp_state, get_hp_lut
+from serial_link import DryRunLink, SerialLink
+import hid_client
+from hid_client import HidClient, screen_to_abs
+from headless import use_virtual_clock
+from templates import TemplateRegistry
+from roi_priors import RoiPriors
+from battle_probe import BattleProbe
+from motion_gate import MotionGate
+from tile_matcher import TiledMatcher
+from session_recorder import RECORD_DIR, SessionRecorder
+from vision import locate_peaks
+
+try:
+    import pyautogui as pg
+except Exception:  # Sem display (Linux headless): só --replay / --synthetic
+    pg = None
 
 # ===========================
 # CONFIGURAÇÕES
@@ -19,16 +36,48 @@ COM_PORT = "COM13"
 BAUD_RATE = 115200
 CONFIDENCE = 0.8
 LOCATE_TIMEOUT = 10.0
+FLAG_CONFIDENCE_LADDER = (0.8, 0.7)      # Flags: confidence normal, depois menor
+BATTLE_CONFIDENCE_LADDER = (0.50, 0.40)  # Borda de batalha: normal, depois ULTRA baixa
+MATCH_WORKERS = 0  # Threads para buscar vários templates no mesmo frame (0 = sequencial)
+CLICK_SETTLE_MS = 20  # Pausa entre posicionar o ponteiro absoluto e clicar (hover no jogo)
+BINARY_PROTOCOL = False  # Frames binários de 8 bytes em vez de texto (firmware com "BIN")
+CAPTURE_FPS = 20         # Thread de captura contínua (0 = screenshot na hora, no próprio tick)
+MAX_DECISION_AGE = 0.5   # Não age (clica) com base num frame mais velho que isso (s)
+RECORD_SESSION = False   # Grava frames, detecções e comandos em recordings/ (ou --record)
 
 # Sistema de healing
 HEALING_ENABLED = False
 HP_REGION = (9, 7, 497, 7)  # Região da barra de HP
+HEALING_HZ = 20.0  # Amostragem do HP pela thread de healing (vezes por segundo)
+
+if pg is not None:
+    # Desabilita o failsafe do PyAutoGUI
+    pg.FAILSAFE = False
+    
+    # Define velocidade do mouse (máxima)
+    pg.PAUSE = 0.001  # EXTREMAMENTE RÁPIDO - quase instantâneo
+
+# Fonte de frames: 1 screenshot por tick compartilhado por todos os detectores
+frames = FrameSource(fps=CAPTURE_FPS)
+
+# Templates pré-carregados (enemy/, loot/, flags/, healings/) - preenchido no main_loop
+TEMPLATES = TemplateRegistry()
+
+# Região de busca aprendida por template (minimapa, área de jogo, lista de batalha)
+ROI = RoiPriors()
+
+# Estado de batalha por pixels do slot da lista de batalha (calibrado pelos battle_*.png)
+PROBE = BattleProbe(frames)
 
-# Desabilita o failsafe do PyAutoGUI
-pg.FAILSAFE = False
+# Detecção de inimigos só nas áreas do frame que mudaram desde o tick anterior
+GATE = MotionGate()
 
-# Define velocidade do mouse (máxima)
-pg.PAUSE = 0.001  # EXTREMAMENTE RÁPIDO - quase instantâneo
+# Mapas de correlação em cache, refeitos só nos tiles que mudaram - criados no main_loop
+ENEMY_TILES = None
+LOOT_TILES = None
+
+# Gravação da sessão (frames reduzidos + detecções + comandos) - criada no main se ativada
+RECORDER = None
 
 # ===========================
 # ESTRUTURA DE ROTAS
@@ -81,16 +130,29 @@ LOOT_CHECK_TIME = 1.3  # Tempo para verificar loot após combate (reduzido de 1.
 # FUNÇÕES DE COMUNICAÇÃO SERIAL
 # ===========================
 
-def send_command(ser, cmd):
-    """Envia comando para Arduino e aguarda resposta OK"""
-    try:
-        ser.write(f"{cmd}\n".encode('utf-8'))
-        ser.flush()
-        time.sleep(0.1)
+def send_command(ser, cmd, wait=True):
+    """
+    Envia comando para Arduino pelo HidClient (serial compartilhada com a thread de healing)
+    wait=True aguarda o OK do firmware (round trip USB real, sem sleep fixo)
+    wait=False apenas enfileira (fire and forget)
+    """
+    if not wait:
+        ser.send(cmd, wait=False)
         return True
-    except Exception as e:
-        print(f"[ERRO] Falha ao enviar comando: {e}")
+    if not ser.send(cmd):
+        print(f"[ERRO] Falha ao enviar comando: {cmd}")
         return False
+    return True
+
+def send_macro(ser, steps, wait=True):
+    """
+    Envia vários comandos como UMA macro (ex: ["KT 2", "S 1500", "KT 2"])
+    wait=True retorna só depois da macro terminar no Arduino
+    """
+    if not ser.macro(steps, wait=wait):
+        print(f"[ERRO] Falha ao enviar macro: {';'.join(steps)}")
+        return False
+    return True
 
 def wait_exact(seconds, description=""):
     """Espera exata com descrição opcional"""
@@ -99,11 +161,18 @@ def wait_exact(seconds, description=""):
     time.sleep(seconds)
 
 def move_mouse(ser, x, y):
-    """Move o mouse para posição absoluta usando PyAutoGUI"""
+    """
+    Move o mouse para posição absoluta
+    Firmware com ponteiro absoluto (ABS): UM comando MA, tempo constante
+    Sem ABS: PyAutoGUI
+    """
+    if ser.supports("ABS"):
+        if ser.move_abs(x, y, frames.screen_size()):
+            return True
+        print(f"[ERRO] Falha ao mover mouse para ({x},{y})")
+        return False
     try:
         pg.moveTo(x, y, duration=0.1)
-        # Envia comando ao Arduino apenas para sincronizar
-        send_command(ser, f"MA {x} {y}")
         return True
     except Exception as e:
         print(f"[ERRO] Falha ao mover mouse: {e}")
@@ -118,28 +187,31 @@ def right_click_mouse(ser):
     return send_command(ser, "CR")
 
 def click_at_position(ser, x, y, right_click=False):
-    """Move e clica em uma posição (esquerdo ou direito)"""
+    """Move e clica em uma posição (esquerdo ou direito) - posição + pausa + clique numa macro"""
     print(f"[MOUSE] Movendo para ({x},{y})")
-    if move_mouse(ser, x, y):
-        time.sleep(0.1)
-        if right_click:
-            if send_command(ser, "CR"):
-                print(f"[MOUSE] Clique DIREITO executado em ({x},{y})")
-                return True
-        else:
-            if click_mouse(ser):
-                print(f"[MOUSE] Clique ESQUERDO executado em ({x},{y})")
-                return True
+    button = "CR" if right_click else "CL"
+    if ser.supports("ABS"):
+        ax, ay = screen_to_abs(x, y, frames.screen_size())
+        steps = [f"MA {ax} {ay}", f"S {CLICK_SETTLE_MS}", button]
+    else:
+        try:
+            pg.moveTo(x, y, duration=0.1)
+        except Exception as e:
+            print(f"[ERRO] Falha ao mover mouse: {e}")
+            return False
+        steps = ["S 100", button]
+    if send_macro(ser, steps):
+        print(f"[MOUSE] Clique {'DIREITO' if right_click else 'ESQUERDO'} executado em ({x},{y})")
+        return True
     return False
 
 def move_to_screen_center(ser):
     """Move o mouse para o centro da tela"""
-    screen_width, screen_height = pg.size()
+    screen_width, screen_height = frames.screen_size()
     center_x = screen_width // 2
     center_y = screen_height // 2
     print(f"[MOUSE] Movendo para centro da tela ({center_x},{center_y})")
-    pg.moveTo(center_x, center_y, duration=0.1)
-    return True
+    return move_mouse(ser, center_x, center_y)
 
 def press_key_2(ser):
     """Pressiona tecla 2 para healing/ataque especial contra witch"""
@@ -149,7 +221,7 @@ def press_key_2(ser):
 def press_bracket(ser):
     """Pressiona tecla 9 UMA VEZ após matar inimigo (otimizado)"""
     print("[TECLADO] Pressionando 9 (1x apenas)")
-    send_command(ser, "KT 9")
+    send_command(ser, "KT 9", wait=False)
     return True
 
 def press_key_3(ser):
@@ -171,60 +243,8 @@ def get_hp_by_color_detection():
         screenshot = pg.screenshot(region=(x, y, width, height))
         img_array = np.array(screenshot)
         
-        total_pixels = 0
-        full_hp_pixels = 0
-        hp80_pixels = 0
-        medium_hp_pixels = 0
-        low_hp_pixels = 0
-        
-        for py in range(height):
-            for px in range(width):
-                try:
-                    b, g, r = img_array[py, px][:3]
-                    
-                    if r < 50 and g < 50 and b < 50:
-                        continue
-                        
-                    total_pixels += 1
-                    
-                    # HP cheio - Verde intenso
-                    if g > 150 and r < 100 and b < 100 and g > r + 30:
-                        full_hp_pixels += 1
-                    # HP 80% - Verde musgo
-                    elif g > 120 and r > 80 and r < 140 and b < 80 and g > r:
-                        hp80_pixels += 1
-                    # HP médio - Amarelo/laranja
-                    elif (r > 120 and g > 90 and b < 100 and r >= g) or \
-                         (r > 100 and g > 80 and b < 80 and r > g - 10) or \
-                         (r + g > 180 and b < 100 and abs(r - g) < 60):
-                        medium_hp_pixels += 1
-                    # HP baixo - Vermelho
-                    elif r > 150 and g < 100 and b < 100 and r > g + 50:
-                        low_hp_pixels += 1
-                except (IndexError, ValueError):
-                    continue
-        
-        if total_pixels == 0:
-            return "unknown"
-        
-        full_ratio = full_hp_pixels / total_pixels
-        hp80_ratio = hp80_pixels / total_pixels
-        medium_ratio = medium_hp_pixels / total_pixels
-        low_ratio = low_hp_pixels / total_pixels
-        
-        # Determina estado do HP
-        if full_ratio > 0.3:
-            return "full"
-        elif hp80_ratio > 0.3:
-            return "high"
-        elif medium_ratio > 0.01 or (total_pixels > 1000 and medium_ratio > 0.005):
-            return "medium"
-        elif low_ratio > 0.1:
-            return "low"
-        elif total_pixels > 500 and full_ratio < 0.8 and hp80_ratio < 0.2:
-            return "medium"
-        else:
-            return "unknown"
+        # Classificação vetorizada (mesmas regras de cor, sem loop por pixel)
+        return decide_hp_state(*count_hp_pixels(img_array))
             
     except Exception as e:
         print(f"[HEALING] Erro na detecção de HP: {e}")
@@ -254,48 +274,87 @@ def check_and_heal(ser):
 # SISTEMA DE DETECÇÃO DE IMAGENS
 # ===========================
 
-def locate_image(image_path, timeout=LOCATE_TIMEOUT, confidence=CONFIDENCE):
-    """Localiza imagem na tela com timeout"""
-    filename = os.path.basename(image_path)
-    if not os.path.exists(image_path):
+def record_hits(kind, hits, frame):
+    """Registra o resultado de uma detecção (lista de Hit) na sessão gravada, se houver"""
+    if RECORDER is not None:
+        RECORDER.event(kind, frame=frame.timestamp,
+                       hits=[[hit.name, round(float(hit.score), 3), [int(hit.pos[0]), int(hit.pos[1])]]
+                             for hit in hits])
+
+def record_flag(template, pos, rung=None):
+    """Registra o resultado da busca de uma flag (pos None = timeout)"""
+    if RECORDER is not None:
+        RECORDER.event("flag", name=getattr(template, "name", None), pos=pos, rung=rung)
+
+def locate_image(template, timeout=LOCATE_TIMEOUT, confidence=CONFIDENCE):
+    """Localiza template pré-carregado na tela com timeout (1 frame novo por tentativa)"""
+    if template is None:
         return None
     
     deadline = time.time() + timeout
     while time.time() < deadline:
         try:
-            pos = pg.locateCenterOnScreen(image_path, confidence=confidence)
+            pos = ROI.locate(template, frames.grab(), confidence=confidence)
             if pos:
-                return (int(pos.x), int(pos.y))
-        except:
+                pos = (int(pos[0]), int(pos[1]))
+                record_flag(template, pos)
+                return pos
+        except Exception:
             pass
         time.sleep(0.1)
+    record_flag(template, None)
     return None
 
-def find_image_ULTRA_FAST(image_path, confidence=0.75):
-    """Busca ULTRA RÁPIDA de imagem otimizada para inimigos"""
-    try:
-        # Usa região menor e mais rápida para inimigos (área central da tela)
-        region = (300, 200, 700, 400)  # Área central onde inimigos geralmente aparecem
-        pos = pg.locateCenterOnScreen(image_path, confidence=confidence, region=region)
-        if pos:
-            return (int(pos.x), int(pos.y))
-    except:
-        # Se falhou na região, tenta tela inteira com confidence ainda menor
+def locate_image_cascade(template, ladder, timeout=LOCATE_TIMEOUT, lower_after=None):
+    """
+    Escada de confiança (ex: 0.8 -> 0.7) com UM mapa de correlação por frame
+    Retorna ((x, y), confiança) no primeiro frame que atinge o degrau de cima;
+    os degraus menores valem a partir de lower_after segundos (None = só no
+    timeout, com o melhor visto). Nada -> (None, None)
+    """
+    if template is None:
+        return None, None
+    
+    start = time.time()
+    deadline = start + timeout
+    lower_at = deadline if lower_after is None else start + lower_after
+    fallback = (None, None)  # Melhor match abaixo do degrau de cima (o mais recente no empate)
+    while time.time() < deadline:
         try:
-            pos = pg.locateCenterOnScreen(image_path, confidence=confidence-0.05)
+            pos, rung = ROI.locate_cascade(template, frames.grab(), ladder)
             if pos:
-                return (int(pos.x), int(pos.y))
-        except:
+                pos = (int(pos[0]), int(pos[1]))
+                if rung == ladder[0] or time.time() >= lower_at:
+                    record_flag(template, pos, rung)
+                    return pos, rung
+                if fallback[1] is None or rung >= fallback[1]:
+                    fallback = (pos, rung)
+        except Exception:
             pass
+        time.sleep(0.1)
+    record_flag(template, *fallback)
+    return fallback
+
+def find_image_ULTRA_FAST(template, confidence=0.75, frame=None):
+    """Busca ULTRA RÁPIDA de imagem otimizada para inimigos"""
+    frame = frame or frames.latest()
+    try:
+        # Região aprendida do template; se falhar, tela inteira com confidence menor
+        pos = ROI.locate(template, frame, confidence=confidence, fallback_confidence=confidence-0.05)
+        if pos:
+            return (int(pos[0]), int(pos[1]))
+    except Exception:
+        pass
     return None
 
-def find_image_quick(image_path, confidence=0.8):
-    """Busca rápida de imagem sem timeout longo"""
+def find_image_quick(template, confidence=0.8, frame=None):
+    """Busca rápida de imagem sem timeout longo (usa o frame do tick)"""
+    frame = frame or frames.latest()
     try:
-        pos = pg.locateCenterOnScreen(image_path, confidence=confidence)
+        pos = ROI.locate(template, frame, confidence=confidence)
         if pos:
-            return (int(pos.x), int(pos.y))
-    except:
+            return (int(pos[0]), int(pos[1]))
+    except Exception:
         pass
     return None
 
@@ -303,52 +362,61 @@ def find_image_quick(image_path, confidence=0.8):
 # SISTEMA DE PRIORIDADE DE INIMIGOS
 # ===========================
 
-def is_in_battle(battle_images):
+def is_in_battle(battle_images, frame=None):
     """
-    Verifica se ESTÁ em batalha (battle_*.png na tela)
+    Verifica se ESTÁ em batalha (borda do battle_*.png na lista de batalha)
+    Slots calibrados: leitura de pixels; os demais: template matching (que calibra)
     Retorna True se está em batalha, False se não está
     """
+    states = {name: PROBE.attacking(name, frame) for name in battle_images}
+    if RECORDER is not None:
+        RECORDER.event("battle", states=states)
+    if True in states.values():
+        return True  # Está em batalha
+    if None not in states.values():
+        return False  # Todos calibrados e nenhuma borda
+    
+    frame = frame or frames.grab()
     for battle_name, battle_image in battle_images.items():
+        if states[battle_name] is not None:
+            continue
         try:
-            pos = pg.locateCenterOnScreen(battle_image, confidence=0.6)
+            pos = ROI.locate(battle_image, frame, confidence=0.6)
             if pos:
+                PROBE.calibrate(battle_name, battle_image, pos, frame)
                 return True  # Está em batalha
-        except:
+        except Exception:
             continue
     return False  # NÃO está em batalha
 
-def find_enemy_simple(enemy_images):
+def find_enemy_simple(enemy_images, frame=None, incremental=False, regions=None):
     """
     Encontra um inimigo na tela - SIMPLES
+    incremental=True: mapas do ENEMY_TILES, refeitos só nos tiles que mudaram
+    (regions: áreas que mudaram segundo o GATE; None = descobre pelo hash dos tiles)
     Retorna (nome, posicao) ou (None, None)
     """
-    # WITCH primeiro (prioridade)
-    if 'witch' in enemy_images:
-        try:
-            pos = pg.locateCenterOnScreen(enemy_images['witch'], confidence=0.6)
-            if pos:
-                return 'witch', (pos.x, pos.y)
-        except:
-            pass
+    frame = frame or frames.grab()
     
-    # VALKYRIE
-    if 'valkyrie' in enemy_images:
-        try:
-            pos = pg.locateCenterOnScreen(enemy_images['valkyrie'], confidence=0.6)
-            if pos:
-                return 'valkyrie', (pos.x, pos.y)
-        except:
-            pass
+    # WITCH primeiro (prioridade), depois VALKYRIE e AMAZON - para no primeiro encontrado
+    candidates = {name: enemy_images[name] for name in ('witch', 'valkyrie', 'amazon') if name in enemy_images}
+    if incremental and ENEMY_TILES is not None:
+        ENEMY_TILES.update(frame, regions)
+        hits = ENEMY_TILES.hits(confidence=0.6, priorities=ENEMY_PRIORITY, names=list(candidates))
+        record_hits("enemy", hits, frame)
+        if hits:
+            return hits[0].name, hits[0].pos
+        return None, None
     
-    # AMAZON
-    if 'amazon' in enemy_images:
-        try:
-            pos = pg.locateCenterOnScreen(enemy_images['amazon'], confidence=0.6)
-            if pos:
-                return 'amazon', (pos.x, pos.y)
-        except:
-            pass
+    try:
+        hits = ROI.locate_many(candidates, frame, confidence=0.6, priorities=ENEMY_PRIORITY,
+                               workers=MATCH_WORKERS, early_exit=True)
+    except Exception:
+        hits = []
+    record_hits("enemy", hits, frame)
     
+    if hits:
+        return hits[0].name, hits[0].pos
     return None, None
 
 def combat_system_independent(ser, enemy_images, loot_images, battle_images):
@@ -359,15 +427,30 @@ def combat_system_independent(ser, enemy_images, loot_images, battle_images):
     3. Se não está, ataca
     4. Se está, aguarda terminar
     """
-    enemy_name, enemy_pos = find_enemy_simple(enemy_images)
+    # 1 screenshot por tick: inimigo e batalha decididos sobre o MESMO frame
+    frame = frames.grab()
+    
+    # Motion gate: frame parado não roda matcher; os demais só refazem os mapas
+    # nas áreas que o gate achou (tela inteira/periódica: hash dos tiles)
+    regions = GATE.changed_regions(frame)
+    if regions == []:
+        GATE.skip(len(enemy_images))
+        return False  # Nada mudou desde o último tick: nenhum enemy novo
+    enemy_name, enemy_pos = find_enemy_simple(enemy_images, frame, incremental=True, regions=regions)
     
     if not enemy_name:
         return False  # Nenhum enemy encontrado
+    GATE.reset()  # Vamos agir no jogo: o próximo tick olha a tela inteira
+    
+    if frame.age > MAX_DECISION_AGE:
+        # Detecção demorou: o inimigo pode ter andado - decide de novo com frame novo
+        print(f"[COMBAT] ⏱️ Frame com {frame.age * 1000:.0f} ms - decisão descartada")
+        return False
     
     print(f"[COMBAT] 🎯 {enemy_name.upper()} detectado em ({int(enemy_pos[0])}, {int(enemy_pos[1])})")
     
     # Verifica se JÁ está em batalha
-    if is_in_battle(battle_images):
+    if is_in_battle(battle_images, frame):
         print(f"[COMBAT] ⏳ JÁ em batalha - aguardando terminar...")
         
         # Aguarda a batalha terminar (battle_*.png sair da tela)
@@ -385,9 +468,7 @@ def combat_system_independent(ser, enemy_images, loot_images, battle_images):
         # Se é witch, combate especial
         if enemy_name == 'witch':
             print(f"[COMBAT] 🧙‍♀️ Witch especial - 2x tecla 2")
-            press_key_2(ser)
-            time.sleep(1.5)
-            press_key_2(ser)
+            send_macro(ser, ["KT 2", "S 1500", "KT 2"])
             time.sleep(1.0)
         else:
             # Aguarda batalha normal terminar
@@ -406,14 +487,26 @@ def collect_loot_simple(ser, loot_images):
     """Coleta loot SIMPLES - primeiro que achar"""
     time.sleep(0.3)  # Aguarda loot aparecer
     
+    frame = frames.grab()
+    if LOOT_TILES is not None:
+        # Mapas em cache: só os tiles que mudaram desde a última coleta são refeitos
+        LOOT_TILES.update(frame)
+        hits = LOOT_TILES.hits(confidence=0.6)
+        record_hits("loot", hits, frame)
+        if hits:
+            click_at_position(ser, hits[0].pos[0], hits[0].pos[1], right_click=True)
+            print(f"[LOOT] ✅ {hits[0].name} coletado")
+            return
+        print(f"[LOOT] ❌ Nenhum loot encontrado")
+        return
     for loot_name, loot_image in loot_images.items():
         try:
-            pos = pg.locateCenterOnScreen(loot_image, confidence=0.6)
+            pos = ROI.locate(loot_image, frame, confidence=0.6)
             if pos:
-                click_at_position(ser, pos.x, pos.y, right_click=True)
+                click_at_position(ser, pos[0], pos[1], right_click=True)
                 print(f"[LOOT] ✅ {loot_name} coletado")
                 return
-        except:
+        except Exception:
             continue
     print(f"[LOOT] ❌ Nenhum loot encontrado")
 
@@ -425,20 +518,22 @@ def check_enemies_on_screen(enemy_images):
     OTIMIZADO: Confidence mais baixa para detecção mais agressiva
     Retorna: (enemy_name, position, priority) ou None
     """
-    enemies_found = []
+    frame = frames.grab()
     
-    for enemy_name, enemy_image in enemy_images.items():
-        pos = find_image_quick(enemy_image, confidence=0.60)  # Reduzido de 0.75 para 0.60 - MUITO mais agressivo
-        if pos:
-            priority = ENEMY_PRIORITY.get(enemy_name, 0)
-            enemies_found.append((enemy_name, pos, priority))
+    # Classe por classe (witch > valkyrie > amazon): para na primeira encontrada
+    try:
+        hits = ROI.locate_many(enemy_images, frame, confidence=0.60,  # Reduzido de 0.75 para 0.60 - MUITO mais agressivo
+                               priorities=ENEMY_PRIORITY, workers=MATCH_WORKERS, early_exit=True)
+    except Exception:
+        hits = []
+    record_hits("enemy", hits, frame)
     
-    if not enemies_found:
+    if not hits:
         return None
     
     # Retorna o inimigo com maior prioridade
-    enemies_found.sort(key=lambda x: x[2], reverse=True)
-    return enemies_found[0]
+    best = hits[0]
+    return best.name, (int(best.pos[0]), int(best.pos[1])), best.priority
 
 # ===========================
 # SISTEMA DE DETECÇÃO GLOBAL
@@ -476,8 +571,17 @@ def wait_for_battle_end(ser, enemy_type, battle_images, max_wait_time=15.0):
     battle_detected = False
     
     while time.time() - start_time < max_wait_time:
-        # ULTRA RÁPIDA: Procura pela borda vermelha com confidence BAIXA
-        pos = locate_image(battle_image, timeout=0.2, confidence=0.50)  # Reduzido de 0.55 para 0.50
+        # Slot calibrado: borda lida direto nos pixels da lista de batalha
+        state = PROBE.attacking(battle_key)
+        if state is not None:
+            hit, pos = None, state
+        else:
+            # ULTRA RÁPIDA: Procura pela borda vermelha com confidence BAIXA
+            # Um só mapa responde 0.50 (detecção normal) e 0.40 (ULTRA baixa)
+            hit, rung = locate_image_cascade(battle_image, BATTLE_CONFIDENCE_LADDER, timeout=0.2)
+            pos = hit if rung == BATTLE_CONFIDENCE_LADDER[0] else None
+            if pos:
+                PROBE.calibrate(battle_key, battle_image, pos, frames.latest())
         
         if pos and not battle_detected:
             # Primeira detecção da batalha
@@ -494,11 +598,10 @@ def wait_for_battle_end(ser, enemy_type, battle_images, max_wait_time=15.0):
             elapsed = time.time() - start_time
             if elapsed > 2.0:  # REDUZIDO: Menos tempo para detectar (era 3.0s)
                 print(f"[BATTLE] ⚠️ Batalha não detectada após {elapsed:.1f}s - Tentando confidence ULTRA baixa...")
-                # TENTATIVA ULTRA BAIXA: Confidence extremamente baixa
-                pos_ultra_low = locate_image(battle_image, timeout=0.1, confidence=0.40)  # Confidence MUITO baixa
-                if pos_ultra_low:
+                # TENTATIVA ULTRA BAIXA: já respondida pelo mesmo mapa (degrau 0.40)
+                if hit:
                     battle_detected = True
-                    print(f"[BATTLE] ⚔️ Batalha detectada com confidence ULTRA BAIXA (0.40)!")
+                    print(f"[BATTLE] ⚔️ Batalha detectada com confidence ULTRA BAIXA ({rung:.2f})!")
                 else:
                     print(f"[BATTLE] ⚠️ Usando fallback - tempo de segurança reduzido...")
                     time.sleep(3.0)  # Tempo de segurança menor (era 4.0s)
@@ -525,8 +628,9 @@ def check_and_collect_loot_SINGLE(ser, loot_images):
     time.sleep(0.6)  # Tempo reduzido
     
     # Busca o PRIMEIRO loot encontrado
+    frame = frames.grab()
     for loot_name, loot_image in loot_images.items():
-        pos = find_image_ULTRA_FAST(loot_image, confidence=0.60)
+        pos = find_image_ULTRA_FAST(loot_image, confidence=0.60, frame=frame)
         if pos:
             print(f"[LOOT] 🎯 PRIMEIRO loot encontrado: {loot_name.upper()} em {pos}")
             print(f"[LOOT] 🖱️ Clicando DIREITO apenas 1x...")
@@ -550,40 +654,27 @@ def check_and_collect_loot_SMART(ser, loot_images):
     print(f"[LOOT] ⏳ Aguardando loot aparecer (0.8s)...")
     time.sleep(0.8)
     
-    # Lista para armazenar posições únicas já detectadas
-    unique_positions = []
     MIN_DISTANCE = 50  # Distância mínima entre loots (pixels)
     
     print(f"[LOOT] 🔍 Detectando círculos únicos...")
+    frame = frames.grab()
     
-    # Verifica todas as imagens de loot (3 variações do círculo)
-    for loot_name, loot_image in loot_images.items():
-        # Busca todas as ocorrências desta imagem
-        try:
-            # Encontra TODAS as ocorrências na tela
-            locations = list(pg.locateAllOnScreen(loot_image, confidence=0.60))
-            
-            for box in locations:
-                center_x = int(box.left + box.width / 2)
-                center_y = int(box.top + box.height / 2)
-                new_pos = (center_x, center_y)
-                
-                # Verifica se esta posição é única (não muito próxima de outras)
-                is_unique = True
-                for existing_pos in unique_positions:
-                    distance = ((new_pos[0] - existing_pos[0])**2 + (new_pos[1] - existing_pos[1])**2)**0.5
-                    if distance < MIN_DISTANCE:
-                        is_unique = False
-                        break
-                
-                # Se é única, adiciona à lista
-                if is_unique:
-                    unique_positions.append(new_pos)
-                    print(f"[LOOT] 📍 Círculo único detectado: {loot_name.upper()} em {new_pos}")
-                    
-        except Exception as e:
-            # Se falhar, usa método original como fallback
-            pos = find_image_ULTRA_FAST(loot_image, confidence=0.60)
+    # As 3 variações do círculo numa passada: mapas fundidos + NMS = 1 ponto por corpo
+    try:
+        results = None
+        if LOOT_TILES is not None:
+            LOOT_TILES.update(frame)
+            results = LOOT_TILES.result
+        hits = locate_peaks(loot_images, frame, confidence=0.60, min_distance=MIN_DISTANCE, results=results)
+        record_hits("loot", hits, frame)
+        unique_positions = [hit.pos for hit in hits]
+        for hit in hits:
+            print(f"[LOOT] 📍 Círculo único detectado: {hit.name.upper()} em {hit.pos} ({hit.score:.2f})")
+    except Exception as e:
+        # Se falhar, usa método original como fallback
+        unique_positions = []
+        for loot_name, loot_image in loot_images.items():
+            pos = find_image_ULTRA_FAST(loot_image, confidence=0.60, frame=frame)
             if pos and pos not in unique_positions:
                 unique_positions.append(pos)
                 print(f"[LOOT] 📍 Fallback: {loot_name.upper()} em {pos}")
@@ -622,8 +713,9 @@ def check_and_collect_loot_PROTECTED(ser, loot_images):
     # VARREDURA 1 - Confiança normal (0.65)
     print(f"[LOOT] 🔍 [1/3] Primeira varredura (confidence 0.65)...")
     loots_found = []
+    frame = frames.grab()
     for loot_name, loot_image in loot_images.items():
-        pos = find_image_quick(loot_image, confidence=0.65)
+        pos = find_image_quick(loot_image, confidence=0.65, frame=frame)
         if pos:
             loots_found.append((loot_name, pos))
     
@@ -642,8 +734,9 @@ def check_and_collect_loot_PROTECTED(ser, loot_images):
     time.sleep(0.6)
     
     loots_found = []
+    frame = frames.grab()
     for loot_name, loot_image in loot_images.items():
-        pos = find_image_quick(loot_image, confidence=0.65)
+        pos = find_image_quick(loot_image, confidence=0.65, frame=frame)
         if pos:
             loots_found.append((loot_name, pos))
     
@@ -662,8 +755,9 @@ def check_and_collect_loot_PROTECTED(ser, loot_images):
     time.sleep(0.6)
     
     loots_found = []
+    frame = frames.grab()
     for loot_name, loot_image in loot_images.items():
-        pos = find_image_quick(loot_image, confidence=0.58)  # MUITO baixa para pegar qualquer coisa
+        pos = find_image_quick(loot_image, confidence=0.58, frame=frame)  # MUITO baixa para pegar qualquer coisa
         if pos:
             loots_found.append((loot_name, pos))
     
@@ -749,7 +843,7 @@ def combat_loop(ser, enemy_images, loot_images, battle_images):
             combat_count += 1
             consecutive_no_enemies = 0
             
-            print(f"[COMBAT] {enemy_name.upper()} detectado (prioridade {priority}) em {pos}")
+            print(f"[COMBAT] {enemy_name.upper()} detectado (prioridade {priority}) em {pos} - {ROI.last_avoided} busca(s) evitada(s)")
             print(f"[COMBAT] Atacando #{combat_count} com CLIQUE ESQUERDO...")
             
             # Clica no inimigo com BOTÃO ESQUERDO
@@ -765,22 +859,22 @@ def combat_loop(ser, enemy_images, loot_images, battle_images):
                 if enemy_name.lower() == "witch":
                     print(f"[COMBAT] ⚡ WITCH DETECTADA! Usando combate especial com tecla 2 a cada 2.2s")
                     
-                    # Divide o tempo de combate em intervalos de 2.2s
+                    # Divide o tempo de combate em intervalos de 2.2s (pausas longas ficam no host)
                     remaining_time = COMBAT_DELAY
                     interval = 2.2
+                    steps = []
                     
                     while remaining_time > 0:
-                        # Pressiona tecla 2
-                        press_key_2(ser)
-                        
-                        # Aguarda 2.2s ou o tempo restante (o que for menor)
-                        sleep_time = min(interval, remaining_time)
-                        if sleep_time > 0:
-                            print(f"[COMBAT] Aguardando {sleep_time:.1f}s...")
-                            time.sleep(sleep_time)
-                        
+                        # Tecla 2 + 2.2s ou o tempo restante (o que for menor)
+                        steps.append("KT 2")
+                        sleep_ms = int(min(interval, remaining_time) * 1000)
+                        if sleep_ms > 0:
+                            steps.append(f"S {sleep_ms}")
                         remaining_time -= interval
                     
+                    print(f"[COMBAT] Tecla 2 x{steps.count('KT 2')} em {COMBAT_DELAY:.1f}s (macro)")
+                    send_macro(ser, steps)
+                    
                     print(f"[COMBAT] ⚡ Combate especial contra WITCH concluído!")
                 else:
                     # NOVA DETECÇÃO VISUAL para outros inimigos! (combat_loop normal)
@@ -836,19 +930,15 @@ def navigate_to_flag(ser, flag_name, flag_image, delay_after, enemy_images, loot
             print(f"[INTERRUPT] *** RETOMANDO NAVEGAÇÃO PARA {flag_name} ***")
             continue  # Retoma do início
         
-        # Procura a flag
-        pos = locate_image(flag_image, timeout=5.0, confidence=0.8)
-        
-        if not pos:
-            # Tenta com confidence menor
-            pos = locate_image(flag_image, timeout=5.0, confidence=0.7)
+        # Procura a flag: 5s só a 0.8, depois até mais 5s aceitando 0.7 (mesmo mapa por frame)
+        pos, rung = locate_image_cascade(flag_image, FLAG_CONFIDENCE_LADDER, timeout=10.0, lower_after=5.0)
         
         if not pos:
             print(f"[NAV] {flag_name} não encontrada!")
             action_completed = True  # Pula para próxima
             break
         
-        print(f"[NAV] {flag_name} encontrada em {pos}")
+        print(f"[NAV] {flag_name} encontrada em {pos} (confidence {rung:.2f})")
         
         # SUBIDA1 usa clique DIREITO, outras flags usam ESQUERDO
         use_right_click = (flag_name.lower() == "subida1")
@@ -907,49 +997,51 @@ def monitored_delay(ser, seconds, context, enemy_images, loot_images, battle_ima
 
 def main_loop(ser):
     """Loop principal do bot"""
+    global ENEMY_TILES, LOOT_TILES
     
-    # Carrega imagens dos inimigos
-    enemy_images = {
-        "witch": os.path.abspath(os.path.join("..", "enemy", "witch.png")),
-        "valkyrie": os.path.abspath(os.path.join("..", "enemy", "valkyrie.png")),
-        "amazon": os.path.abspath(os.path.join("..", "enemy", "amazon.png")),
+    # Carrega TODOS os templates uma única vez (decodificados em memória)
+    TEMPLATES.load()
+    if HEALING_ENABLED:
+        get_hp_lut("cave")  # Tabela de cores do HP (cache em disco)
+    
+    # Nome no bot -> nome do template no registro
+    enemy_names = {
+        "witch": "enemy/witch",
+        "valkyrie": "enemy/valkyrie",
+        "amazon": "enemy/amazon",
     }
     
-    # Carrega imagens de batalha (bordas vermelhas)
-    battle_images = {
-        "battle_witch": os.path.abspath(os.path.join("..", "enemy", "battle_witch.png")),
-        "battle_valkyrie": os.path.abspath(os.path.join("..", "enemy", "battle_valkyrie.png")),
-        "battle_amazon": os.path.abspath(os.path.join("..", "enemy", "battle_amazon.png")),
+    # Imagens de batalha (bordas vermelhas)
+    battle_names = {
+        "battle_witch": "enemy/battle_witch",
+        "battle_valkyrie": "enemy/battle_valkyrie",
+        "battle_amazon": "enemy/battle_amazon",
     }
     
-    # Carrega imagens de loot
-    loot_images = {
-        "loot1": os.path.abspath(os.path.join("..", "loot", "am_loot1.png")),
-        "loot2": os.path.abspath(os.path.join("..", "loot", "am_loot2.png")),
-        "loot3": os.path.abspath(os.path.join("..", "loot", "am_loot3.png")),
+    # Imagens de loot
+    loot_names = {
+        "loot1": "loot/am_loot1",
+        "loot2": "loot/am_loot2",
+        "loot3": "loot/am_loot3",
     }
     
-    # Verifica se imagens existem
-    print("\n[DEBUG] Verificando imagens de inimigos...")
-    for name, path in enemy_images.items():
-        if os.path.exists(path):
-            print(f"[DEBUG] {name}: {path} ✓")
-        else:
-            print(f"[WARN] {name}: {path} ✗ (não encontrado)")
+    # Verifica se os templates foram carregados
+    enemy_images, battle_images, loot_images = {}, {}, {}
+    for title, names, images in (("inimigos", enemy_names, enemy_images),
+                                 ("batalha", battle_names, battle_images),
+                                 ("loot", loot_names, loot_images)):
+        print(f"\n[DEBUG] Verificando imagens de {title}...")
+        for name, template_name in names.items():
+            template = TEMPLATES.get(template_name)
+            if template is not None:
+                images[name] = template
+                print(f"[DEBUG] {name}: {template.path} ✓")
+            else:
+                print(f"[WARN] {name}: {template_name}.png ✗ (não encontrado)")
     
-    print("\n[DEBUG] Verificando imagens de batalha...")
-    for name, path in battle_images.items():
-        if os.path.exists(path):
-            print(f"[DEBUG] {name}: {path} ✓")
-        else:
-            print(f"[WARN] {name}: {path} ✗ (não encontrado)")
-    
-    print("\n[DEBUG] Verificando imagens de loot...")
-    for name, path in loot_images.items():
-        if os.path.exists(path):
-            print(f"[DEBUG] {name}: {path} ✓")
-        else:
-            print(f"[WARN] {name}: {path} ✗ (não encontrado)")
+    # Matching incremental (tiles sujos) para inimigos e loot
+    ENEMY_TILES = TiledMatcher(enemy_images)
+    LOOT_TILES = TiledMatcher(loot_images)
     
     cycle = 1
     
@@ -962,7 +1054,7 @@ def main_loop(ser):
             # ========== PARTE SUPERIOR ==========
             print("\n[PHASE] PARTE SUPERIOR - 7 FLAGS")
             for flag_name, delay_after in UPPER_ROUTE:
-                flag_image = os.path.abspath(os.path.join("..", "flags", "amazon_camp", f"{flag_name}.png"))
+                flag_image = TEMPLATES.get(f"flags/amazon_camp/{flag_name}")
                 navigate_to_flag(ser, flag_name, flag_image, delay_after, enemy_images, loot_images, battle_images)
             
             print("\n[PHASE] ✅ Parte superior completada!")
@@ -970,14 +1062,14 @@ def main_loop(ser):
             # ========== SUBTERRÂNEO ==========
             print("\n[PHASE] SUBTERRÂNEO - ROTA COMPLETA")
             for flag_name, delay_after in UNDERGROUND_ROUTE:
-                flag_image = os.path.abspath(os.path.join("..", "flags", "amazon_camp", f"{flag_name}.png"))
+                flag_image = TEMPLATES.get(f"flags/amazon_camp/{flag_name}")
                 navigate_to_flag(ser, flag_name, flag_image, delay_after, enemy_images, loot_images, battle_images)
             
             print("\n[PHASE] ✅ Subterrâneo completado!")
             
             # ========== VOLTA PARA FLAG 1 ==========
             print("\n[PHASE] VOLTANDO PARA FLAG 1...")
-            flag1_image = os.path.abspath(os.path.join("..", "flags", "amazon_camp", "am_a1.png"))
+            flag1_image = TEMPLATES.get("flags/amazon_camp/am_a1")
             navigate_to_flag(ser, "am_a1", flag1_image, 10, enemy_images, loot_images, battle_images)
             
             print(f"\n[OK] Cycle #{cycle} completo!")
@@ -998,7 +1090,8 @@ def main_loop(ser):
 # MAIN
 # ===========================
 
-def main():
+def main(args):
+    global RECORDER
     print("\n" + "="*60)
     print("AMAZON CAVE BOT - Sistema Inteligente de Prioridades")
     print("="*60)
@@ -1017,7 +1110,36 @@ def main():
     print("- ⚡ WITCH: Tecla 2 a cada 2.2s durante combate (ESPECIAL)")
     print("- Delays entre flags: -45% (ultra otimizado)")
     print("- Mouse move para centro após clicar em flag")
-    print("- Healing: DESATIVADO")
+    print(f"- Healing: {f'THREAD DEDICADA ({HEALING_HZ:.0f} Hz)' if HEALING_ENABLED else 'DESATIVADO'}")
+    
+    headless = bool(args.replay or args.synthetic)
+    if headless:
+        # Frames gravados/sintéticos: 1 por grab(), sleeps só avançam o relógio
+        if args.replay:
+            frames.backend = ReplaySource(args.replay)
+        else:
+            frames.backend = SyntheticSource(TemplateRegistry(), frames=args.synthetic)
+        frames.fps = 0
+        clock = use_virtual_clock(sys.modules[__name__], hid_client)
+        ROI.path = PROBE.path = None  # Não grava o que foi aprendido fora do jogo
+    
+    if args.record or RECORD_SESSION:
+        RECORDER = SessionRecorder(args.record or RECORD_DIR)
+        frames.recorder = RECORDER
+    
+    if headless or args.dry_run:
+        print("[HEADLESS] Sem Arduino - comandos HID simulados")
+        started = time.time()
+        try:
+            run_bot(HidClient(DryRunLink()), healing=False)
+        except EndOfFrames as e:
+            print(f"[REPLAY] {e}")
+        except KeyboardInterrupt:
+            print("\n[STOP] Programa interrompido")
+        if headless:
+            print(f"[HEADLESS] {frames.captures} frame(s) processado(s); "
+                  f"{clock.offset:.0f}s de espera pulados")
+        return
     
     input("\nENTER para iniciar...")
     
@@ -1029,12 +1151,55 @@ def main():
             ser.reset_input_buffer()
             print("[OK] Arduino pronto!\n")
             
-            main_loop(ser)
+            # Porta compartilhada: bot principal + thread de healing (com prioridade)
+            run_bot(HidClient(SerialLink(ser)), healing=HEALING_ENABLED)
     except serial.SerialException as e:
         print(f"[ERRO] Serial: {e}")
     except KeyboardInterrupt:
         print("\n[STOP] Programa interrompido")
 
+def run_bot(link, healing):
+    """Conecta o cliente HID, sobe as threads e roda o main_loop (estatísticas no fim)"""
+    link.recorder = RECORDER
+    link.discover()
+    if BINARY_PROTOCOL:
+        link.enable_binary()
+    healer = None
+    if healing:
+        healer = HealingWorker(link, HP_REGION, {"medium": ("KT 3", 1.0)}, hz=HEALING_HZ)
+        healer.start()
+    
+    frames.start()
+    try:
+        main_loop(link)
+    finally:
+        frames.stop()
+        if healer:
+            healer.stop()
+        link.close()
+        ROI.save()
+        print(f"[ROI] {ROI.stats()}")
+        print(f"[PROBE] {PROBE.stats()}")
+        print(f"[GATE] {GATE.stats()}")
+        if ENEMY_TILES is not None:
+            print(f"[TILES] Inimigos: {ENEMY_TILES.stats()} | Loot: {LOOT_TILES.stats()}")
+        print(f"[CAPTURE] {frames.stats()}")
+        if RECORDER is not None:
+            RECORDER.close()
+            print(f"[RECORD] {RECORDER.stats()}")
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Amazon Cave Bot")
+    parser.add_argument("--replay", metavar="CAMINHO",
+                        help="frames gravados (diretório de imagens, sessão do --record ou vídeo) no lugar da tela")
+    parser.add_argument("--synthetic", type=int, metavar="N",
+                        help="N frames sintéticos (templates em posições aleatórias) no lugar da tela")
+    parser.add_argument("--dry-run", action="store_true",
+                        help="sem Arduino: comandos HID aceitos e só contados")
+    parser.add_argument("--record", nargs="?", const=RECORD_DIR, metavar="DIR",
+                        help=f"grava frames reduzidos, detecções e comandos HID (padrão: {RECORD_DIR})")
+    return parser.parse_args()
+
 if __name__ == "__main__":
     # Desativa aceleração do mouse do Windows
     try:
@@ -1044,4 +1209,4 @@ if __name__ == "__main__":
     except:
         pass
     
-    main()
+    main(parse_args())
@@ -0,0 +1,118 @@
+# -*- coding: utf-8 -*-
+"""
+Battle Probe - Estado de batalha lido em poucos pixels
+A borda de alvo da lista de batalha é uma moldura de cor fixa num slot
+conhecido. Depois de achada UMA vez por template matching (battle_*.png),
+basta ler a coluna esquerda e a linha de cima da moldura e comparar com a
+cor da borda: sem matchTemplate nem screenshot da tela inteira.
+O template matching continua como calibração (e fallback enquanto não houver
+calibração). As calibrações ficam em cache/battle_probe.json entre execuções.
+"""
+
+import json
+import os
+import numpy as np
+
+PROBE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "cache", "battle_probe.json")
+
+COLOR_TOLERANCE = 40   # Diferença máxima por canal (BGR) para o pixel contar como borda
+MIN_MATCH = 0.7        # Fração dos pixels da faixa com a cor da borda para "atacando"
+MIN_SATURATION = 60    # Borda precisa ser colorida (max - min dos canais); senão não calibra
+
+
+def border_color(image):
+    """Cor mediana (BGR) do anel externo de 1 px do template"""
+    ring = np.concatenate([image[0], image[-1], image[1:-1, 0], image[1:-1, -1]])
+    return np.median(ring, axis=0)
+
+
+class BattleProbe:
+    """Sonda de pixels por template de batalha, calibrada pelo template matching"""
+
+    def __init__(self, frames, path=PROBE_PATH):
+        self.frames = frames
+        self.path = path
+        self.probes = {}
+        self.reads = 0
+        self.load()
+
+    # ---------- Persistência ----------
+
+    def load(self):
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                self.probes = json.load(f)
+        except (OSError, ValueError):
+            self.probes = {}
+
+    def save(self):
+        if self.path is None:
+            return  # Execução headless: calibração só em memória
+        try:
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            tmp = self.path + ".tmp"
+            with open(tmp, "w", encoding="utf-8") as f:
+                json.dump(self.probes, f, indent=1, sort_keys=True)
+            os.replace(tmp, self.path)
+        except OSError as e:
+            print(f"[PROBE] Não foi possível salvar {self.path}: {e}")
+
+    # ---------- Calibração ----------
+
+    def calibrate(self, name, template, pos, frame):
+        """
+        Registra o slot onde o template de batalha foi achado (centro em pos)
+        Só aceita se a borda for colorida e os pixels do frame baterem com ela
+        """
+        h, w = template.height, template.width
+        color = border_color(template.image)
+        if color.max() - color.min() < MIN_SATURATION:
+            return False
+        probe = {
+            "box": [int(pos[0]) - w // 2, int(pos[1]) - h // 2, w, h],
+            "color": color.tolist(),
+            "frame": [frame.width, frame.height],
+        }
+        if self.probes.get(name) == probe:
+            return True
+        if not self._matches(probe, frame.image):
+            return False
+        self.probes[name] = probe
+        self.save()
+        print(f"[PROBE] {name} calibrado no slot {probe['box'][:2]}")
+        return True
+
+    # ---------- Leitura ----------
+
+    def _matches(self, probe, image, origin=(0, 0)):
+        """Coluna esquerda + linha de cima da moldura têm a cor da borda?"""
+        left, top, w, h = probe["box"]
+        x, y = left - origin[0], top - origin[1]
+        if x < 0 or y < 0 or y + h > image.shape[0] or x + w > image.shape[1]:
+            return False
+        pixels = np.concatenate([image[y:y + h, x], image[y, x:x + w]]).astype(np.int16)
+        close = np.abs(pixels - np.array(probe["color"], dtype=np.int16)).max(axis=1) <= COLOR_TOLERANCE
+        return close.mean() >= MIN_MATCH
+
+    def attacking(self, name, frame=None):
+        """
+        True/False pela faixa de pixels do slot calibrado
+        None se o template ainda não foi calibrado nesta resolução (usar o template)
+        Sem frame: frame mais novo da thread de captura, ou captura só a caixa da moldura
+        """
+        probe = self.probes.get(name)
+        if probe is None:
+            return None
+        if frame is None and self.frames.running:
+            frame = self.frames.grab()
+        reference = frame or self.frames.current
+        if reference is not None and probe["frame"] != [reference.width, reference.height]:
+            return None
+        self.reads += 1
+        if frame is not None:
+            return self._matches(probe, frame.image)
+        left, top, w, h = probe["box"]
+        return self._matches(probe, self.frames.grab_region((left, top, w, h)), origin=(left, top))
+
+    def stats(self):
+        return f"{self.reads} leitura(s) de pixels, {len(self.probes)} slot(s) calibrado(s)"
@@ -0,0 +1,116 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Benchmark da latência de cura com macro rodando
+A thread principal manda a rotação da witch (KT 2 a cada 2.2s) e cliques
+com BACKSLASH_STEPS; em paralelo, uma "thread de healing" manda KT 3 com
+priority=True. Mede o tempo entre o send() da cura e o instante em que a
+tecla 3 é EXECUTADA pela placa (não só o OK, que sai ao enfileirar).
+Não precisa do Arduino: SimulatedBoard imita o firmware no nível da serial
+(OK ao enfileirar, fila principal FIFO com as pausas "S", fila de prioridade
+"!") e o SerialLink/HidClient reais conversam com ela.
+"""
+
+import queue
+import threading
+import time
+from hid_client import HidClient, STEP_DURATION_MS
+from serial_link import DRY_RUN_CAPS, SerialLink
+
+HEAL_EVERY = 0.35   # Intervalo entre curas (s)
+DURATION = 8.0      # Tempo de cada cenário (s)
+
+
+class SimulatedBoard:
+    """Firmware de texto simulado: duas filas com o timing de cada passo"""
+
+    def __init__(self, caps):
+        self.caps = caps
+        self.replies = queue.Queue()
+        self.free_at = {"main": 0.0, "urgent": 0.0}  # Quando cada fila esvazia
+        self.heals = []  # Instante de execução de cada tecla 3
+        self._buffer = b""
+
+    def _run(self, lane, cmd):
+        """Agenda um comando na fila; retorna o instante em que ele começa"""
+        start = max(time.perf_counter(), self.free_at[lane])
+        name, _, arg = cmd.partition(" ")
+        self.free_at[lane] = start + (int(arg) if name == "S" else STEP_DURATION_MS.get(name, 0)) / 1000.0
+        return start
+
+    def _handle(self, line):
+        tag, _, rest = line.partition(" ")
+        if tag.startswith("#") and "SEQ" in self.caps.split():
+            return f"{tag} {self._handle(rest.strip())}"  # Resposta com o mesmo id
+        if line == "CAPS":
+            return f"OK {self.caps}"
+        lane = "main"
+        if line.startswith("!"):
+            if "PRI" not in self.caps.split():
+                return "ERR CMD"
+            lane, line = "urgent", line[1:]
+        parts = line[2:].split(";") if line.startswith("X ") else [line]
+        for part in parts:
+            start = self._run(lane, part.strip())
+            if part.strip() == "KT 3":
+                self.heals.append(start)
+        return "OK"
+
+    # Interface do serial.Serial usada pelo SerialLink (modo texto)
+    def write(self, data):
+        self._buffer += data
+        while b"\n" in self._buffer:
+            line, self._buffer = self._buffer.split(b"\n", 1)
+            self.replies.put(self._handle(line.decode("utf-8").strip()) + "\n")
+
+    def flush(self):
+        pass
+
+    def readline(self):
+        try:
+            return self.replies.get(timeout=0.1).encode("utf-8")
+        except queue.Empty:
+            return b""
+
+
+def scenario(caps):
+    board = SimulatedBoard(caps)
+    client = HidClient(SerialLink(board))
+    client.discover()
+    stop = threading.Event()
+    sent = []
+
+    def healer():
+        while not stop.is_set():
+            sent.append(time.perf_counter())
+            client.send("KT 3", priority=True, wait=False)
+            stop.wait(HEAL_EVERY)
+
+    thread = threading.Thread(target=healer, daemon=True)
+    thread.start()
+    deadline = time.perf_counter() + DURATION
+    while time.perf_counter() < deadline:
+        client.macro(["KT 2", "S 2200", "KT 2", "S 2200", "KT 2"])             # Witch
+        client.macro(["KT \\", "S 200", "MA 16384 16384", "S 20", "CL"])      # Ataque (mummy)
+    stop.set()
+    thread.join()
+    time.sleep(0.5)
+    client.close()
+
+    latencies = sorted(1000.0 * (done - start) for start, done in zip(sent, board.heals))
+    if not latencies:
+        return "nenhuma cura executada"
+    p50 = latencies[len(latencies) // 2]
+    p95 = latencies[int(len(latencies) * 0.95)]
+    return f"{len(latencies)} curas: p50 {p50:.0f} ms, p95 {p95:.0f} ms, máx {latencies[-1]:.0f} ms"
+
+
+def main():
+    print(f"Curas a cada {HEAL_EVERY * 1000:.0f} ms com macros rodando ({DURATION:.0f}s por cenário)\n")
+    fifo_caps = " ".join(cap for cap in DRY_RUN_CAPS.split() if cap != "PRI")
+    print(f"Firmware sem PRI (só a fila principal): {scenario(fifo_caps)}")
+    print(f"Firmware com PRI (fila de prioridade):  {scenario(DRY_RUN_CAPS)}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,143 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Microbenchmark do classificador de HP
+Compara o antigo loop por pixel (for py / for px) com as regras vetorizadas
+e com a tabela de cores de 24 bits de hp_detection.py, e confere que as
+decisões são idênticas.
+Não precisa do jogo aberto: usa barras sintéticas do tamanho do HP_REGION.
+"""
+
+import time
+import numpy as np
+from hp_detection import (decide_hp_state, classify_cave_pixels, classify_healing_pixels,
+                          classify_hp_pixels_lut, count_hp_classes, get_hp_lut,
+                          get_hp_percent_from_row,
+                          HP_FULL, HP_80, HP_MEDIUM, HP_LOW, HP_DARK)
+
+HP_REGION = (9, 7, 497, 7)
+
+# Cores típicas da barra (na ordem em que o loop antigo lia os canais)
+BAR_COLORS = [
+    (40, 190, 40),    # verde intenso
+    (40, 150, 110),   # verde musgo
+    (40, 140, 180),   # amarelo/laranja
+    (40, 40, 200),    # vermelho
+]
+
+
+def reference_cave_counts(img_array):
+    """Loop ORIGINAL de amazon_cave.py / mummy.py (referência)"""
+    height, width = img_array.shape[:2]
+    total_pixels = full_hp_pixels = hp80_pixels = medium_hp_pixels = low_hp_pixels = 0
+    for py in range(height):
+        for px in range(width):
+            b, g, r = img_array[py, px][:3]
+            if r < 50 and g < 50 and b < 50:
+                continue
+            total_pixels += 1
+            if g > 150 and r < 100 and b < 100 and g > r + 30:
+                full_hp_pixels += 1
+            elif g > 120 and r > 80 and r < 140 and b < 80 and g > r:
+                hp80_pixels += 1
+            elif (r > 120 and g > 90 and b < 100 and r >= g) or \
+                 (r > 100 and g > 80 and b < 80 and r > g - 10) or \
+                 (r + g > 180 and b < 100 and abs(r - g) < 60):
+                medium_hp_pixels += 1
+            elif r > 150 and g < 100 and b < 100 and r > g + 50:
+                low_hp_pixels += 1
+    return total_pixels, full_hp_pixels, hp80_pixels, medium_hp_pixels, low_hp_pixels
+
+
+def reference_healing_counts(img_array):
+    """Loop ORIGINAL de healing.py com getpixel (referência)"""
+    height, width = img_array.shape[:2]
+    full = hp80 = medium = low = total = 0
+    for x in range(width):
+        for y in range(height):
+            r, g, b = (int(c) for c in img_array[y, x][:3])
+            if r + g + b < 50:
+                continue
+            total += 1
+            if g > 120 and g > r * 1.3 and g > b * 1.3 and r < 100:
+                full += 1
+            elif g > 80 and g > r and g > b and r < 120 and b < 120:
+                hp80 += 1
+            elif r > 100 and g > 80 and r >= g and b < 80:
+                medium += 1
+            elif r > 80 and r > g * 1.2 and r > b * 1.2:
+                low += 1
+    return total, full, hp80, medium, low
+
+
+def _counts(classes):
+    counts = count_hp_classes(classes)
+    return (int(counts.sum() - counts[HP_DARK]), int(counts[HP_FULL]), int(counts[HP_80]),
+            int(counts[HP_MEDIUM]), int(counts[HP_LOW]))
+
+
+def make_bars(rng):
+    """Barras sintéticas: cada cor em vários níveis de preenchimento + ruído aleatório"""
+    _, _, width, height = HP_REGION
+    bars = []
+    for color in BAR_COLORS:
+        for fill in (1.0, 0.8, 0.5, 0.2):
+            bar = np.full((height, width, 3), 20, dtype=np.uint8)
+            bar[:, :int(width * fill)] = color
+            noise = rng.integers(-25, 26, bar.shape)
+            bars.append(np.clip(bar.astype(np.int16) + noise, 0, 255).astype(np.uint8))
+    for _ in range(8):
+        bars.append(rng.integers(0, 256, (height, width, 3), dtype=np.uint8))
+    return bars
+
+
+def bench(fn, bars, repeat):
+    start = time.perf_counter()
+    for _ in range(repeat):
+        for bar in bars:
+            fn(bar)
+    return (time.perf_counter() - start) / (repeat * len(bars))
+
+
+def main():
+    rng = np.random.default_rng(1)
+    bars = make_bars(rng)
+
+    print("=== BENCHMARK CLASSIFICADOR DE HP ===")
+    print(f"Região: {HP_REGION[2]}x{HP_REGION[3]} pixels, {len(bars)} barras sintéticas")
+
+    start = time.perf_counter()
+    get_hp_lut("cave")
+    get_hp_lut("healing")
+    print(f"Tabelas de cores prontas em {time.perf_counter() - start:.2f}s")
+
+    with np.errstate(over="ignore"):
+        for name, kind, reference, rules in (
+                ("amazon_cave/mummy", "cave", reference_cave_counts, classify_cave_pixels),
+                ("healing", "healing", reference_healing_counts, classify_healing_pixels)):
+            vector = lambda bar: _counts(rules(bar))
+            lut = lambda bar: _counts(classify_hp_pixels_lut(bar, kind))
+            mismatches = 0
+            for bar in bars:
+                expected = reference(bar)
+                mismatches += (vector(bar) != expected) + (lut(bar) != expected)
+                if kind == "cave":
+                    mismatches += decide_hp_state(*lut(bar)) != decide_hp_state(*expected)
+            t_loop = bench(reference, bars, 1)
+            t_vec = bench(vector, bars, 50)
+            t_lut = bench(lut, bars, 50)
+            print(f"\n[{name}]")
+            print(f"  Loop por pixel: {t_loop * 1000:8.3f} ms/chamada")
+            print(f"  Vetorizado:     {t_vec * 1000:8.3f} ms/chamada ({t_loop / t_vec:.1f}x)")
+            print(f"  Tabela 24 bits: {t_lut * 1000:8.3f} ms/chamada ({t_loop / t_lut:.1f}x)")
+            print(f"  Divergências:   {mismatches}")
+
+    # Percentual exato pela borda da barra (só a linha central, O(largura))
+    rows = [bar[bar.shape[0] // 2] for bar in bars]
+    t_edge = bench(lambda row: get_hp_percent_from_row(row, "healing"), rows, 200)
+    print("\n[borda da barra]")
+    print(f"  HP exato:       {t_edge * 1000:8.3f} ms/chamada")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,360 @@
+# -*- coding: utf-8 -*-
+"""
+Frame Source - Captura ÚNICA de tela por tick
+Todos os detectores (inimigos, batalha, loot, flags) recebem o MESMO frame,
+em vez de cada pg.locateCenterOnScreen tirar seu próprio screenshot.
+Com fps > 0 uma thread captura continuamente num ring buffer pré-alocado e
+grab() entrega o frame mais novo sem esperar screenshot.
+De onde vêm os frames é plugável (backend):
+  LiveScreen      -> tela real (pyautogui)
+  ReplaySource    -> diretório de imagens ou vídeo gravado
+  SyntheticSource -> fundo + templates de enemy/, loot/, flags/ em posições aleatórias
+Replay e sintético rodam sem pyautogui (Linux headless, benchmarks).
+ReplaySource também lê sessões gravadas pelo SessionRecorder (session_recorder.py).
+"""
+
+import os
+import threading
+import time
+import cv2
+import numpy as np
+from session_recorder import is_recording, iter_frames
+
+try:
+    import pyautogui as pg
+except Exception:  # Sem display (Linux headless): só os backends de replay/sintético
+    pg = None
+
+RING_SIZE = 3         # Slots do ring buffer (frame em uso + mais novo + o que está sendo escrito)
+MAX_FRAME_AGE = 0.25  # Frame da thread mais velho que isso (s) -> captura na hora
+
+
+class Frame:
+    """Screenshot da tela inteira em BGR (formato OpenCV) + instante da captura"""
+
+    def __init__(self, image, timestamp=None, slot=None):
+        self.image = image
+        self.timestamp = time.time() if timestamp is None else timestamp
+        self.slot = slot  # Slot do ring buffer (None = captura avulsa)
+        self._gray = None
+        self._scaled = {}
+
+    @property
+    def age(self):
+        """Segundos desde a captura"""
+        return time.time() - self.timestamp
+
+    @property
+    def width(self):
+        return self.image.shape[1]
+
+    @property
+    def height(self):
+        return self.image.shape[0]
+
+    @property
+    def gray(self):
+        """Versão em tons de cinza (calculada uma vez por frame)"""
+        if self._gray is None:
+            self._gray = cv2.cvtColor(self.image, cv2.COLOR_BGR2GRAY)
+        return self._gray
+
+    def scaled(self, factor, grayscale=False):
+        """Versão reduzida 1/factor (mesmo INTER_AREA dos templates), calculada uma vez"""
+        key = (factor, grayscale)
+        if key not in self._scaled:
+            image = self.gray if grayscale else self.image
+            size = (self.width // factor, self.height // factor)
+            self._scaled[key] = cv2.resize(image, size, interpolation=cv2.INTER_AREA)
+        return self._scaled[key]
+
+    def crop(self, region):
+        """Recorta (left, top, width, height) sem copiar os pixels"""
+        left, top, width, height = region
+        return self.image[top:top + height, left:left + width]
+
+
+class EndOfFrames(BaseException):
+    """
+    Fim do replay / da sequência sintética
+    BaseException (como KeyboardInterrupt): atravessa os "except Exception" do bot
+    """
+
+
+# ===========================
+# BACKENDS
+# ===========================
+
+def _into(image, out):
+    """Copia image para out se o tamanho bate (sem alocar); senão devolve image"""
+    if out is not None and out.shape == image.shape:
+        np.copyto(out, image)
+        return out
+    return image
+
+
+class LiveScreen:
+    """Tela real via pyautogui"""
+
+    def capture(self, out=None):
+        if pg is None:
+            raise RuntimeError("pyautogui indisponível - use ReplaySource ou SyntheticSource")
+        rgb = np.asarray(pg.screenshot())
+        if out is None or out.shape != rgb.shape:
+            out = np.empty(rgb.shape, dtype=np.uint8)
+        cv2.cvtColor(rgb, cv2.COLOR_RGB2BGR, dst=out)
+        return out
+
+    def capture_region(self, region):
+        screenshot = pg.screenshot(region=tuple(region))
+        return cv2.cvtColor(np.asarray(screenshot), cv2.COLOR_RGB2BGR)
+
+    def size(self):
+        return tuple(pg.size())
+
+
+class ReplaySource:
+    """
+    Frames gravados, na ordem: diretório de imagens (PNG/JPG/BMP, ordem alfabética),
+    sessão do SessionRecorder (chunk_*.npz, volta à resolução original)
+    ou arquivo de vídeo (cv2.VideoCapture). loop=True recomeça no fim
+    """
+
+    IMAGE_EXTENSIONS = (".png", ".jpg", ".jpeg", ".bmp")
+
+    def __init__(self, path, loop=False):
+        self.path = path
+        self.loop = loop
+        self.index = 0
+        self.last = None
+        self.files = None
+        self.video = None
+        self.session = None
+        if is_recording(path):
+            self.session = iter_frames(path)
+        elif os.path.isdir(path):
+            self.files = sorted(os.path.join(path, name) for name in os.listdir(path)
+                                if name.lower().endswith(self.IMAGE_EXTENSIONS))
+            if not self.files:
+                raise ValueError(f"Nenhuma imagem em {path}")
+        else:
+            self.video = cv2.VideoCapture(path)
+            if not self.video.isOpened():
+                raise ValueError(f"Não foi possível abrir {path}")
+        if self.session is not None:
+            kind = "sessão gravada"
+        else:
+            kind = f"{len(self.files) if self.files else 'vídeo'} frame(s)"
+        print(f"[REPLAY] {path} ({kind})")
+
+    def _next(self):
+        if self.session is not None:
+            image = next(self.session, (None, None))[1]
+            if image is None and self.loop and self.index:
+                self.session = iter_frames(self.path)
+                image = next(self.session, (None, None))[1]
+            self.index += image is not None
+            return image
+        if self.files is not None:
+            if self.index >= len(self.files):
+                if not self.loop:
+                    return None
+                self.index = 0
+            image = cv2.imread(self.files[self.index], cv2.IMREAD_COLOR)
+            self.index += 1
+            return image
+        ok, image = self.video.read()
+        if not ok and self.loop:
+            self.video.set(cv2.CAP_PROP_POS_FRAMES, 0)
+            ok, image = self.video.read()
+        self.index += ok
+        return image if ok else None
+
+    def capture(self, out=None):
+        image = self._next()
+        if image is None:
+            raise EndOfFrames(f"{self.path}: fim após {self.index} frame(s)")
+        self.last = _into(image, out)
+        return self.last
+
+    def capture_region(self, region):
+        """Sem tela real: recorte do último frame do replay"""
+        left, top, width, height = region
+        if self.last is None:
+            self.capture()
+        return self.last[top:top + height, left:left + width].copy()
+
+    def size(self):
+        if self.last is None:
+            self.capture()
+        return self.last.shape[1], self.last.shape[0]
+
+
+class SyntheticSource:
+    """
+    Frames sintéticos: fundo fixo (ruído suavizado) com `count` templates do
+    registro colados em posições aleatórias a cada frame
+    truth: [(nome, (x, y) do centro)] do último frame - gabarito para benchmarks
+    frames: quantidade máxima de frames (None = sem fim)
+    """
+
+    def __init__(self, registry, prefixes=("enemy/", "loot/", "flags/"), size=(1920, 1080),
+                 count=4, frames=None, seed=0):
+        if not registry.templates:
+            registry.load()
+        self.templates = [t for name, t in sorted(registry.templates.items()) if name.startswith(prefixes)]
+        self.width, self.height = size
+        self.count = count
+        self.frames = frames
+        self.produced = 0
+        self.truth = []
+        self.rng = np.random.default_rng(seed)
+        noise = self.rng.integers(0, 256, (self.height, self.width, 3), dtype=np.uint8)
+        self.background = cv2.GaussianBlur(noise, (0, 0), 3)
+        self.last = None
+
+    def capture(self, out=None):
+        if self.frames is not None and self.produced >= self.frames:
+            raise EndOfFrames(f"sintético: {self.produced} frame(s)")
+        image = out if out is not None and out.shape == self.background.shape else np.empty_like(self.background)
+        np.copyto(image, self.background)
+        self.truth = []
+        for index in self.rng.choice(len(self.templates), size=min(self.count, len(self.templates)), replace=False):
+            template = self.templates[index]
+            x = int(self.rng.integers(0, self.width - template.width))
+            y = int(self.rng.integers(0, self.height - template.height))
+            image[y:y + template.height, x:x + template.width] = template.image
+            self.truth.append((template.name, (x + template.width // 2, y + template.height // 2)))
+        self.produced += 1
+        self.last = image
+        return image
+
+    def capture_region(self, region):
+        left, top, width, height = region
+        if self.last is None:
+            self.capture()
+        return self.last[top:top + height, left:left + width].copy()
+
+    def size(self):
+        return self.width, self.height
+
+
+# ===========================
+# FONTE DE FRAMES
+# ===========================
+
+class FrameSource:
+    """
+    Captura 1 screenshot por tick e reaproveita para todos os detectores
+    grab()   -> novo frame (início de um tick)
+    latest() -> último frame capturado (captura um se ainda não houver)
+    Com fps > 0 e start(): thread produtora; grab() devolve o frame mais novo
+    do ring buffer, ou captura na hora se ele passou de max_age
+    backend: LiveScreen (padrão), ReplaySource ou SyntheticSource
+    """
+
+    def __init__(self, fps=0, ring=RING_SIZE, max_age=MAX_FRAME_AGE, backend=None):
+        self.backend = backend if backend is not None else LiveScreen()
+        self.current = None
+        self.captures = 0
+        self.fps = fps
+        self.max_age = max_age
+        self.stale = 0        # Frames da thread rejeitados por idade
+        self._ring = [None] * ring
+        self._newest = None
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+        self._served = 0
+        self._age_sum = 0.0
+        self.recorder = None  # SessionRecorder opcional: grava cada frame entregue por grab()
+        self._recorded = None
+
+    # ---------- Thread de captura ----------
+
+    @property
+    def running(self):
+        return self._thread is not None
+
+    def start(self):
+        if self.fps <= 0 or self._thread is not None:
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="capture", daemon=True)
+        self._thread.start()
+        print(f"[CAPTURE] Thread de captura a {self.fps:.0f} FPS ({len(self._ring)} slots)")
+
+    def stop(self):
+        if self._thread is None:
+            return
+        self._stop.set()
+        self._thread.join(timeout=1.0)
+        self._thread = None
+
+    def _capture(self, out=None):
+        """Frame em BGR do backend; reaproveita out se o tamanho bate (sem alocar)"""
+        return self.backend.capture(out)
+
+    def _run(self):
+        period = 1.0 / self.fps
+        while not self._stop.is_set():
+            started = time.time()
+            # Nunca escreve no slot do frame em uso pelo bot nem no mais novo
+            with self._lock:
+                busy = {getattr(self.current, "slot", None), getattr(self._newest, "slot", None)}
+            slot = next(i for i in range(len(self._ring)) if i not in busy)
+            try:
+                self._ring[slot] = self._capture(self._ring[slot])
+            except EndOfFrames:
+                break  # Replay acabou: o próximo grab() na hora repassa o fim
+            except Exception:
+                self._stop.wait(period)
+                continue
+            with self._lock:
+                self._newest = Frame(self._ring[slot], started, slot)
+            self.captures += 1
+            self._stop.wait(max(0.0, period - (time.time() - started)))
+
+    # ---------- Consumo ----------
+
+    def grab(self):
+        if self._thread is not None:
+            with self._lock:
+                frame = self._newest
+                fresh = frame is not None and frame.age <= self.max_age
+                if fresh:
+                    self.current = frame
+            if fresh:
+                self._served += 1
+                self._age_sum += frame.age
+                self._record(frame)
+                return frame
+            self.stale += 1  # Thread atrasada (ou ainda sem frame): captura na hora
+        self.current = Frame(self._capture())
+        self.captures += 1
+        self._record(self.current)
+        return self.current
+
+    def _record(self, frame):
+        """Entrega o frame ao recorder uma vez só (a thread pode servir o mesmo frame em dois ticks)"""
+        if self.recorder is not None and frame is not self._recorded:
+            self._recorded = frame
+            self.recorder.frame(frame)
+
+    def grab_region(self, region):
+        """Captura só (left, top, width, height) em BGR, sem virar o frame do tick"""
+        return self.backend.capture_region(region)
+
+    def screen_size(self):
+        """(largura, altura) da tela do backend"""
+        return self.backend.size()
+
+    def latest(self):
+        if self.current is None:
+            return self.grab()
+        return self.current
+
+    def stats(self):
+        age = 1000.0 * self._age_sum / self._served if self._served else 0.0
+        return (f"{self.captures} captura(s), {self._served} frame(s) do ring com idade média "
+                f"{age:.0f} ms, {self.stale} recaptura(s) por frame velho")
@@ -0,0 +1,33 @@
+# -*- coding: utf-8 -*-
+"""
+Headless - Relógio virtual para rodar o bot contra frames gravados
+Os sleeps do bot (delays entre flags, espera de batalha, duração das macros)
+só avançam o relógio: o replay roda na velocidade máxima e os timeouts
+baseados em time.time() continuam expirando na ordem certa.
+"""
+
+import time as _time
+
+
+class VirtualClock:
+    """Substitui o módulo time (time/sleep/perf_counter) de um módulo do bot"""
+
+    def __init__(self):
+        self.offset = 0.0  # Segundos de sleep pulados
+
+    def time(self):
+        return _time.time() + self.offset
+
+    def perf_counter(self):
+        return _time.perf_counter() + self.offset
+
+    def sleep(self, seconds):
+        self.offset += max(0.0, seconds)
+
+
+def use_virtual_clock(*modules):
+    """Troca o `time` dos módulos dados por um VirtualClock compartilhado"""
+    clock = VirtualClock()
+    for module in modules:
+        module.time = clock
+    return clock
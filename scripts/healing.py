@@ -11,6 +11,13 @@ import ctypes
 from ctypes import wintypes
 import cv2
 import numpy as np
+from frame_source import Frame
+from hid_client import HidClient
+from hp_detection import (classify_hp_pixels_lut, count_hp_classes, get_hp_lut,
+                          get_hp_percent_from_row, HP_DARK, HP_FULL, HP_80, HP_MEDIUM, HP_LOW)
+from serial_link import SerialLink
+from templates import TemplateRegistry
+from vision import locate_center
 try:
     import pytesseract
     TESSERACT_AVAILABLE = True
@@ -20,9 +27,15 @@ except ImportError:
 
 # Configurações
 COM_PORT = "COM11"
-BAUD_RATE = 9600
+BAUD_RATE = 115200
 DETECT_CONFIDENCE = 0.8
 
+# Região da barra de HP
+HP_REGION = (9, 7, 497, 7)
+
+# HP exato pela borda da barra (True) ou estados por cor cheio/80%/médio/baixo (False)
+USE_EXACT_HP = True
+
 # Thresholds de HP (baseados nos templates criados)
 MAX_HP = 1755
 EMERGENCY_HP = 800
@@ -40,6 +53,9 @@ MANA_KEY = "F4"
 CHECK_INTERVAL = 0.5
 HEALING_COOLDOWN = 1.0
 
+# Templates de HP (healings/) pré-carregados no main()
+HP_TEMPLATES = TemplateRegistry()
+
 # ==========================================
 # Configuração PyAutoGUI
 # ==========================================
@@ -78,31 +94,18 @@ def disable_mouse_acceleration():
 # Comunicação Serial
 # ==========================================
 def send_arduino_command(ser, command):
-    """Envia comando para Arduino e aguarda confirmação"""
-    try:
-        ser.write(f"{command}\n".encode())
-        ser.flush()
-        
-        # Aguardar resposta (timeout de 1 segundo)
-        start_time = time.time()
-        while time.time() - start_time < 1.0:
-            if ser.in_waiting > 0:
-                response = ser.readline().decode().strip()
-                if response:
-                    print(f"[ARDUINO] {response}")
-                    return True
-            time.sleep(0.01)
-        
-        print(f"[AVISO] Arduino não respondeu ao comando: {command}")
-        return False
-        
-    except Exception as e:
-        print(f"[ERRO] Comunicação serial: {e}")
-        return False
+    """Envia comando para Arduino (HidClient) e aguarda confirmação"""
+    if ser.send(command):
+        return True
+    print(f"[AVISO] Arduino não confirmou o comando: {command}")
+    return False
 
 def arduino_key(ser, key):
-    """Envia comando de tecla especial para Arduino"""
-    return send_arduino_command(ser, f"KE {key}")
+    """Envia tecla para Arduino (nome especial -> K, caractere -> KT)"""
+    if ser.key(key):
+        return True
+    print(f"[AVISO] Arduino não confirmou a tecla: {key}")
+    return False
 
 # ==========================================
 # Detecção de HP
@@ -119,16 +122,11 @@ def get_hp_percentage():
         screenshot = pyautogui.screenshot(region=hp_bar_region)
         width, height = screenshot.size
         total_pixels = width * height
-        colored_pixels = 0
         
-        # Analisa cores da barra de HP
-        for x in range(width):
-            for y in range(height):
-                r, g, b = screenshot.getpixel((x, y))
-                
-                # Detecta pixels coloridos da barra
-                if (r > 50 or g > 50) and (r + g + b) > 150:
-                    colored_pixels += 1
+        # Analisa cores da barra de HP (vetorizado)
+        px = np.asarray(screenshot)[..., :3].astype(np.int32)
+        r, g, b = px[..., 0], px[..., 1], px[..., 2]
+        colored_pixels = int(np.count_nonzero(((r > 50) | (g > 50)) & ((r + g + b) > 150)))
         
         # Calcula percentual baseado na proporção de pixels coloridos
         if total_pixels > 0:
@@ -187,55 +185,28 @@ def get_hp_by_color_detection():
         # Salva debug da região capturada
         screenshot.save("../debug_hp_region.png")
         
-        # Contadores para cada tipo de cor baseado nas imagens de referência
-        full_hp_pixels = 0      # hpcheio.png - Verde escuro/intenso
-        hp80_pixels = 0         # hp80p.png - Verde musgo/claro
-        medium_hp_pixels = 0    # hpmedio.png - Amarelo/laranja
-        low_hp_pixels = 0       # hpbaixo.png - Vermelho
-        total_colored = 0
-        
-        # Analisa cada pixel da barra
-        for x in range(width):
-            for y in range(height):
-                r, g, b = screenshot.getpixel((x, y))
-                
-                # Ignora pixels muito escuros (fundo)
-                brightness = r + g + b
-                if brightness < 50:
-                    continue
-                    
-                total_colored += 1
-                
-                # Classificação baseada nas cores das imagens de referência
-                # hpcheio.png - Verde escuro/intenso
-                if g > 120 and g > r * 1.3 and g > b * 1.3 and r < 100:
-                    full_hp_pixels += 1
-                    
-                # hp80p.png - Verde musgo/claro  
-                elif g > 80 and g > r and g > b and r < 120 and b < 120:
-                    hp80_pixels += 1
-                    
-                # hpmedio.png - Amarelo/laranja
-                elif r > 100 and g > 80 and r >= g and b < 80:
-                    medium_hp_pixels += 1
-                    
-                # hpbaixo.png - Vermelho
-                elif r > 80 and r > g * 1.2 and r > b * 1.2:
-                    low_hp_pixels += 1
-                
-                # Debug para alguns pixels - só mostra os primeiros 5 para não spam
-                if total_colored <= 5:
-                    print(f"[PIXEL DEBUG] x={x}, y={y}: RGB({r},{g},{b}) -> ", end="")
-                    if g > 120 and g > r * 1.3 and g > b * 1.3 and r < 100:
-                        print("HP CHEIO (Verde escuro)")
-                    elif g > 80 and g > r and g > b and r < 120 and b < 120:
-                        print("HP 80% (Verde musgo)")
-                    elif r > 100 and g > 80 and r >= g and b < 80:
-                        print("HP MÉDIO (Amarelo)")
-                    elif r > 80 and r > g * 1.2 and r > b * 1.2:
-                        print("HP BAIXO (Vermelho)")
-                    else:
-                        print("NAO CLASSIFICADO")
+        # Classifica todos os pixels da barra de uma vez (tabela de cores)
+        img_array = np.asarray(screenshot)
+        classes = classify_hp_pixels_lut(img_array, "healing")
+        counts = count_hp_classes(classes)
+        
+        full_hp_pixels = int(counts[HP_FULL])      # hpcheio.png - Verde escuro/intenso
+        hp80_pixels = int(counts[HP_80])           # hp80p.png - Verde musgo/claro
+        medium_hp_pixels = int(counts[HP_MEDIUM])  # hpmedio.png - Amarelo/laranja
+        low_hp_pixels = int(counts[HP_LOW])        # hpbaixo.png - Vermelho
+        total_colored = int(counts.sum() - counts[HP_DARK])
+        
+        # Debug para alguns pixels - só mostra os primeiros 5 (ordem x, y) para não spam
+        labels = {
+            HP_FULL: "HP CHEIO (Verde escuro)",
+            HP_80: "HP 80% (Verde musgo)",
+            HP_MEDIUM: "HP MÉDIO (Amarelo)",
+            HP_LOW: "HP BAIXO (Vermelho)",
+        }
+        xs, ys = np.nonzero(classes.T != HP_DARK)
+        for x, y in list(zip(xs, ys))[:5]:
+            r, g, b = img_array[y, x][:3]
+            print(f"[PIXEL DEBUG] x={x}, y={y}: RGB({r},{g},{b}) -> {labels.get(classes[y, x], 'NAO CLASSIFICADO')}")
         
         print(f"[DEBUG] Região: {hp_bar_region}, Tamanho: {width}x{height}")
         print(f"[DEBUG] Total pixels coloridos: {total_colored}")
@@ -291,24 +262,24 @@ def get_hp_by_simple_template():
         # Salva screenshot atual para debug
         current_screenshot.save("../healings/current_hp.png")
         
+        # Frame da região capturada (mesma imagem para todos os templates)
+        frame = Frame(cv2.cvtColor(np.array(current_screenshot), cv2.COLOR_RGB2BGR))
+        
         # Templates com seus valores de HP correspondentes
         templates = [
-            ("../healings/hpcheio.png", 1755),      # HP cheio
-            ("../healings/hp80p.png", 1400),        # HP ~80%  
-            ("../healings/hpmedio.png", 1000),      # HP médio
+            ("healings/hpcheio", 1755),      # HP cheio
+            ("healings/hp80p", 1400),        # HP ~80%  
+            ("healings/hpmedio", 1000),      # HP médio
         ]
         
         # Tenta cada template com diferentes níveis de confiança
-        for template_path, hp_value in templates:
-            if os.path.exists(template_path):
+        for template_name, hp_value in templates:
+            template = HP_TEMPLATES.get(template_name)
+            if template is not None:
                 for confidence in [0.9, 0.8, 0.7, 0.6]:
                     try:
-                        result = pyautogui.locateOnScreen(template_path, 
-                                                        confidence=confidence,
-                                                        region=hp_bar_region)
-                        if result:
-                            template_name = os.path.basename(template_path)
-                            print(f"[TEMPLATE] {template_name} encontrado (conf: {confidence})")
+                        if locate_center(template, frame, confidence=confidence):
+                            print(f"[TEMPLATE] {os.path.basename(template.path)} encontrado (conf: {confidence})")
                             return hp_value
                     except Exception:
                         continue
@@ -320,6 +291,24 @@ def get_hp_by_simple_template():
         print(f"[ERRO] Template matching: {e}")
         return -1
 
+def get_hp_by_fill_edge():
+    """
+    HP EXATO pela borda cheio->vazio da barra
+    Captura apenas a linha central do HP_REGION e acha a última coluna preenchida
+    Retorna HP estimado (0-MAX_HP) ou -1 se erro
+    """
+    try:
+        x, y, width, height = HP_REGION
+        row = pyautogui.screenshot(region=(x, y + height // 2, width, 1))
+        hp_percentage = get_hp_percent_from_row(np.asarray(row)[0], "healing")
+        if hp_percentage < 0:
+            return -1
+        return int(hp_percentage * MAX_HP / 100)
+        
+    except Exception as e:
+        print(f"[ERRO] HP pela borda da barra: {e}")
+        return -1
+
 def get_hp_by_bar_analysis():
     """
     Método de fallback que analisa a largura da barra de HP
@@ -424,6 +413,22 @@ def execute_healing(ser, hp_state):
         print(f"[ERRO] execute_healing: {e}")
         return False
 
+def execute_healing_by_hp(ser, hp):
+    """
+    Healing por thresholds EXATOS de HP (EMERGENCY_HP / CRITICAL_HP / LOW_HP)
+    Retorna True se executou healing, False caso contrário.
+    """
+    if hp <= EMERGENCY_HP:
+        print(f"[EMERGENCY] HP {hp}/{MAX_HP} - usando {EMERGENCY_KEY}")
+        return arduino_key(ser, EMERGENCY_KEY)
+    elif hp <= CRITICAL_HP:
+        print(f"[HEALING] HP {hp}/{MAX_HP} crítico - usando tecla {CRITICAL_KEY}")
+        return arduino_key(ser, CRITICAL_KEY)
+    elif hp <= LOW_HP:
+        print(f"[HEALING] HP {hp}/{MAX_HP} baixo - usando tecla {LOW_KEY}")
+        return arduino_key(ser, LOW_KEY)
+    return False
+
 # ==========================================
 # Loop Principal de Healing
 # ==========================================
@@ -436,6 +441,9 @@ def healing_loop(ser):
     print("[CONFIG] hp80p.png = HP 80% - tecla 2")
     print("[CONFIG] hpmedio.png = HP médio - tecla 3") 
     print("[CONFIG] hpbaixo.png = HP baixo - ' + tecla 2")
+    if USE_EXACT_HP:
+        print(f"[CONFIG] HP EXATO pela borda da barra: {EMERGENCY_KEY} <= {EMERGENCY_HP}, "
+              f"{CRITICAL_KEY} <= {CRITICAL_HP}, {LOW_KEY} <= {LOW_HP} (de {MAX_HP})")
     print(f"[CONFIG] Intervalo: {CHECK_INTERVAL}s")
     
     try:
@@ -443,9 +451,27 @@ def healing_loop(ser):
         send_arduino_command(ser, "B1")
         
         last_hp_state = None
+        last_healing_time = 0
         healing_count = 0
         
         while True:
+            if USE_EXACT_HP:
+                # HP exato pela borda da barra + cooldown entre healings
+                hp = get_hp_by_fill_edge()
+                if hp < 0:
+                    time.sleep(CHECK_INTERVAL)
+                    continue
+                
+                now = time.time()
+                if hp <= EMERGENCY_HP or now - last_healing_time >= HEALING_COOLDOWN:
+                    if execute_healing_by_hp(ser, hp):
+                        healing_count += 1
+                        last_healing_time = now
+                        print(f"[STATS] Healings executados: {healing_count}")
+                
+                time.sleep(CHECK_INTERVAL)
+                continue
+            
             # Detectar estado do HP por cores
             hp_state = get_current_hp()
             
@@ -484,6 +510,10 @@ def main():
     # Desabilitar aceleração do mouse
     disable_mouse_acceleration()
     
+    # Carrega os templates de HP e a tabela de cores uma única vez
+    HP_TEMPLATES.load(("healings",))
+    get_hp_lut("healing")
+    
     try:
         # Conectar com Arduino
         print(f"[SERIAL] Conectando {COM_PORT} @ {BAUD_RATE}...")
@@ -518,8 +548,15 @@ def main():
         # Aguardar input do usuário
         input("\nENTER para iniciar o sistema de healing...")
         
+        # Cliente HID sobre a serial (descobre os comandos suportados pelo firmware)
+        hid = HidClient(SerialLink(ser))
+        hid.discover()
+        
         # Iniciar loop de healing
-        healing_loop(ser)
+        try:
+            healing_loop(hid)
+        finally:
+            hid.close()
         
     except serial.SerialException as e:
         print(f"[ERRO] Serial: {e}")
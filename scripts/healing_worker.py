@@ -0,0 +1,83 @@
+# -*- coding: utf-8 -*-
+"""
+Healing Worker - Thread dedicada de healing em alta frequência
+Amostra só o recorte da barra de HP (ex: 20x por segundo), independente do que
+o loop principal estiver fazendo (sleep de combate, busca de flag...), e envia
+as teclas de cura pelo SerialLink com prioridade sobre os outros comandos
+(e pela fila de prioridade do firmware, quando ele anuncia "PRI").
+Latência de cada cura (decisão -> OK do firmware) medida e resumida no fim;
+bench_heal_latency.py mede até a tecla ser executada, com macro rodando.
+"""
+
+import threading
+import time
+import numpy as np
+try:
+    import pyautogui as pg
+except Exception:  # Sem display (Linux headless): o worker não é iniciado
+    pg = None
+from hp_detection import get_hp_state, get_hp_lut
+
+
+class HealingWorker(threading.Thread):
+    """
+    actions: {estado_do_hp: (comando, cooldown_s)}
+    Ex: {"medium": ("KT 3", 1.0)} -> tecla 3 no máximo 1x por segundo com HP médio
+    """
+
+    def __init__(self, link, region, actions, hz=20.0):
+        super().__init__(name="healing", daemon=True)
+        self.link = link
+        self.region = region
+        self.actions = actions
+        self.interval = 1.0 / hz
+        self.samples = 0
+        self.heals = 0
+        self.latencies = []  # Decisão da cura -> OK do firmware (s)
+        self._last_heal = {}
+        self._stop_event = threading.Event()
+
+    def sample(self):
+        """Lê o estado do HP a partir do recorte do HP_REGION"""
+        screenshot = pg.screenshot(region=self.region)
+        self.samples += 1
+        return get_hp_state(np.array(screenshot))
+
+    def run(self):
+        get_hp_lut("cave")
+        print(f"[HEALING] Thread iniciada ({1.0 / self.interval:.0f} Hz) - região {self.region}")
+        next_tick = time.perf_counter()
+        while not self._stop_event.is_set():
+            try:
+                state = self.sample()
+                action = self.actions.get(state)
+                if action:
+                    cmd, cooldown = action
+                    now = time.perf_counter()
+                    if now - self._last_heal.get(state, 0.0) >= cooldown:
+                        pending = self.link.send(cmd, priority=True, wait=False)
+                        if pending and pending.wait():
+                            self.latencies.append(time.perf_counter() - now)
+                            self._last_heal[state] = now
+                            self.heals += 1
+                            print(f"[HEALING] HP {state} -> '{cmd}' em "
+                                  f"{self.latencies[-1] * 1000:.0f} ms (total: {self.heals})")
+            except Exception as e:
+                print(f"[HEALING] ERRO na thread: {e}")
+
+            next_tick += self.interval
+            delay = next_tick - time.perf_counter()
+            if delay > 0:
+                self._stop_event.wait(delay)
+            else:
+                next_tick = time.perf_counter()
+        print(f"[HEALING] Thread encerrada ({self.samples} amostras, {self.heals} healings; {self.stats()})")
+
+    def stats(self):
+        if not self.latencies:
+            return "sem latência medida"
+        ms = sorted(1000.0 * latency for latency in self.latencies)
+        return f"latência média {sum(ms) / len(ms):.0f} ms, máxima {ms[-1]:.0f} ms"
+
+    def stop(self):
+        self._stop_event.set()
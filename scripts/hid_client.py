@@ -0,0 +1,225 @@
+# -*- coding: utf-8 -*-
+"""
+HID Client - Cliente único do Arduino HID usado por todos os bots
+Na conexão pergunta ao firmware quais comandos ele entende (CAPS) e, a partir
+daí, recusa localmente o que a placa não suporta: nenhum ciclo gasto com
+comandos que voltariam como ERR CMD.
+Também traduz os comandos antigos dos bots (R, C, KE) para o protocolo atual.
+"""
+
+import math
+import time
+from hid_protocol import KEY_CODES, PRIORITY_COMMANDS, PRIORITY_PREFIX, parse_command
+
+# Comandos do firmware anterior ao CAPS (responde ERR CMD para a descoberta)
+BASE_CAPS = ("B1", "B0", "M", "MA", "CL", "CR", "CM", "CD", "AC", "K", "KT", "T", "P", "S")
+
+MAX_MOVE_STEP = 127  # Maior deslocamento de um relatório HID de mouse (int8)
+ABS_MAX = 32767      # Faixa do ponteiro absoluto do firmware ("MA x y", capacidade ABS)
+
+# Tempo que cada comando leva no firmware (ms) - para saber quando a macro terminou
+STEP_DURATION_MS = {"CL": 50, "CR": 50, "CM": 50, "CD": 50, "AC": 60, "KT": 50, "K": 10, "P": 60}
+
+# Maior "S" que vai para a fila do firmware (ms). A fila é FIFO: tudo o que chega
+# depois (inclusive a cura da thread de healing) espera as pausas já enfileiradas
+MAX_FIRMWARE_WAIT_MS = 250
+
+
+def key_command(key):
+    """Comando de uma tecla: nome especial (SPACE, F1...) -> K, caractere -> KT"""
+    if key in KEY_CODES:
+        return f"K {key}"
+    return f"KT {key}"
+
+
+def normalize_command(cmd):
+    """Traduz comandos antigos: R dx dy -> M, C -> CL, KE <tecla> -> K / KT"""
+    name, _, arg = cmd.strip().partition(" ")
+    if name == "R":
+        return f"M {arg}"
+    if name == "C" and not arg:
+        return "CL"
+    if name == "KE" and arg:
+        return key_command(arg.strip())
+    return cmd.strip()
+
+
+def macro_duration(steps):
+    """Duração aproximada (s) de uma macro executada pelo firmware"""
+    total_ms = 0
+    for step in steps:
+        name, _, arg = step.partition(" ")
+        total_ms += int(arg) if name == "S" else STEP_DURATION_MS.get(name, 0)
+    return total_ms / 1000.0
+
+
+def split_macro(steps, limit_ms=MAX_FIRMWARE_WAIT_MS):
+    """
+    Divide a macro nas pausas longas: [(passos, pausa no host em s), ...]
+    Cada trecho vai numa macro curta; as pausas > limit_ms viram sleep no host
+    """
+    bursts, current = [], []
+    for step in steps:
+        name, _, arg = step.partition(" ")
+        if name == "S" and int(arg) > limit_ms:
+            bursts.append((current, int(arg) / 1000.0))
+            current = []
+        else:
+            current.append(step)
+    bursts.append((current, 0.0))
+    return bursts
+
+
+def plan_relative_move(dx, dy, max_step=MAX_MOVE_STEP):
+    """
+    Plano completo de um movimento relativo em passos HID de até ±max_step
+    Menor número de passos, distribuídos por igual; a soma dá exatamente (dx, dy)
+    """
+    count = math.ceil(max(abs(dx), abs(dy)) / max_step)
+    return [((dx * (i + 1)) // count - (dx * i) // count,
+             (dy * (i + 1)) // count - (dy * i) // count) for i in range(count)]
+
+
+def screen_to_abs(x, y, screen_size):
+    """Pixel da tela principal -> coordenada do ponteiro absoluto (centro do pixel)"""
+    width, height = screen_size
+    ax = int((x + 0.5) * (ABS_MAX + 1) / width)
+    ay = int((y + 0.5) * (ABS_MAX + 1) / height)
+    return min(max(ax, 0), ABS_MAX), min(max(ay, 0), ABS_MAX)
+
+
+class HidClient:
+    """Envolve o SerialLink com descoberta de capacidades e validação local"""
+
+    def __init__(self, link):
+        self.link = link
+        self.caps = set(BASE_CAPS)
+        self.refused = 0
+        self.recorder = None  # SessionRecorder opcional: grava cada comando enviado
+        self._warned = set()
+
+    # ---------- Conexão ----------
+
+    def discover(self):
+        """Pergunta ao firmware os comandos suportados ("CAPS" -> "OK M MA CL ...")"""
+        pending = self.link.send("CAPS", wait=False)
+        if pending.wait(self.link.ack_timeout + 0.5) and pending.reply and pending.reply != "OK":
+            self.caps = set(pending.reply.split()[1:])
+            print(f"[HID] Capacidades do firmware: {' '.join(sorted(self.caps))}")
+            if self.supports("SEQ"):
+                self.link.enable_tags()  # Respostas casadas pelo id, não pela ordem
+        else:
+            self.caps = set(BASE_CAPS)
+            print("[HID] Firmware sem CAPS - usando o conjunto básico de comandos")
+        return self.caps
+
+    def supports(self, name):
+        return name in self.caps
+
+    def enable_binary(self):
+        if not self.supports("BIN"):
+            print("[HID] Firmware sem protocolo binário - mantendo texto")
+            return False
+        return self.link.enable_binary()
+
+    @property
+    def binary(self):
+        return self.link.binary
+
+    def close(self):
+        self.link.close()
+
+    # ---------- Comandos ----------
+
+    def _refuse(self, cmd, reason):
+        self.refused += 1
+        name = cmd.split(" ", 1)[0]
+        if name not in self._warned:
+            self._warned.add(name)
+            print(f"[HID] '{cmd}' não enviado: {reason}")
+        return False
+
+    def send(self, cmd, priority=False, wait=True, timeout=None):
+        """
+        Mesmo contrato do SerialLink.send, com o comando normalizado e validado
+        Comando não suportado -> False sem tocar na serial
+        priority=True com firmware "PRI": teclas vão pela fila de prioridade do
+        firmware ("!KT 3"), sem esperar as pausas já enfileiradas
+        """
+        cmd = normalize_command(cmd)
+        name = cmd.split(" ", 1)[0]
+        if not self.supports(name):
+            return self._refuse(cmd, "firmware não suporta")
+        if self.link.binary and parse_command(cmd) is None:
+            return self._refuse(cmd, "sem equivalente no protocolo binário")
+        if priority and name in PRIORITY_COMMANDS and self.supports("PRI"):
+            cmd = PRIORITY_PREFIX + cmd
+        if self.recorder is not None:
+            self.recorder.event("cmd", cmd=cmd, priority=priority)
+        return self.link.send(cmd, priority=priority, wait=wait, timeout=timeout)
+
+    def key(self, key, priority=False, wait=True):
+        """Pressiona uma tecla pelo nome (SPACE, F1...) ou caractere"""
+        return self.send(key_command(key), priority=priority, wait=wait)
+
+    def move_relative(self, dx, dy, before=()):
+        """
+        Movimento relativo em malha aberta: todos os passos do plano enviados em
+        rajada (sem esperar cada OK); retorna depois do último ser aceito
+        before: comandos executados antes na mesma rajada (ex: ["KT \\", "S 200"])
+        """
+        steps = [normalize_command(step) for step in before]
+        steps += [f"M {sx} {sy}" for sx, sy in plan_relative_move(dx, dy)]
+        if not steps:
+            return True
+        pending = [self.send(step, wait=False) for step in steps]
+        if not all(pending):
+            return False
+        ok = pending[-1].wait(self.link.ack_timeout + 0.5) and all(p.ok for p in pending)
+        if ok:
+            time.sleep(macro_duration(steps))  # Espera as pausas de "before" no firmware
+        return ok
+
+    def move_abs(self, x, y, screen_size, before=()):
+        """
+        Posiciona o cursor no pixel (x, y) com UM comando MA (ponteiro absoluto)
+        Só com firmware que anuncia ABS; retorna depois do comando ser aceito
+        """
+        if not self.supports("ABS"):
+            return self._refuse(f"MA {x} {y}", "firmware sem ponteiro absoluto")
+        ax, ay = screen_to_abs(x, y, screen_size)
+        steps = [normalize_command(step) for step in before] + [f"MA {ax} {ay}"]
+        pending = [self.send(step, wait=False) for step in steps]
+        if not all(pending):
+            return False
+        ok = pending[-1].wait(self.link.ack_timeout + 0.5) and all(p.ok for p in pending)
+        if ok:
+            time.sleep(macro_duration(steps))
+        return ok
+
+    def _burst(self, steps):
+        """Passos curtos numa macro só ("X KT 2;S 50;CL"), com um único round trip"""
+        if self.supports("X") and not self.link.binary:
+            return bool(self.send("X " + ";".join(steps)))
+        # Sem macro (binário ou firmware antigo): passos enfileirados um a um
+        pending = [self.send(step, wait=False) for step in steps]
+        if not all(pending):
+            return False
+        return pending[-1].wait(self.link.ack_timeout + 0.5) and all(p.ok for p in pending)
+
+    def macro(self, steps, wait=True):
+        """
+        Envia vários comandos como macro ("X KT 2;S 150;CL"): o firmware executa
+        os passos com o timing dele. Pausas longas ("S 1500") ficam no host, entre
+        macros curtas, para não segurar a fila do firmware (ver split_macro)
+        wait=True retorna só depois da macro terminar no Arduino; wait=False
+        ainda espera as pausas longas, até o último trecho ser enviado
+        """
+        steps = [normalize_command(step) for step in steps]
+        bursts = split_macro(steps)
+        for index, (burst, pause) in enumerate(bursts):
+            if burst and not self._burst(burst):
+                return False
+            if wait or index < len(bursts) - 1:
+                time.sleep(macro_duration(burst) + pause)
+        return True
@@ -0,0 +1,136 @@
+# -*- coding: utf-8 -*-
+"""
+HID Protocol - Framing binário compacto para o Arduino HID
+Alternativa ao protocolo de texto ("CL\n", "KT 2\n"...): cada comando vira um
+frame fixo de 8 bytes, sem parsing de String no ATmega32u4, e a resposta é
+um ack de 3 bytes que carrega o número de sequência do comando.
+
+Frame host -> placa:  A5 | seq | opcode | arg0 (int16 LE) | arg1 (int16 LE) | xor
+Resposta placa -> host: 5A | seq | status (0 = OK)
+
+O modo binário é ativado pelo comando de texto "BIN" (ver SerialLink.enable_binary).
+Firmware com "PRI": toques de tecla com prefixo "!" ("!KT 3") - ou com o bit
+OP_PRIORITY no opcode - vão para uma fila de prioridade que não espera as
+pausas da fila principal.
+"""
+
+import struct
+
+FRAME_SYNC = 0xA5
+ACK_SYNC = 0x5A
+FRAME_LEN = 8
+ACK_LEN = 3
+
+# Opcodes (iguais ao enum do firmware)
+OP_PING = 0x00
+OP_MOVE = 0x01
+OP_MOVE_ABS = 0x02
+OP_CLICK = 0x03
+OP_DOUBLE_CLICK = 0x04
+OP_ALT_CLICK = 0x05
+OP_KEY_TAP = 0x06
+OP_BUSY = 0x07
+OP_SLEEP = 0x08
+OP_COMBO = 0x09
+OP_TEXT_MODE = 0x7F
+OP_PRIORITY = 0x80  # Bit somado ao opcode: fila de prioridade (só OP_KEY_TAP)
+
+PRIORITY_PREFIX = "!"
+PRIORITY_COMMANDS = ("K", "KT")  # Comandos aceitos na fila de prioridade
+
+# Status do ack
+STATUS_OK = 0
+STATUS_NAMES = {
+    0: "OK",
+    1: "ERR CHECKSUM",
+    2: "ERR OP",
+    3: "ERR ARG",
+    4: "ERR FULL",
+}
+
+# Botões do Mouse.h
+MOUSE_BUTTONS = {"CL": 1, "CR": 2, "CM": 4}
+
+# Teclas especiais do Keyboard.h (mesmos nomes do comando "K")
+KEY_CODES = {
+    "ENTER": 0xB0, "ESC": 0xB1, "BKSP": 0xB2, "TAB": 0xB3, "SPACE": 0x20,
+    "DEL": 0xD4, "RIGHT": 0xD7, "LEFT": 0xD8, "DOWN": 0xD9, "UP": 0xDA,
+    "HOME": 0xD2, "END": 0xD5, "PGUP": 0xD3, "PGDN": 0xD6,
+}
+KEY_CODES.update({f"F{n}": 0xC1 + n for n in range(1, 13)})
+
+# Modificadores do comando "P"
+MODIFIER_BITS = {"CTRL": 1, "SHIFT": 2, "ALT": 4, "GUI": 8, "WIN": 8}
+
+KEY_HOLD_MS = 10     # "K": tecla especial
+KEY_TAP_MS = 50      # "KT": tecla ASCII
+
+
+def encode_frame(seq, op, a=0, b=0):
+    """Monta o frame de 8 bytes; args int16 com sinal"""
+    body = struct.pack("<BBhh", seq & 0xFF, op, a, b)
+    check = 0
+    for byte in body:
+        check ^= byte
+    return bytes([FRAME_SYNC]) + body + bytes([check])
+
+
+def parse_command(text_cmd):
+    """
+    Traduz um comando de texto para (opcode, arg0, arg1)
+    Retorna None se o comando não tem equivalente binário (ex: "T texto")
+    """
+    parts = text_cmd.strip().split()
+    if not parts:
+        return None
+    name, args = parts[0], parts[1:]
+
+    try:
+        if name == "M" and len(args) == 2:
+            dx, dy = int(args[0]), int(args[1])
+            return OP_MOVE, max(-127, min(127, dx)), max(-127, min(127, dy))
+        if name == "MA" and len(args) == 2:
+            return OP_MOVE_ABS, int(args[0]), int(args[1])
+        if name == "S" and len(args) == 1:
+            return OP_SLEEP, int(args[0]), 0
+    except ValueError:
+        return None
+
+    if name in MOUSE_BUTTONS and not args:
+        return OP_CLICK, MOUSE_BUTTONS[name], 0
+    if name == "CD" and not args:
+        return OP_DOUBLE_CLICK, 0, 0
+    if name == "AC" and not args:
+        return OP_ALT_CLICK, 0, 0
+    if name in ("B1", "B0") and not args:
+        return OP_BUSY, int(name == "B1"), 0
+    if name == "K" and len(args) == 1 and args[0] in KEY_CODES:
+        return OP_KEY_TAP, KEY_CODES[args[0]], KEY_HOLD_MS
+    if name == "KT" and len(args) == 1:
+        return OP_KEY_TAP, ord(args[0][0]), KEY_TAP_MS
+    if name == "P" and len(args) == 2:
+        mods = 0
+        for mod in args[0].split("+"):
+            mods |= MODIFIER_BITS.get(mod, 0)
+        key = ord(args[1]) if len(args[1]) == 1 else 0
+        return OP_COMBO, mods, key
+    return None
+
+
+def encode_command(seq, text_cmd):
+    """Frame binário de um comando de texto ("!" -> bit OP_PRIORITY), ou None se não for codificável"""
+    priority = text_cmd.startswith(PRIORITY_PREFIX)
+    parsed = parse_command(text_cmd[1:] if priority else text_cmd)
+    if parsed is None:
+        return None
+    op, a, b = parsed
+    if priority:
+        op |= OP_PRIORITY
+    return encode_frame(seq, op, a, b)
+
+
+def decode_reply(data):
+    """Ack de 3 bytes -> (seq, status) ou None se não começa com 5A"""
+    if len(data) != ACK_LEN or data[0] != ACK_SYNC:
+        return None
+    return data[1], data[2]
@@ -0,0 +1,203 @@
+# -*- coding: utf-8 -*-
+"""
+HP Detection - Classificação VETORIZADA da barra de HP
+Mesmas regras de cor dos antigos loops por pixel (for py / for px e getpixel),
+agora calculadas com operações de array NumPy sobre o recorte do HP_REGION.
+As regras são compiladas uma vez em uma tabela de 24 bits (16M entradas uint8),
+salva em disco: classificar a barra vira um gather + bincount.
+"""
+
+import os
+import time
+import numpy as np
+
+# Classes de cor por pixel
+HP_DARK = 0     # Fundo escuro (ignorado)
+HP_OTHER = 1    # Colorido, mas fora das cores da barra
+HP_FULL = 2     # hpcheio.png - Verde intenso
+HP_80 = 3       # hp80p.png - Verde musgo
+HP_MEDIUM = 4   # hpmedio.png - Amarelo/laranja
+HP_LOW = 5      # hpbaixo.png - Vermelho
+HP_CLASSES = 6
+
+# Tabelas (r, g, b) -> classe, cacheadas em disco para a inicialização ser rápida
+LUT_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "cache")
+LUT_SIZE = 1 << 24
+
+
+def _select(conditions):
+    """Aplica a cadeia if/elif: a primeira condição verdadeira define a classe"""
+    classes = np.full(conditions[0][1].shape, HP_OTHER, dtype=np.uint8)
+    for hp_class, mask in reversed(conditions):
+        classes[mask] = hp_class
+    return classes
+
+
+def classify_cave_pixels(img_array):
+    """
+    Regras de amazon_cave.py / mummy.py aplicadas em todos os pixels de uma vez
+    Canais lidos como "b, g, r = pixel[:3]", igual ao loop original, e com a mesma
+    aritmética uint8 (r + g e r - g dão a volta em 256 como nos escalares numpy)
+    Retorna array uint8 (altura x largura) com as classes HP_*
+    """
+    px = np.asarray(img_array)[..., :3]
+    b, g, r = px[..., 0], px[..., 1], px[..., 2]
+
+    dark = (r < 50) & (g < 50) & (b < 50)
+    full = (g > 150) & (r < 100) & (b < 100) & (g > r + 30)
+    hp80 = (g > 120) & (r > 80) & (r < 140) & (b < 80) & (g > r)
+    medium = (((r > 120) & (g > 90) & (b < 100) & (r >= g)) |
+              ((r > 100) & (g > 80) & (b < 80) & (r > g - 10)) |
+              ((r + g > 180) & (b < 100) & (np.abs(r - g) < 60)))
+    low = (r > 150) & (g < 100) & (b < 100) & (r > g + 50)
+
+    classes = _select([(HP_FULL, full), (HP_80, hp80), (HP_MEDIUM, medium), (HP_LOW, low)])
+    classes[dark] = HP_DARK
+    return classes
+
+
+def classify_healing_pixels(rgb_array):
+    """
+    Regras de healing.py (getpixel em RGB, inteiros Python sem overflow)
+    Retorna array uint8 (altura x largura) com as classes HP_*
+    """
+    px = np.asarray(rgb_array)[..., :3].astype(np.int32)
+    r, g, b = px[..., 0], px[..., 1], px[..., 2]
+
+    dark = (r + g + b) < 50
+    full = (g > 120) & (g > r * 1.3) & (g > b * 1.3) & (r < 100)
+    hp80 = (g > 80) & (g > r) & (g > b) & (r < 120) & (b < 120)
+    medium = (r > 100) & (g > 80) & (r >= g) & (b < 80)
+    low = (r > 80) & (r > g * 1.2) & (r > b * 1.2)
+
+    classes = _select([(HP_FULL, full), (HP_80, hp80), (HP_MEDIUM, medium), (HP_LOW, low)])
+    classes[dark] = HP_DARK
+    return classes
+
+
+def _lut_index(img_array):
+    """Índice de 24 bits de cada pixel: (canal0 << 16) | (canal1 << 8) | canal2"""
+    px = np.asarray(img_array)[..., :3]
+    return ((px[..., 0].astype(np.uint32) << 16) |
+            (px[..., 1].astype(np.uint32) << 8) |
+            px[..., 2])
+
+
+def build_hp_lut(classify):
+    """Avalia as regras de cor em todas as 16M cores (em blocos) -> tabela uint8"""
+    lut = np.empty(LUT_SIZE, dtype=np.uint8)
+    low_bits = np.arange(1 << 16, dtype=np.uint32)
+    block = 16  # 16 valores do canal 0 por vez = 1M cores
+    for start in range(0, 256, block):
+        c0 = np.repeat(np.arange(start, start + block, dtype=np.uint32), 1 << 16)
+        idx = (c0 << 16) | np.tile(low_bits, block)
+        pixels = np.stack([c0, (idx >> 8) & 0xFF, idx & 0xFF], axis=-1).astype(np.uint8)
+        lut[idx] = classify(pixels)
+    return lut
+
+
+HP_RULES = {
+    "cave": classify_cave_pixels,
+    "healing": classify_healing_pixels,
+}
+_LUTS = {}
+
+
+def get_hp_lut(kind="cave"):
+    """
+    Tabela de classes para as regras 'cave' (amazon_cave/mummy) ou 'healing'
+    Carrega de cache/hp_<kind>_lut.npy; se não existir, compila e salva
+    """
+    if kind in _LUTS:
+        return _LUTS[kind]
+
+    path = os.path.join(LUT_DIR, f"hp_{kind}_lut.npy")
+    lut = None
+    if os.path.exists(path):
+        try:
+            lut = np.load(path)
+            if lut.shape != (LUT_SIZE,) or lut.dtype != np.uint8:
+                lut = None
+        except (OSError, ValueError):
+            lut = None
+
+    if lut is None:
+        start = time.time()
+        with np.errstate(over="ignore"):
+            lut = build_hp_lut(HP_RULES[kind])
+        print(f"[HP] Tabela de cores '{kind}' compilada em {time.time() - start:.1f}s")
+        try:
+            os.makedirs(LUT_DIR, exist_ok=True)
+            np.save(path, lut)
+        except OSError as e:
+            print(f"[HP] Não foi possível salvar cache da tabela: {e}")
+
+    _LUTS[kind] = lut
+    return lut
+
+
+def classify_hp_pixels_lut(img_array, kind="cave"):
+    """Classe de cada pixel via tabela (um único gather)"""
+    return get_hp_lut(kind)[_lut_index(img_array)]
+
+
+def count_hp_classes(classes):
+    """Contagem por classe: array de HP_CLASSES posições (índice = classe HP_*)"""
+    return np.bincount(classes.ravel(), minlength=HP_CLASSES)
+
+
+def count_hp_pixels(img_array):
+    """
+    Contadores do loop original de amazon_cave.py / mummy.py
+    Retorna (total_pixels, full, hp80, medium, low)
+    """
+    counts = count_hp_classes(classify_hp_pixels_lut(img_array, "cave"))
+    total = int(counts.sum() - counts[HP_DARK])
+    return total, int(counts[HP_FULL]), int(counts[HP_80]), int(counts[HP_MEDIUM]), int(counts[HP_LOW])
+
+
+def decide_hp_state(total_pixels, full_hp_pixels, hp80_pixels, medium_hp_pixels, low_hp_pixels):
+    """Decisão de estado de amazon_cave.py / mummy.py: 'full', 'high', 'medium', 'low', 'unknown'"""
+    if total_pixels == 0:
+        return "unknown"
+
+    full_ratio = full_hp_pixels / total_pixels
+    hp80_ratio = hp80_pixels / total_pixels
+    medium_ratio = medium_hp_pixels / total_pixels
+    low_ratio = low_hp_pixels / total_pixels
+
+    if full_ratio > 0.3:
+        return "full"
+    elif hp80_ratio > 0.3:
+        return "high"
+    elif medium_ratio > 0.01 or (total_pixels > 1000 and medium_ratio > 0.005):
+        return "medium"
+    elif low_ratio > 0.1:
+        return "low"
+    # Se detectou qualquer pixel que não é verde cheio, considera médio
+    elif total_pixels > 500 and full_ratio < 0.8 and hp80_ratio < 0.2:
+        return "medium"
+    else:
+        return "unknown"
+
+
+def get_hp_state(img_array):
+    """Classifica o recorte do HP_REGION direto para o estado do HP"""
+    return decide_hp_state(*count_hp_pixels(img_array))
+
+
+def get_hp_percent_from_row(row, kind="healing"):
+    """
+    Percentual EXATO pela borda cheio->vazio da barra, custo O(largura)
+    row: uma linha de pixels da barra (largura x 3)
+    A barra enche da esquerda para a direita: a última coluna com cor de barra
+    (cheio/80%/médio/baixo) marca o HP atual
+    Retorna inteiro 0-100 ou -1 se nenhuma coluna tem cor de barra
+    """
+    row = np.asarray(row).reshape(-1, np.asarray(row).shape[-1])
+    filled = classify_hp_pixels_lut(row, kind) >= HP_FULL
+    if not filled.any():
+        return -1
+    width = filled.shape[0]
+    last_filled = width - 1 - int(np.argmax(filled[::-1]))
+    return int(round((last_filled + 1) * 100 / width))
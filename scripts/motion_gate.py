@@ -0,0 +1,90 @@
+# -*- coding: utf-8 -*-
+"""
+Motion Gate - Pula a detecção de inimigos nas áreas que não mudaram
+Compara a versão reduzida (1/4, cinza) do frame com a do tick anterior,
+tile a tile. Só as áreas que mudaram voltam a passar pelos matchers (o
+TiledMatcher refaz os mapas só ali, com a margem do template); frame parado
+não roda matcher nenhum. Como um frame igual dá o mesmo resultado, as áreas
+paradas não têm nada de novo para achar.
+"""
+
+import time
+import cv2
+import numpy as np
+
+GATE_SCALE = 4        # Redução do frame comparado (1/4)
+TILE = 64             # Lado do tile em px da tela cheia
+DIFF_THRESHOLD = 12   # Diferença de cinza (0-255) para um pixel reduzido contar como mudança
+MIN_CHANGED = 2       # Pixels reduzidos mudados para o tile contar como mudado
+FULL_EVERY = 2.0      # Busca completa forçada a cada N segundos (segurança)
+
+
+class MotionGate:
+    """Regiões que mudaram desde o último frame + contadores de buscas evitadas"""
+
+    def __init__(self, scale=GATE_SCALE, tile=TILE, threshold=DIFF_THRESHOLD,
+                 min_changed=MIN_CHANGED, full_every=FULL_EVERY):
+        self.scale = scale
+        self.tile = tile
+        self.threshold = threshold
+        self.min_changed = min_changed
+        self.full_every = full_every
+        self.previous = None
+        self.last_full = 0.0
+        self.saved = 0       # Buscas de template (template x frame) não executadas
+        self.full = 0        # Frames analisados por inteiro
+        self.partial = 0     # Frames analisados só nas áreas que mudaram
+        self.idle = 0        # Frames sem mudança (nenhum matcher)
+        self._area = 0.0     # Soma da fração de área analisada nos frames parciais
+
+    def reset(self):
+        """Próximo frame é analisado por inteiro (ex: depois de agir no jogo)"""
+        self.previous = None
+
+    def changed_regions(self, frame):
+        """
+        Regiões (left, top, width, height) que mudaram desde o frame anterior
+        None = analisar a tela inteira (primeiro frame, resolução nova, verificação periódica)
+        []   = nada mudou
+        """
+        small = frame.scaled(self.scale, grayscale=True)
+        previous, self.previous = self.previous, small
+        now = time.time()
+        if previous is None or previous.shape != small.shape or now - self.last_full >= self.full_every:
+            self.last_full = now
+            self.full += 1
+            return None
+
+        # Pixels reduzidos que mudaram, contados por tile (reshape em vez de laço)
+        changed = cv2.absdiff(small, previous) > self.threshold
+        step = self.tile // self.scale
+        rows, cols = -(-small.shape[0] // step), -(-small.shape[1] // step)
+        padded = np.zeros((rows * step, cols * step), dtype=np.uint8)
+        padded[:small.shape[0], :small.shape[1]] = changed
+        tiles = (padded.reshape(rows, step, cols, step).sum(axis=(1, 3)) >= self.min_changed).astype(np.uint8)
+        if not tiles.any():
+            self.idle += 1
+            return []
+
+        # Tiles vizinhos viram uma região só (caixa do componente)
+        _, _, boxes, _ = cv2.connectedComponentsWithStats(tiles, connectivity=8)
+        regions = []
+        area = 0
+        for x, y, w, h, _ in boxes[1:].tolist():
+            left, top = x * self.tile, y * self.tile
+            right = min(frame.width, (x + w) * self.tile)
+            bottom = min(frame.height, (y + h) * self.tile)
+            regions.append((left, top, right - left, bottom - top))
+            area += (right - left) * (bottom - top)
+        self.partial += 1
+        self._area += min(1.0, area / float(frame.width * frame.height))
+        return regions
+
+    def skip(self, invocations):
+        """Registra buscas de template que não precisaram rodar"""
+        self.saved += invocations
+
+    def stats(self):
+        area = 100.0 * self._area / self.partial if self.partial else 0.0
+        return (f"{self.saved} busca(s) de template evitada(s); {self.idle} frame(s) parado(s), "
+                f"{self.partial} parcial(is) ({area:.0f}% da área), {self.full} completo(s)")
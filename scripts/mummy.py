@@ -2,20 +2,39 @@
 import os, time, pyautogui as pg, serial, ctypes
 import cv2, numpy as np
 from typing import Optional, Tuple
+from hp_detection import count_hp_pixels, decide_hp_state, get_hp_lut
+from healing_worker import HealingWorker
+from serial_link import SerialLink
+from hid_client import HidClient
+from frame_source import FrameSource
+from vision import locate_cascade, match_many, priority_groups
 
 print("="*50)
 print("MUMMY BOT - Automacao com Arduino HID + HEALING")
 print("="*50)
 
 COM_PORT = "COM11"  # Porta atualizada conforme disponível
-BAUD_RATE = 9600
+BAUD_RATE = 115200
 LOCATE_TIMEOUT = 20.0  # Aumentado para melhor detecção de flags
 CONFIDENCE = 0.8  # Aumentado para melhor precisão na detecção
+FLAG_CONFIDENCE_LADDER = (0.8, 0.7, 0.6)  # Degraus liberados conforme as tentativas da flag
+ENEMY_PRIORITY = {"mummy": 3, "bonebeast": 2, "scarab": 1}  # Ordem de ataque na verificação rápida
+MATCH_WORKERS = 0  # Threads para buscar os 3 inimigos no mesmo frame (0 = sequencial)
+MOVE_SETTLE = 0.02  # Tempo para o cursor refletir a rajada de movimentos antes da verificação
+BACKSLASH_STEPS = ["KT \\", "S 200"]  # \ + 0.2s antes do clique de ataque (na mesma rajada)
 
 # Configurações de Healing
 HEALING_ENABLED = True
 HP_CHECK_INTERVAL = 0.5  # Verifica HP a cada 0.5s
 HP_REGION = (9, 7, 497, 7)  # Região da barra de HP
+HEALING_THREAD = True  # Healing em thread dedicada (não depende dos sleeps do loop principal)
+HEALING_HZ = 20.0  # Amostragem do HP pela thread (vezes por segundo)
+
+# Thread de healing ativa (criada no main)
+healer = None
+
+# Fonte de frames das buscas de flags e inimigos (1 screenshot por tentativa)
+frames = FrameSource()
 
 # Desativa mouse acceleration no Windows
 def disable_mouse_acceleration():
@@ -32,83 +51,47 @@ def wait_exact(seconds, msg="Aguardando"):
     time.sleep(seconds)
 
 def send_command(ser, cmd):
-    try:
-        ser.write((cmd + "\n").encode())
-        ser.flush()
-        return True
-    except Exception as e:
-        print(f"[SERIAL] Erro: {e}")
-        return False
+    # ser = HidClient (serial compartilhada com a thread de healing)
+    # Sem aguardar OK; False só se o firmware não suporta o comando
+    return bool(ser.send(cmd, wait=False))
 
-def click_at_position(ser, x, y, right_click=False):
+def click_at_position(ser, x, y, right_click=False, before=()):
+    """
+    Move com um único MA (firmware com ponteiro absoluto) ou com o plano completo
+    de passos HID (±127) enviado de uma vez, verifica a posição UMA vez,
+    corrige se precisar e clica
+    before: comandos executados antes do movimento na mesma rajada (ex: BACKSLASH_STEPS)
+    """
     print(f"[MOUSE] Movendo para ({x},{y})")
     
-    max_attempts = 150  # Mais tentativas
-    tolerance = 0  # Tolerância zero para máxima precisão
-    
-    # Primeiro movimento: vai diretamente para próximo da posição
-    curr_x, curr_y = pg.position()
-    dx = x - curr_x
-    dy = y - curr_y
-    
-    # Se a distância é grande, faz um movimento inicial grande
-    if abs(dx) > 300 or abs(dy) > 300:
-        large_dx = max(-127, min(127, dx // 2))
-        large_dy = max(-127, min(127, dy // 2))
-        send_command(ser, f"R {large_dx} {large_dy}")
-        time.sleep(0.1)
-    
-    # Agora faz movimentos precisos
-    for attempt in range(max_attempts):
+    if ser.supports("ABS"):
+        # Ponteiro absoluto: um único MA, qualquer que seja a distância
+        moved = ser.move_abs(x, y, pg.size(), before=before)
+    else:
         curr_x, curr_y = pg.position()
-        dx = x - curr_x
-        dy = y - curr_y
-        
-        # Verifica se chegou na posição exata
-        if dx == 0 and dy == 0:
-            print(f"[MOUSE] Posição EXATA alcançada: ({curr_x},{curr_y})")
-            break
-        
-        # Calcula movimento necessário
-        if abs(dx) <= 127 and abs(dy) <= 127:
-            # Movimento direto se está dentro do limite
-            if not send_command(ser, f"R {dx} {dy}"):
-                print("[MOUSE] Erro ao mover")
-                return False
-            time.sleep(0.05)
-        else:
-            # Movimento em passos
-            step_x = max(-127, min(127, dx))
-            step_y = max(-127, min(127, dy))
-            if not send_command(ser, f"R {step_x} {step_y}"):
-                print("[MOUSE] Erro ao mover")
-                return False
-            time.sleep(0.03)
+        moved = ser.move_relative(x - curr_x, y - curr_y, before=before)
+    if not moved:
+        print("[MOUSE] Erro ao mover")
+        return False
+    time.sleep(MOVE_SETTLE)
     
-    # Verificação final crítica
-    time.sleep(0.15)
+    # Verificação única: corrige o resíduo (arredondamento/aceleração) em uma rajada
     final_x, final_y = pg.position()
     error = abs(x - final_x) + abs(y - final_y)
+    if error > 0:
+        print(f"[MOUSE] Erro de {error}px, fazendo correção...")
+        ser.move_relative(x - final_x, y - final_y)
+        time.sleep(MOVE_SETTLE)
+        final_x, final_y = pg.position()
+        error = abs(x - final_x) + abs(y - final_y)
     print(f"[MOUSE] Final: ({final_x},{final_y}) - Erro: {error}px")
     
-    # Se o erro é muito grande, tenta uma correção final
-    if error > 5:
-        print(f"[MOUSE] Erro alto ({error}px), fazendo correção final...")
-        correction_dx = x - final_x
-        correction_dy = y - final_y
-        if abs(correction_dx) <= 127 and abs(correction_dy) <= 127:
-            send_command(ser, f"R {correction_dx} {correction_dy}")
-            time.sleep(0.1)
-    
-    # Pausa crítica antes do clique
-    time.sleep(0.3)
-    
     # Executa clique
     if right_click:
         result = send_command(ser, "CR")
         print("[MOUSE] Clique direito executado")
     else:
-        result = send_command(ser, "C")
+        result = send_command(ser, "CL")
         print("[MOUSE] Clique esquerdo executado")
     
     time.sleep(0.3)  # Pausa após clicar
@@ -116,7 +99,7 @@ def click_at_position(ser, x, y, right_click=False):
 
 def press_space(ser):
     print("[TECLADO] Pressionando ESPACO")
-    return send_command(ser, "KE SPACE")
+    return send_command(ser, "K SPACE")
 
 def press_p(ser):
     print("[TECLADO] Pressionando P")
@@ -124,7 +107,7 @@ def press_p(ser):
 
 def press_backslash(ser):
     print("[TECLADO] Pressionando \\")
-    return send_command(ser, "KE \\")
+    return send_command(ser, "KT \\")
 
 def press_key_3(ser):
     print("[HEALING] Pressionando tecla 3")
@@ -144,41 +127,9 @@ def get_hp_by_color_detection():
         screenshot = pg.screenshot(region=(x, y, width, height))
         img_array = np.array(screenshot)
         
-        total_pixels = 0
-        full_hp_pixels = 0      # hpcheio.png - Verde intenso
-        hp80_pixels = 0         # hp80p.png - Verde musgo
-        medium_hp_pixels = 0    # hpmedio.png - Amarelo/laranja
-        low_hp_pixels = 0       # hpbaixo.png - Vermelho
-        
-        # Analisa cada pixel
-        for py in range(height):
-            for px in range(width):
-                try:
-                    b, g, r = img_array[py, px][:3]  # BGR
-                    
-                    # Pula pixels muito escuros (background)
-                    if r < 50 and g < 50 and b < 50:
-                        continue
-                        
-                    total_pixels += 1
-                    
-                    # hpcheio.png - Verde intenso (HP cheio)
-                    if g > 150 and r < 100 and b < 100 and g > r + 30:
-                        full_hp_pixels += 1
-                    # hp80p.png - Verde musgo (HP 80%)
-                    elif g > 120 and r > 80 and r < 140 and b < 80 and g > r:
-                        hp80_pixels += 1
-                    # hpmedio.png - Amarelo/laranja (DETECÇÃO AMPLIADA)
-                    elif (r > 120 and g > 90 and b < 100 and r >= g) or \
-                         (r > 100 and g > 80 and b < 80 and r > g - 10) or \
-                         (r + g > 180 and b < 100 and abs(r - g) < 60):
-                        medium_hp_pixels += 1
-                    # hpbaixo.png - Vermelho
-                    elif r > 150 and g < 100 and b < 100 and r > g + 50:
-                        low_hp_pixels += 1
-                        
-                except (IndexError, ValueError):
-                    continue
+        # Contagem vetorizada: cheio (hpcheio.png), 80% (hp80p.png),
+        # médio (hpmedio.png) e baixo (hpbaixo.png) em uma passada NumPy
+        total_pixels, full_hp_pixels, hp80_pixels, medium_hp_pixels, low_hp_pixels = count_hp_pixels(img_array)
         
         if total_pixels == 0:
             return "unknown"
@@ -193,19 +144,7 @@ def get_hp_by_color_detection():
         print(f"[HP DEBUG] Total: {total_pixels}, Cheio: {full_hp_pixels} ({full_ratio:.2%}), 80%: {hp80_pixels} ({hp80_ratio:.2%}), Médio: {medium_hp_pixels} ({medium_ratio:.2%}), Baixo: {low_hp_pixels} ({low_ratio:.2%})")
         
         # Determina estado do HP baseado nas imagens
-        if full_ratio > 0.3:  # HP cheio (hpcheio.png)
-            return "full"
-        elif hp80_ratio > 0.3:  # HP 80% (hp80p.png)
-            return "high"
-        elif medium_ratio > 0.01 or (total_pixels > 1000 and medium_ratio > 0.005):  # HP médio - MUITO SENSÍVEL
-            return "medium"
-        elif low_ratio > 0.1:  # HP baixo (hpbaixo.png)
-            return "low"
-        # Se detectou qualquer pixel que não é verde cheio, considera médio
-        elif total_pixels > 500 and full_ratio < 0.8 and hp80_ratio < 0.2:
-            return "medium"  # Assume médio se não é verde suficiente
-        else:
-            return "unknown"
+        return decide_hp_state(total_pixels, full_hp_pixels, hp80_pixels, medium_hp_pixels, low_hp_pixels)
             
     except Exception as e:
         print(f"[HEALING] Erro na detecção de HP: {e}")
@@ -219,6 +158,10 @@ def check_and_heal(ser):
     if not HEALING_ENABLED:
         print("[HEALING] Sistema desabilitado!")
         return False
+    
+    # Thread dedicada já cuida do healing em alta frequência
+    if healer is not None and healer.is_alive():
+        return False
         
     try:
         hp_state = get_hp_by_color_detection()
@@ -252,26 +195,15 @@ def quick_enemy_check(mummy_image, bonebeast_image, scarab_image):
     Retorna o primeiro inimigo encontrado ou None
     """
     try:
-        # Verifica mummy rapidamente
-        mummy_pos = pg.locateCenterOnScreen(mummy_image, confidence=0.7)
-        if mummy_pos and 10 < mummy_pos.x < pg.size().width - 10 and 10 < mummy_pos.y < pg.size().height - 10:
-            return ("mummy", (int(mummy_pos.x), int(mummy_pos.y)))
-    except:
-        pass
-    
-    try:
-        # Verifica bonebeast rapidamente
-        bonebeast_pos = pg.locateCenterOnScreen(bonebeast_image, confidence=0.7)
-        if bonebeast_pos and 10 < bonebeast_pos.x < pg.size().width - 10 and 10 < bonebeast_pos.y < pg.size().height - 10:
-            return ("bonebeast", (int(bonebeast_pos.x), int(bonebeast_pos.y)))
-    except:
-        pass
-    
-    try:
-        # Verifica scarab rapidamente
-        scarab_pos = pg.locateCenterOnScreen(scarab_image, confidence=0.7)
-        if scarab_pos and 10 < scarab_pos.x < pg.size().width - 10 and 10 < scarab_pos.y < pg.size().height - 10:
-            return ("scarab", (int(scarab_pos.x), int(scarab_pos.y)))
+        # Os 3 inimigos no MESMO frame, classe por classe (mummy > bonebeast > scarab):
+        # a primeira classe confirmada encerra a busca, as menores nem são buscadas
+        frame = frames.grab()
+        templates = {"mummy": mummy_image, "bonebeast": bonebeast_image, "scarab": scarab_image}
+        for group in priority_groups(templates, ENEMY_PRIORITY):
+            for hit in match_many(group, frame, confidence=0.7, priorities=ENEMY_PRIORITY, workers=MATCH_WORKERS):
+                x, y = hit.pos
+                if 10 < x < frame.width - 10 and 10 < y < frame.height - 10:
+                    return (hit.name, (int(x), int(y)))
     except:
         pass
     
@@ -316,9 +248,7 @@ def monitored_wait(ser, seconds, msg, mummy_image, bonebeast_image, scarab_image
             
             # Clica no inimigo imediatamente
             print(f"[INTERRUPT] Pressionando \\ antes de atacar {enemy_name}...")
-            press_backslash(ser)
-            time.sleep(0.2)
-            if click_at_position(ser, enemy_pos[0], enemy_pos[1]):
+            if click_at_position(ser, enemy_pos[0], enemy_pos[1], before=BACKSLASH_STEPS):
                 print(f"[INTERRUPT] {enemy_name.upper()} atacado! Total encontrados: {enemies_found_count}")
                 # Delays específicos por inimigo
                 if enemy_name == "mummy":
@@ -391,6 +321,35 @@ def locate_image(image_path, timeout=LOCATE_TIMEOUT, confidence=CONFIDENCE):
     print(f"[TIMEOUT] {filename} nao encontrado")
     return None
 
+def locate_image_cascade(image_path, ladder, timeout=LOCATE_TIMEOUT):
+    """
+    Busca de flag com escada de confiança (ex: 0.8/0.7/0.6) e UM mapa de
+    correlação por frame: o melhor match é o mesmo para qualquer degrau
+    A escada é o limiar da tentativa: o primeiro frame com score >= ladder[-1] vale
+    Retorna ((x, y), confiança atingida) ou (None, None) no timeout
+    """
+    filename = os.path.basename(image_path)
+    if not os.path.exists(image_path):
+        print(f"[ERRO] Imagem nao encontrada: {image_path}")
+        return None, None
+    print(f"[BUSCA] {filename} (confidence={'/'.join(f'{c:.1f}' for c in ladder)}, timeout={timeout:.1f}s)...")
+    deadline = time.time() + timeout
+    
+    while time.time() < deadline:
+        try:
+            frame = frames.grab()
+            pos, rung = locate_cascade(image_path, frame, ladder, pyramid=True)
+            # Verifica se a posição é válida (não nos cantos da tela)
+            if pos and 10 < pos[0] < frame.width - 10 and 10 < pos[1] < frame.height - 10:
+                print(f"[OK] {filename} encontrado em {pos} com confidence {rung}")
+                return (int(pos[0]), int(pos[1])), rung
+        except Exception as e:
+            pass
+        time.sleep(0.3)  # Pausa um pouco mais para detecção precisa
+    
+    print(f"[TIMEOUT] {filename} nao encontrado")
+    return None, None
+
 def find_and_click_specific_enemy(ser, mummy_image, bonebeast_image, scarab_image):
     """
     Procura APENAS por mummy, bonebeast e scarab na tela e clica no primeiro encontrado.
@@ -404,10 +363,8 @@ def find_and_click_specific_enemy(ser, mummy_image, bonebeast_image, scarab_imag
         mummy_pos = locate_image(mummy_image, timeout=1.5, confidence=0.8)
         if mummy_pos:
             print(f"[ENEMY] MUMMY confirmado em {mummy_pos}! Pressionando \\ antes do ataque...")
-            press_backslash(ser)  # PRESSIONA \ ANTES DO ATAQUE
-            time.sleep(0.2)
             print(f"[ENEMY] Clicando na MUMMY...")
-            if click_at_position(ser, mummy_pos[0], mummy_pos[1]):
+            if click_at_position(ser, mummy_pos[0], mummy_pos[1], before=BACKSLASH_STEPS):  # \ ANTES DO ATAQUE
                 print("[ENEMY] Clique na MUMMY enviado com sucesso!")
                 print("[ENEMY] Aguardando 5 segundos após atacar MUMMY...")
                 time.sleep(5.0)  # DELAY MUMMY: 5 SEGUNDOS
@@ -421,10 +378,8 @@ def find_and_click_specific_enemy(ser, mummy_image, bonebeast_image, scarab_imag
         bonebeast_pos = locate_image(bonebeast_image, timeout=1.5, confidence=0.8)
         if bonebeast_pos:
             print(f"[ENEMY] BONEBEAST confirmado em {bonebeast_pos}! Pressionando \\ antes do ataque...")
-            press_backslash(ser)  # PRESSIONA \ ANTES DO ATAQUE
-            time.sleep(0.2)
             print(f"[ENEMY] Clicando no BONEBEAST...")
-            if click_at_position(ser, bonebeast_pos[0], bonebeast_pos[1]):
+            if click_at_position(ser, bonebeast_pos[0], bonebeast_pos[1], before=BACKSLASH_STEPS):  # \ ANTES DO ATAQUE
                 print("[ENEMY] Clique no BONEBEAST enviado com sucesso!")
                 print("[ENEMY] Aguardando 8 segundos após atacar BONEBEAST...")
                 time.sleep(8.0)  # DELAY BONEBEAST: 8 SEGUNDOS
@@ -438,10 +393,8 @@ def find_and_click_specific_enemy(ser, mummy_image, bonebeast_image, scarab_imag
         scarab_pos = locate_image(scarab_image, timeout=1.5, confidence=0.8)
         if scarab_pos:
             print(f"[ENEMY] SCARAB confirmado em {scarab_pos}! Pressionando \\ antes do ataque...")
-            press_backslash(ser)  # PRESSIONA \ ANTES DO ATAQUE
-            time.sleep(0.2)
             print(f"[ENEMY] Clicando no SCARAB...")
-            if click_at_position(ser, scarab_pos[0], scarab_pos[1]):
+            if click_at_position(ser, scarab_pos[0], scarab_pos[1], before=BACKSLASH_STEPS):  # \ ANTES DO ATAQUE
                 print("[ENEMY] Clique no SCARAB enviado com sucesso!")
                 print("[ENEMY] Aguardando 6 segundos após atacar SCARAB...")
                 time.sleep(6.0)  # DELAY SCARAB: 6 SEGUNDOS
@@ -631,9 +584,7 @@ def main_loop(ser):
                             enemy_name, enemy_pos = enemy_found
                             print(f"[INTERRUPT] {enemy_name.upper()} detectado durante busca de {flag_name}!")
                             print(f"[INTERRUPT] Pressionando \\ antes de atacar {enemy_name}...")
-                            press_backslash(ser)
-                            time.sleep(0.2)
-                            if click_at_position(ser, enemy_pos[0], enemy_pos[1]):
+                            if click_at_position(ser, enemy_pos[0], enemy_pos[1], before=BACKSLASH_STEPS):
                                 print(f"[INTERRUPT] {enemy_name.upper()} atacado durante busca!")
                                 # Delay específico baseado no inimigo
                                 if enemy_name == "mummy":
@@ -651,15 +602,16 @@ def main_loop(ser):
                         # Também verifica healing durante busca
                         check_and_heal(ser)
                         
-                        # Usa confidence 0.8 para melhor precisão nas flags, depois reduz
-                        confidence = 0.8 if attempt < 2 else 0.7 if attempt < 4 else 0.6
-                        print(f"[DEBUG] Tentativa {attempt + 1}/5 com confidence {confidence}")
-                        pos = locate_image(flag_path, timeout=10.0, confidence=confidence)
+                        # Usa confidence 0.8 para melhor precisão nas flags, depois libera 0.7 e 0.6
+                        # (mesmo mapa responde todos os degraus liberados)
+                        ladder = FLAG_CONFIDENCE_LADDER[:1 if attempt < 2 else 2 if attempt < 4 else 3]
+                        print(f"[DEBUG] Tentativa {attempt + 1}/5 com confidence até {ladder[-1]}")
+                        pos, confidence = locate_image_cascade(flag_path, ladder, timeout=10.0)
                         if pos:
                             print(f"[{flag_name}] Detectada na tentativa {attempt + 1} com confidence {confidence}")
                             flag_found = True
                             break
-                        print(f"[RETRY] Tentativa {attempt + 1}/5 para {flag_name} (confidence {confidence})")
+                        print(f"[RETRY] Tentativa {attempt + 1}/5 para {flag_name} (confidence até {ladder[-1]})")
                         wait_exact(1.0)
                     
                     if not flag_found or not pos: 
@@ -781,6 +733,7 @@ def main_loop(ser):
             wait_exact(5.0)
 
 def main():
+    global healer
     print(f"\n[SERIAL] Conectando {COM_PORT} @ {BAUD_RATE}...")
     print("MUMMY BOT - 3 Inimigos, 18 Flags - MONITORAMENTO + HEALING")
     print("Configuração:")
@@ -811,10 +764,22 @@ def main():
             ser.reset_input_buffer()
             print("[OK] Arduino pronto!\n")
             print(f"[HEALING] Sistema de healing {'ATIVADO' if HEALING_ENABLED else 'DESATIVADO'}")
+            # Porta compartilhada: bot principal + thread de healing (com prioridade)
+            link = HidClient(SerialLink(ser))
+            link.discover()
             if HEALING_ENABLED:
+                get_hp_lut("cave")  # Tabela de cores do HP (cache em disco)
                 print(f"[HEALING] Região do HP: {HP_REGION}")
                 print(f"[HEALING] HP médio → Tecla 3")
-            main_loop(ser)
+                if HEALING_THREAD:
+                    healer = HealingWorker(link, HP_REGION, {"medium": ("KT 3", 1.0)}, hz=HEALING_HZ)
+                    healer.start()
+            try:
+                main_loop(link)
+            finally:
+                if healer:
+                    healer.stop()
+                link.close()
     except serial.SerialException as e:
         print(f"[ERRO] Serial: {e}")
     except KeyboardInterrupt:
@@ -0,0 +1,204 @@
+# -*- coding: utf-8 -*-
+"""
+ROI Priors - Região de busca por template aprendida do histórico de matches
+Cada template começa com uma região padrão pelo grupo (minimapa para flags,
+área de jogo para inimigos e loot, lista de batalha para as bordas de batalha)
+e, depois de alguns acertos, passa a usar a caixa onde ele realmente apareceu.
+A busca tenta primeiro a ROI e só cai para a tela inteira quando não acha.
+O histórico fica em cache/roi_priors.json entre execuções.
+"""
+
+import json
+import os
+from vision import best_match, ladder_rung, match_many, priority_groups, pyramid_match
+
+ROI_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "cache", "roi_priors.json")
+
+# Regiões padrão por prefixo do nome no registro, em frações da tela (x, y, largura, altura)
+# A primeira regra que casar vale (battle_* antes de enemy/)
+DEFAULT_ROIS = (
+    ("enemy/battle_", (0.78, 0.15, 0.22, 0.70)),   # Lista de batalha (lateral direita)
+    ("flags/", (0.78, 0.00, 0.22, 0.35)),          # Minimapa (canto superior direito)
+    ("enemy/", (0.00, 0.00, 0.80, 0.85)),          # Área de jogo
+    ("loot/", (0.00, 0.00, 0.80, 0.85)),           # Área de jogo
+)
+
+ROI_MARGIN = 48    # Folga (px) em volta da caixa aprendida
+MIN_HITS = 3       # Acertos antes de trocar a região padrão pela aprendida
+SAVE_EVERY = 25    # Novos acertos entre gravações do JSON
+
+
+class RoiPriors:
+    """Região de busca por template (nome do registro) com fallback para a tela inteira"""
+
+    def __init__(self, path=ROI_PATH, defaults=DEFAULT_ROIS, margin=ROI_MARGIN, min_hits=MIN_HITS,
+                 pyramid=True):
+        self.path = path
+        self.pyramid = pyramid  # Busca na tela inteira em dois níveis (vision.pyramid_match)
+        self.defaults = defaults
+        self.margin = margin
+        self.min_hits = min_hits
+        self.priors = {}
+        self.roi_hits = 0
+        self.fallbacks = 0
+        self.avoided = 0       # Templates não buscados graças ao early-exit por prioridade
+        self.last_avoided = 0  # Idem, só na última chamada (por tick)
+        self._unsaved = 0
+        self.load()
+
+    # ---------- Persistência ----------
+
+    def load(self):
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                self.priors = json.load(f)
+        except (OSError, ValueError):
+            self.priors = {}
+
+    def save(self):
+        if self.path is None:
+            return  # Execução headless: não grava priors aprendidos de frames gravados
+        try:
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            tmp = self.path + ".tmp"
+            with open(tmp, "w", encoding="utf-8") as f:
+                json.dump(self.priors, f, indent=1, sort_keys=True)
+            os.replace(tmp, self.path)
+            self._unsaved = 0
+        except OSError as e:
+            print(f"[ROI] Não foi possível salvar {self.path}: {e}")
+
+    # ---------- Regiões ----------
+
+    def _default_roi(self, name, frame):
+        for prefix, (fx, fy, fw, fh) in self.defaults:
+            if name.startswith(prefix):
+                return (int(fx * frame.width), int(fy * frame.height),
+                        int(fw * frame.width), int(fh * frame.height))
+        return None
+
+    def roi_for(self, name, frame):
+        """(left, top, width, height) onde procurar primeiro, ou None (tela inteira)"""
+        prior = self.priors.get(name)
+        if prior and prior["hits"] >= self.min_hits and prior["frame"] == [frame.width, frame.height]:
+            x0, y0, x1, y1 = prior["box"]
+            left = max(0, x0 - self.margin)
+            top = max(0, y0 - self.margin)
+            right = min(frame.width, x1 + self.margin)
+            bottom = min(frame.height, y1 + self.margin)
+            return (left, top, right - left, bottom - top)
+        return self._default_roi(name, frame)
+
+    def record(self, name, box, frame):
+        """Acumula a caixa (left, top, width, height) de um match na ROI do template"""
+        x0, y0 = int(box[0]), int(box[1])
+        x1, y1 = x0 + int(box[2]), y0 + int(box[3])
+        size = [frame.width, frame.height]
+        prior = self.priors.get(name)
+        if prior is None or prior["frame"] != size:
+            self.priors[name] = {"hits": 1, "box": [x0, y0, x1, y1], "frame": size}
+        else:
+            bx0, by0, bx1, by1 = prior["box"]
+            prior["box"] = [min(bx0, x0), min(by0, y0), max(bx1, x1), max(by1, y1)]
+            prior["hits"] += 1
+        self._unsaved += 1
+        if self._unsaved >= SAVE_EVERY:
+            self.save()
+
+    # ---------- Busca ----------
+
+    def _search(self, template, frame, roi_confidence, full_confidence):
+        """
+        ROI primeiro (aceita score >= roi_confidence), depois a tela inteira
+        Sem acerto na ROI, vale o maior score entre a ROI e a tela inteira
+        """
+        name = getattr(template, "name", None)
+        roi = self.roi_for(name, frame) if name is not None else None
+        roi_pos, roi_score = None, -1.0
+        if roi is not None:
+            roi_pos, roi_score = best_match(template, frame, region=roi)
+            if roi_score >= roi_confidence:
+                self.roi_hits += 1
+                self._record_hit(name, template, roi_pos, frame)
+                return roi_pos, roi_score
+            self.fallbacks += 1
+        full_match = pyramid_match if self.pyramid else best_match
+        pos, score = full_match(template, frame)
+        if roi_score > score:
+            pos, score = roi_pos, roi_score  # A pirâmide pode perder o pico que a ROI viu
+        if score < full_confidence:
+            return None, score
+        if name is not None:
+            self._record_hit(name, template, pos, frame)
+        return pos, score
+
+    def _record_hit(self, name, template, pos, frame):
+        h, w = template.height, template.width
+        self.record(name, (pos[0] - w // 2, pos[1] - h // 2, w, h), frame)
+
+    def locate(self, template, frame, confidence=0.8, fallback_confidence=None):
+        """
+        locate_center com ROI: primeiro a região do template, depois a tela inteira
+        fallback_confidence: confiança da busca na tela inteira (padrão = confidence)
+        Templates sem nome (arrays, caminhos) vão direto para a tela inteira
+        """
+        full_confidence = confidence if fallback_confidence is None else fallback_confidence
+        return self._search(template, frame, confidence, full_confidence)[0]
+
+    def locate_cascade(self, template, frame, ladder):
+        """
+        Escada de confiança (ex: 0.8/0.7) com um mapa por área buscada
+        A ROI só encerra a busca no degrau de cima: abaixo dele a tela inteira
+        também é buscada (um 0.8 fora da ROI aprendida ganha de um 0.7 dentro)
+        Retorna ((x, y), confiança atingida) ou (None, None)
+        """
+        pos, score = self._search(template, frame, max(ladder), min(ladder))
+        if pos is None:
+            return None, None
+        return pos, ladder_rung(score, ladder)
+
+    def locate_many(self, templates, frame, confidence=0.8, priorities=None, workers=0, early_exit=False):
+        """
+        match_many com ROI: cada template na sua região; os que não acharam
+        nada na ROI são refeitos juntos na tela inteira
+        early_exit=True busca classe por classe (maior prioridade primeiro) e
+        para na primeira que tiver match; as classes menores nem são buscadas
+        Retorna lista de Hit, maior prioridade primeiro
+        """
+        if early_exit:
+            groups = priority_groups(templates, priorities or {})
+            for index, group in enumerate(groups):
+                hits = self.locate_many(group, frame, confidence, priorities, workers)
+                if hits:
+                    self.last_avoided = sum(len(rest) for rest in groups[index + 1:])
+                    self.avoided += self.last_avoided
+                    return hits
+            self.last_avoided = 0
+            return []
+
+        regions = {}
+        for name, template in templates.items():
+            roi = self.roi_for(template.name, frame) if hasattr(template, "name") else None
+            if roi is not None:
+                regions[name] = roi
+        hits = match_many(templates, frame, confidence, priorities, regions, workers=workers)
+        found = {hit.name for hit in hits}
+        missed = {name: t for name, t in templates.items() if name in regions and name not in found}
+        self.roi_hits += len(found & set(regions))
+        self.fallbacks += len(missed)
+        if missed:
+            hits += match_many(missed, frame, confidence, priorities, workers=workers, pyramid=self.pyramid)
+            hits.sort(key=lambda hit: (hit.priority, hit.score), reverse=True)
+        for hit in hits:
+            template = templates[hit.name]
+            if hasattr(template, "name"):
+                self._record_hit(template.name, template, hit.pos, frame)
+        return hits
+
+    def stats(self):
+        total = self.roi_hits + self.fallbacks
+        rate = 100.0 * self.roi_hits / total if total else 0.0
+        summary = f"{self.roi_hits}/{total} buscas resolvidas na ROI ({rate:.0f}%)"
+        if self.avoided:
+            summary += f", {self.avoided} buscas evitadas pela prioridade"
+        return summary
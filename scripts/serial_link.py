@@ -0,0 +1,301 @@
+# -*- coding: utf-8 -*-
+"""
+Serial Link - Canal de comandos com pipeline para o Arduino HID
+Uma thread escritora consome a fila de comandos e uma thread leitora casa cada
+resposta OK / ERR do firmware com o comando correspondente (o firmware responde
+na mesma ordem em que recebe). Quem chama pode aguardar a confirmação ou seguir
+sem esperar (fire and forget): a latência passa a ser o round trip USB real,
+sem sleeps fixos.
+Comandos com priority=True (healing) passam na frente da fila do host; no
+firmware, a fila de prioridade ("!KT 3", ver HidClient.send) evita também as
+pausas já enfileiradas na placa.
+Com enable_binary() os comandos seguem como frames de 8 bytes (hid_protocol.py)
+e cada ack é casado pelo número de sequência, não pela ordem. No texto, firmware
+com SEQ (enable_tags) faz o mesmo: "#7 KT 3" -> "#7 OK". Sem id, uma resposta
+perdida desalinharia todas as seguintes: depois de um timeout o writer para até
+a lista esvaziar e descarta o resto da entrada (ressincronização).
+"""
+
+import collections
+import itertools
+import queue
+import threading
+import time
+from hid_protocol import ACK_LEN, ACK_SYNC, STATUS_NAMES, STATUS_OK, decode_reply, encode_command
+
+ACK_TIMEOUT = 1.0   # Tempo máximo esperando OK/ERR de um comando
+MAX_IN_FLIGHT = 4   # Comandos enviados sem resposta (buffer RX do ATmega32u4 = 64 bytes)
+RESYNC_QUIET = 0.2  # Texto sem id: silêncio antes de voltar a enviar depois de um timeout (s)
+
+
+class PendingCommand:
+    """Comando enviado aguardando OK/ERR"""
+
+    def __init__(self, cmd):
+        self.cmd = cmd
+        self.ok = False
+        self.reply = None
+        self.seq = None
+        self.sent_at = None
+        self.done_at = None
+        self._event = threading.Event()
+
+    def resolve(self, ok, reply):
+        self.ok = ok
+        self.reply = reply
+        self.done_at = time.perf_counter()
+        self._event.set()
+
+    def wait(self, timeout=ACK_TIMEOUT):
+        """Aguarda a resposta; retorna True se o firmware respondeu OK"""
+        self._event.wait(timeout)
+        return self.ok
+
+    @property
+    def done(self):
+        return self._event.is_set()
+
+    @property
+    def latency(self):
+        if self.sent_at is None or self.done_at is None:
+            return None
+        return self.done_at - self.sent_at
+
+
+class SerialLink:
+    """Envolve o serial.Serial com fila de escrita + leitura de confirmações"""
+
+    def __init__(self, ser, max_in_flight=MAX_IN_FLIGHT, ack_timeout=ACK_TIMEOUT):
+        self.ser = ser
+        self.max_in_flight = max_in_flight
+        self.ack_timeout = ack_timeout
+        self._queue = queue.PriorityQueue()
+        self._seq = itertools.count()
+        self._in_flight = collections.deque()
+        self._cond = threading.Condition()
+        self._running = True
+        self.binary = False
+        self.tagged = False   # Texto com id "#n" (firmware com SEQ)
+        self._resync = False  # Texto sem id: timeout pendente de ressincronização
+        self._frame_seq = itertools.count()
+        self.errors = 0
+        self.timeouts = 0
+        self._writer = threading.Thread(target=self._write_loop, name="serial-writer", daemon=True)
+        self._reader = threading.Thread(target=self._read_loop, name="serial-reader", daemon=True)
+        self._writer.start()
+        self._reader.start()
+
+    # ---------- API ----------
+
+    def send(self, cmd, priority=False, wait=True, timeout=None):
+        """
+        Enfileira um comando
+        wait=True  -> bloqueia até OK/ERR e retorna True/False
+        wait=False -> retorna o PendingCommand imediatamente (fire and forget)
+        """
+        pending = PendingCommand(cmd)
+        self._queue.put((0 if priority else 1, next(self._seq), pending))
+        if not wait:
+            return pending
+        return pending.wait(self.ack_timeout + 0.5 if timeout is None else timeout)
+
+    def enable_binary(self):
+        """Passa o firmware para o protocolo binário (comando "BIN")"""
+        if self.binary:
+            return True
+        if not self.send("BIN"):
+            print("[SERIAL] Firmware não aceitou o modo binário - mantendo texto")
+            return False
+        print("[SERIAL] Protocolo binário ativado")
+        return True
+
+    def enable_tags(self):
+        """Firmware com SEQ: respostas de texto casadas pelo id "#n", não pela ordem"""
+        self.tagged = True
+
+    def close(self):
+        self._running = False
+        self._queue.put((-1, next(self._seq), None))
+        with self._cond:
+            self._cond.notify_all()
+
+    # ---------- Threads ----------
+
+    def _expire(self):
+        """
+        Descarta comandos sem resposta há mais de ack_timeout (chamar com _cond)
+        Com id (binário, texto "#n") a resposta atrasada não casa com mais nada;
+        sem id, o timeout pede ressincronização (ver _write_loop)
+        """
+        now = time.perf_counter()
+        for pending in [p for p in self._in_flight if now - p.sent_at > self.ack_timeout]:
+            self._in_flight.remove(pending)
+            self.timeouts += 1
+            pending.resolve(False, None)
+            print(f"[SERIAL] Sem resposta para '{pending.cmd}'")
+            if pending.seq is None:
+                self._resync = True
+        self._cond.notify_all()
+
+    def _resynchronize(self):
+        """Texto sem id: nada em voo; espera o silêncio e descarta o que sobrou na entrada"""
+        time.sleep(RESYNC_QUIET)
+        try:
+            self.ser.reset_input_buffer()
+        except Exception as e:
+            print(f"[SERIAL] Erro ao limpar a entrada: {e}")
+        print("[SERIAL] Respostas ressincronizadas após timeout")
+
+    def _write_loop(self):
+        while self._running:
+            _, _, pending = self._queue.get()
+            if pending is None:
+                break
+            if self.binary:
+                pending.seq = next(self._frame_seq) & 0xFF
+                data = encode_command(pending.seq, pending.cmd)
+                if data is None:
+                    self.errors += 1
+                    print(f"[SERIAL] '{pending.cmd}' não existe no protocolo binário")
+                    pending.resolve(False, "ERR ENCODE")
+                    continue
+            elif self.tagged:
+                pending.seq = next(self._frame_seq) & 0xFF
+                data = f"#{pending.seq} {pending.cmd}\n".encode('utf-8')
+            else:
+                data = f"{pending.cmd}\n".encode('utf-8')
+            with self._cond:
+                # Depois de um timeout sem id: nada novo até os comandos em voo resolverem
+                while self._running and (len(self._in_flight) >= self.max_in_flight
+                                         or (self._resync and self._in_flight)):
+                    self._cond.wait(0.05)
+                    self._expire()
+                if not self._running:
+                    break
+                resync, self._resync = self._resync, False
+            if resync:
+                self._resynchronize()
+            with self._cond:
+                pending.sent_at = time.perf_counter()
+                self._in_flight.append(pending)
+            try:
+                self.ser.write(data)
+                self.ser.flush()
+                if pending.cmd == "BIN":
+                    # Nada mais é escrito até a troca de protocolo ser confirmada
+                    pending.wait(self.ack_timeout)
+            except Exception as e:
+                print(f"[SERIAL] Erro ao enviar '{pending.cmd}': {e}")
+                with self._cond:
+                    if pending in self._in_flight:
+                        self._in_flight.remove(pending)
+                    self._cond.notify_all()
+                pending.resolve(False, None)
+
+    def _read_binary(self):
+        """Lê um ack de 3 bytes (ressincroniza no byte 5A)"""
+        head = self.ser.read(1)
+        if not head or head[0] != ACK_SYNC:
+            return
+        reply = decode_reply(head + self.ser.read(ACK_LEN - 1))
+        if reply is None:
+            return
+        seq, status = reply
+        with self._cond:
+            pending = next((p for p in self._in_flight if p.seq == seq and not p.done), None)
+            if pending is not None:
+                self._in_flight.remove(pending)
+            self._cond.notify_all()
+        if pending is None:
+            return
+        text = STATUS_NAMES.get(status, f"ERR {status}")
+        if status != STATUS_OK:
+            self.errors += 1
+            print(f"[SERIAL] '{pending.cmd}' -> {text}")
+        pending.resolve(status == STATUS_OK, text)
+
+    def _read_loop(self):
+        while self._running:
+            if self.binary:
+                try:
+                    self._read_binary()
+                except Exception as e:
+                    print(f"[SERIAL] Erro de leitura: {e}")
+                    time.sleep(0.1)
+                with self._cond:
+                    self._expire()
+                continue
+            try:
+                line = self.ser.readline()
+            except Exception as e:
+                print(f"[SERIAL] Erro de leitura: {e}")
+                time.sleep(0.1)
+                continue
+            with self._cond:
+                self._expire()
+            if not line:
+                continue
+            reply = line.decode('utf-8', errors='replace').strip()
+            seq = None
+            if reply.startswith("#"):
+                tag, _, reply = reply[1:].partition(" ")
+                seq = int(tag) if tag.isdigit() else None
+            ok = reply == "OK" or reply.startswith("OK ")  # "OK <dados>" (ex: resposta do CAPS)
+            if not ok and not reply.startswith("ERR"):
+                if reply:
+                    print(f"[ARDUINO] {reply}")
+                continue
+            with self._cond:
+                # Com id: o comando daquele id; sem id: o mais antigo sem id (ordem)
+                pending = next((p for p in self._in_flight if p.seq == seq), None)
+                if pending is not None:
+                    self._in_flight.remove(pending)
+                self._cond.notify_all()
+            if pending is None:
+                print(f"[SERIAL] Resposta sem comando pendente (atrasada?): {line.decode('utf-8', errors='replace').strip()}")
+                continue
+            if not ok:
+                self.errors += 1
+                print(f"[SERIAL] '{pending.cmd}' -> {reply}")
+            elif pending.cmd == "BIN":
+                self.binary = True
+            pending.resolve(ok, reply)
+
+
+# Capacidades anunciadas pelo DryRunLink (mesmas do firmware atual)
+DRY_RUN_CAPS = "B1 B0 M MA ABS CL CR CM CD AC K KT T P S X BIN PRI SEQ"
+
+
+class DryRunLink:
+    """
+    Mesmo contrato do SerialLink, sem Arduino (execução headless / replay)
+    Todo comando é aceito na hora e contado; "CAPS" responde com DRY_RUN_CAPS
+    """
+
+    def __init__(self, caps=DRY_RUN_CAPS, ack_timeout=ACK_TIMEOUT, history=1000):
+        self.caps = caps
+        self.ack_timeout = ack_timeout
+        self.binary = False
+        self.errors = 0
+        self.timeouts = 0
+        self.commands = 0
+        self.history = collections.deque(maxlen=history)  # Últimos comandos enviados
+
+    def send(self, cmd, priority=False, wait=True, timeout=None):
+        pending = PendingCommand(cmd)
+        pending.sent_at = time.perf_counter()
+        self.commands += 1
+        self.history.append(cmd)
+        pending.resolve(True, f"OK {self.caps}" if cmd == "CAPS" else "OK")
+        return True if wait else pending
+
+    def enable_binary(self):
+        self.binary = True
+        print("[SERIAL] Protocolo binário ativado (dry run)")
+        return True
+
+    def enable_tags(self):
+        pass
+
+    def close(self):
+        print(f"[SERIAL] Dry run: {self.commands} comando(s) simulado(s)")
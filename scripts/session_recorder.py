@@ -0,0 +1,213 @@
+# -*- coding: utf-8 -*-
+"""
+Session Recorder - Gravação opcional da sessão do bot para análise e replay
+Guarda os frames reduzidos (keyframe + só os tiles que mudaram), cada
+detecção e cada comando HID, todos com timestamp, em chunks .npz comprimidos:
+  <raiz>/<sessão>/chunk_000000.npz, chunk_000001.npz, ...
+Cada chunk começa com um keyframe, então continua decodificável sozinho
+quando os mais antigos são apagados para respeitar o limite de disco.
+No loop do bot só fica a redução do frame e uma fila; diff, compressão e
+escrita rodam numa thread própria.
+Os diretórios de sessão são lidos pelo ReplaySource (frame_source.py).
+"""
+
+import glob
+import json
+import os
+import queue
+import threading
+import time
+import cv2
+import numpy as np
+
+RECORD_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "recordings")
+
+RECORD_SCALE = 2           # Frames gravados em 1/2 da resolução (1 = resolução cheia)
+RECORD_TILE = 32           # Lado do tile do delta (px do frame reduzido)
+CHUNK_FRAMES = 120         # Frames por chunk (cada chunk abre com keyframe)
+MAX_BYTES = 512 * 2 ** 20  # Limite de disco de TODAS as sessões em RECORD_DIR
+QUEUE_SIZE = 32            # Frames pendentes antes de descartar (bot nunca espera o disco)
+FORMAT_VERSION = 1
+
+
+class SessionRecorder:
+    """Grava frames (reduzidos, em deltas), detecções e comandos de uma sessão"""
+
+    def __init__(self, root=RECORD_DIR, scale=RECORD_SCALE, tile=RECORD_TILE,
+                 chunk_frames=CHUNK_FRAMES, max_bytes=MAX_BYTES):
+        self.root = root
+        self.path = os.path.join(root, time.strftime("%Y%m%d-%H%M%S"))
+        self.scale = scale
+        self.tile = tile
+        self.chunk_frames = chunk_frames
+        self.max_bytes = max_bytes
+        self.frames = 0        # Frames entregues ao writer
+        self.dropped = 0       # Frames descartados com a fila cheia
+        self.events = 0
+        self.chunks = 0
+        self.deleted = 0       # Chunks apagados pelo limite de disco
+        self.bytes = 0
+        self._cost = 0.0       # Tempo gasto na thread do bot (s)
+        self._events = []
+        self._lock = threading.Lock()
+        self._queue = queue.Queue(maxsize=QUEUE_SIZE)
+        self._thread = threading.Thread(target=self._run, name="recorder", daemon=True)
+        os.makedirs(self.path, exist_ok=True)
+        self._thread.start()
+        print(f"[RECORD] Gravando sessão em {self.path} (1/{scale}, limite {max_bytes // 2 ** 20} MB)")
+
+    # ---------- API (thread do bot) ----------
+
+    def frame(self, frame):
+        """Enfileira o frame reduzido; descarta se o writer estiver atrasado"""
+        started = time.perf_counter()
+        if self.scale > 1:
+            small = frame.scaled(self.scale).copy()  # Copia: o slot do ring buffer é reaproveitado
+        else:
+            small = frame.image.copy()
+        try:
+            self._queue.put_nowait((frame.timestamp, small, (frame.width, frame.height)))
+            self.frames += 1
+        except queue.Full:
+            self.dropped += 1
+        self._cost += time.perf_counter() - started
+
+    def event(self, kind, **data):
+        """Registra uma detecção, comando HID etc. com timestamp"""
+        started = time.perf_counter()
+        data["t"] = time.time()
+        data["kind"] = kind
+        with self._lock:
+            self._events.append(data)
+            self.events += 1
+        self._cost += time.perf_counter() - started
+
+    def close(self):
+        self._queue.put(None)
+        self._thread.join(timeout=10.0)
+
+    def stats(self):
+        calls = self.frames + self.dropped + self.events
+        cost = 1e6 * self._cost / calls if calls else 0.0
+        per_frame = self.bytes / self.frames if self.frames else 0
+        return (f"{self.frames} frame(s), {self.events} evento(s), {self.dropped} descartado(s); "
+                f"{cost:.0f} us por chamada no loop do bot; {self.bytes / 2 ** 20:.1f} MB em "
+                f"{self.chunks} chunk(s) (~{per_frame / 1024:.0f} KB/frame), {self.deleted} apagado(s) pelo limite")
+
+    # ---------- Writer ----------
+
+    def _tiles(self, image):
+        """Imagem completada até múltiplo do tile, como (linhas, cols, tile, tile, 3)"""
+        t = self.tile
+        rows, cols = -(-image.shape[0] // t), -(-image.shape[1] // t)
+        padded = np.zeros((rows * t, cols * t, 3), dtype=np.uint8)
+        padded[:image.shape[0], :image.shape[1]] = image
+        return padded.reshape(rows, t, cols, t, 3).swapaxes(1, 2)
+
+    def _run(self):
+        arrays, meta, previous = {}, [], None
+        size = None
+        while True:
+            item = self._queue.get()
+            if item is None:
+                break
+            timestamp, small, size = item
+            tiles = self._tiles(small)
+            index = len(meta)
+            if index == 0 or previous is None or previous.shape != tiles.shape:
+                arrays[f"f{index}"] = small
+                meta.append({"t": timestamp, "key": True})
+            else:
+                changed = (tiles != previous).any(axis=(2, 3, 4))
+                rows, cols = np.nonzero(changed)
+                arrays[f"f{index}_rc"] = np.stack([rows, cols], axis=1).astype(np.int16)
+                arrays[f"f{index}_px"] = tiles[rows, cols]
+                meta.append({"t": timestamp, "key": False})
+            previous = tiles
+            if len(meta) >= self.chunk_frames:
+                self._write_chunk(arrays, meta, size, small.shape)
+                arrays, meta, previous = {}, [], None
+        if meta:
+            self._write_chunk(arrays, meta, size, small.shape)
+        else:
+            self._flush_events(size)
+
+    def _write_chunk(self, arrays, meta, size, small_shape):
+        with self._lock:
+            events, self._events = self._events, []
+        header = {
+            "version": FORMAT_VERSION, "scale": self.scale, "tile": self.tile,
+            "size": list(size) if size else None, "small": list(small_shape[:2]),
+            "frames": meta, "events": events,
+        }
+        arrays["meta"] = np.frombuffer(json.dumps(header, default=str).encode("utf-8"), dtype=np.uint8)
+        path = os.path.join(self.path, f"chunk_{self.chunks:06d}.npz")
+        try:
+            np.savez_compressed(path, **arrays)
+            self.bytes += os.path.getsize(path)
+            self.chunks += 1
+            self._enforce_limit()
+        except OSError as e:
+            print(f"[RECORD] Falha ao gravar {path}: {e}")
+
+    def _flush_events(self, size):
+        """Sessão sem frames novos desde o último chunk: grava só os eventos"""
+        with self._lock:
+            pending = bool(self._events)
+        if pending:
+            self._write_chunk({}, [], size, (0, 0))
+
+    def _enforce_limit(self):
+        """Apaga os chunks mais antigos (de qualquer sessão) acima de max_bytes"""
+        chunks = sorted(glob.glob(os.path.join(self.root, "*", "chunk_*.npz")), key=os.path.getmtime)
+        total = sum(os.path.getsize(path) for path in chunks)
+        while chunks and total > self.max_bytes:
+            oldest = chunks.pop(0)
+            total -= os.path.getsize(oldest)
+            os.remove(oldest)
+            self.deleted += 1
+
+
+# ===========================
+# LEITURA (replay)
+# ===========================
+
+def is_recording(path):
+    return os.path.isdir(path) and bool(glob.glob(os.path.join(path, "chunk_*.npz")))
+
+
+def _chunks(path):
+    for chunk_path in sorted(glob.glob(os.path.join(path, "chunk_*.npz"))):
+        with np.load(chunk_path) as chunk:
+            header = json.loads(chunk["meta"].tobytes().decode("utf-8"))
+            yield header, chunk
+
+
+def iter_frames(path, full_size=True):
+    """
+    Frames BGR de uma sessão gravada, na ordem: (timestamp, imagem)
+    full_size=True volta à resolução original (INTER_LINEAR)
+    """
+    for header, chunk in _chunks(path):
+        tile = header["tile"]
+        height, width = header["small"]
+        image = None
+        for index, info in enumerate(header["frames"]):
+            if info["key"]:
+                image = chunk[f"f{index}"].copy()
+            else:
+                for (row, col), pixels in zip(chunk[f"f{index}_rc"], chunk[f"f{index}_px"]):
+                    y, x = row * tile, col * tile
+                    h, w = min(tile, height - y), min(tile, width - x)
+                    image[y:y + h, x:x + w] = pixels[:h, :w]
+            if full_size and header["scale"] > 1:
+                yield info["t"], cv2.resize(image, tuple(header["size"]), interpolation=cv2.INTER_LINEAR)
+            else:
+                yield info["t"], image.copy()
+
+
+def iter_events(path):
+    """Eventos (detecções, comandos) de uma sessão gravada, na ordem de gravação"""
+    for header, _ in _chunks(path):
+        for event in header["events"]:
+            yield event
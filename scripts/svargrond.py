@@ -1,15 +1,18 @@
 # amazom.py - Automacao de batalha com deteccao de imagem e Arduino
 import os, time, pyautogui as pg, serial, ctypes
 from typing import Optional, Tuple
+from serial_link import SerialLink
+from hid_client import HidClient
 
 print("="*50)
 print("AMAZOM - Automacao com Arduino HID")
 print("="*50)
 
 COM_PORT = "COM11"  # Porta atualizada conforme disponível
-BAUD_RATE = 9600
+BAUD_RATE = 115200
 LOCATE_TIMEOUT = 20.0  # Aumentado para melhor detecção de flags
 CONFIDENCE = 0.8  # Aumentado para melhor precisão na detecção
+MOVE_SETTLE = 0.02  # Tempo para o cursor refletir a rajada de movimentos antes da verificação
 
 # Desativa mouse acceleration no Windows
 def disable_mouse_acceleration():
@@ -26,83 +29,46 @@ def wait_exact(seconds, msg="Aguardando"):
     time.sleep(seconds)
 
 def send_command(ser, cmd):
-    try:
-        ser.write((cmd + "\n").encode())
-        ser.flush()
-        return True
-    except Exception as e:
-        print(f"[SERIAL] Erro: {e}")
-        return False
+    # ser = HidClient; sem aguardar OK, False só se o firmware não suporta o comando
+    return bool(ser.send(cmd, wait=False))
 
-def click_at_position(ser, x, y, right_click=False):
+def click_at_position(ser, x, y, right_click=False, before=()):
+    """
+    Move com um único MA (firmware com ponteiro absoluto) ou com o plano completo
+    de passos HID (±127) enviado de uma vez, verifica a posição UMA vez,
+    corrige se precisar e clica
+    before: comandos executados antes do movimento na mesma rajada (ex: ["KT \\", "S 200"])
+    """
     print(f"[MOUSE] Movendo para ({x},{y})")
     
-    max_attempts = 150  # Mais tentativas
-    tolerance = 0  # Tolerância zero para máxima precisão
-    
-    # Primeiro movimento: vai diretamente para próximo da posição
-    curr_x, curr_y = pg.position()
-    dx = x - curr_x
-    dy = y - curr_y
-    
-    # Se a distância é grande, faz um movimento inicial grande
-    if abs(dx) > 300 or abs(dy) > 300:
-        large_dx = max(-127, min(127, dx // 2))
-        large_dy = max(-127, min(127, dy // 2))
-        send_command(ser, f"R {large_dx} {large_dy}")
-        time.sleep(0.1)
-    
-    # Agora faz movimentos precisos
-    for attempt in range(max_attempts):
+    if ser.supports("ABS"):
+        # Ponteiro absoluto: um único MA, qualquer que seja a distância
+        moved = ser.move_abs(x, y, pg.size(), before=before)
+    else:
         curr_x, curr_y = pg.position()
-        dx = x - curr_x
-        dy = y - curr_y
-        
-        # Verifica se chegou na posição exata
-        if dx == 0 and dy == 0:
-            print(f"[MOUSE] Posição EXATA alcançada: ({curr_x},{curr_y})")
-            break
-        
-        # Calcula movimento necessário
-        if abs(dx) <= 127 and abs(dy) <= 127:
-            # Movimento direto se está dentro do limite
-            if not send_command(ser, f"R {dx} {dy}"):
-                print("[MOUSE] Erro ao mover")
-                return False
-            time.sleep(0.05)
-        else:
-            # Movimento em passos
-            step_x = max(-127, min(127, dx))
-            step_y = max(-127, min(127, dy))
-            if not send_command(ser, f"R {step_x} {step_y}"):
-                print("[MOUSE] Erro ao mover")
-                return False
-            time.sleep(0.03)
+        moved = ser.move_relative(x - curr_x, y - curr_y, before=before)
+    if not moved:
+        print("[MOUSE] Erro ao mover")
+        return False
+    time.sleep(MOVE_SETTLE)
     
-    # Verificação final crítica
-    time.sleep(0.15)
+    # Verificação única: corrige o resíduo (arredondamento/aceleração) em uma rajada
     final_x, final_y = pg.position()
     error = abs(x - final_x) + abs(y - final_y)
+    if error > 0:
+        print(f"[MOUSE] Erro de {error}px, fazendo correção...")
+        ser.move_relative(x - final_x, y - final_y)
+        time.sleep(MOVE_SETTLE)
+        final_x, final_y = pg.position()
+        error = abs(x - final_x) + abs(y - final_y)
     print(f"[MOUSE] Final: ({final_x},{final_y}) - Erro: {error}px")
     
-    # Se o erro é muito grande, tenta uma correção final
-    if error > 5:
-        print(f"[MOUSE] Erro alto ({error}px), fazendo correção final...")
-        correction_dx = x - final_x
-        correction_dy = y - final_y
-        if abs(correction_dx) <= 127 and abs(correction_dy) <= 127:
-            send_command(ser, f"R {correction_dx} {correction_dy}")
-            time.sleep(0.1)
-    
-    # Pausa crítica antes do clique
-    time.sleep(0.3)
-    
     # Executa clique
     if right_click:
         result = send_command(ser, "CR")
         print("[MOUSE] Clique direito executado")
     else:
-        result = send_command(ser, "C")
+        result = send_command(ser, "CL")
         print("[MOUSE] Clique esquerdo executado")
     
     time.sleep(0.3)  # Pausa após clicar
@@ -110,7 +76,7 @@ def click_at_position(ser, x, y, right_click=False):
 
 def press_space(ser):
     print("[TECLADO] Pressionando ESPACO")
-    return send_command(ser, "KE SPACE")
+    return send_command(ser, "K SPACE")
 
 def press_p(ser):
     print("[TECLADO] Pressionando P")
@@ -118,7 +84,7 @@ def press_p(ser):
 
 def press_backslash(ser):
     print("[TECLADO] Pressionando \\")
-    return send_command(ser, "KE \\")
+    return send_command(ser, "KT \\")
 
 def locate_image(image_path, timeout=LOCATE_TIMEOUT, confidence=CONFIDENCE):
     filename = os.path.basename(image_path)
@@ -426,7 +392,12 @@ def main():
             wait_exact(2.0)
             ser.reset_input_buffer()
             print("[OK] Arduino pronto!\n")
-            main_loop(ser)
+            link = HidClient(SerialLink(ser))
+            link.discover()
+            try:
+                main_loop(link)
+            finally:
+                link.close()
     except serial.SerialException as e:
         print(f"[ERRO] Serial: {e}")
     except KeyboardInterrupt:
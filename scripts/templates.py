@@ -0,0 +1,84 @@
+# -*- coding: utf-8 -*-
+"""
+Templates - Registro de imagens pré-carregadas
+Lê e decodifica TODOS os PNGs de enemy/, loot/, flags/ e healings/ uma única vez
+na inicialização. Os detectores buscam os templates pelo nome, sem acesso a disco
+nem decodificação de PNG dentro do loop de 50ms.
+"""
+
+import os
+import cv2
+
+ASSETS_DIR = os.path.abspath(os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+TEMPLATE_DIRS = ("enemy", "loot", "flags", "healings")
+SCALES = (2, 4)  # Versões reduzidas (1/2 e 1/4) para buscas em baixa resolução
+
+
+class Template:
+    """Template já decodificado: BGR, cinza e versões reduzidas"""
+
+    def __init__(self, name, path, image):
+        self.name = name
+        self.path = path
+        self.image = image
+        self.gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
+        self.height, self.width = image.shape[:2]
+        self.scaled = {}
+        self.scaled_gray = {}
+        for factor in SCALES:
+            size = (max(1, self.width // factor), max(1, self.height // factor))
+            self.scaled[factor] = cv2.resize(image, size, interpolation=cv2.INTER_AREA)
+            self.scaled_gray[factor] = cv2.resize(self.gray, size, interpolation=cv2.INTER_AREA)
+
+    def __repr__(self):
+        return f"Template({self.name!r}, {self.width}x{self.height})"
+
+
+class TemplateRegistry:
+    """
+    Carrega os templates uma vez e entrega por nome
+    Nome = caminho relativo sem extensão, ex: "enemy/witch", "flags/amazon_camp/am_a1"
+    """
+
+    def __init__(self, assets_dir=ASSETS_DIR):
+        self.assets_dir = assets_dir
+        self.templates = {}
+
+    def load(self, dirs=TEMPLATE_DIRS):
+        for folder in dirs:
+            root_dir = os.path.join(self.assets_dir, folder)
+            for root, _, files in os.walk(root_dir):
+                for filename in sorted(files):
+                    if not filename.lower().endswith(".png"):
+                        continue
+                    path = os.path.join(root, filename)
+                    image = cv2.imread(path, cv2.IMREAD_COLOR)
+                    if image is None:
+                        print(f"[TEMPLATES] ⚠️ Falha ao decodificar {path}")
+                        continue
+                    rel = os.path.relpath(path, self.assets_dir)
+                    name = os.path.splitext(rel)[0].replace(os.sep, "/")
+                    self.templates[name] = Template(name, path, image)
+        print(f"[TEMPLATES] {len(self.templates)} template(s) pré-carregado(s) de {self.assets_dir}")
+        return self
+
+    def get(self, name):
+        """Retorna o Template ou None se não existir"""
+        return self.templates.get(name)
+
+    def __contains__(self, name):
+        return name in self.templates
+
+    def __getitem__(self, name):
+        return self.templates[name]
+
+    def group(self, prefix, names=None):
+        """
+        Dicionário {nome_curto: Template} de uma pasta
+        Ex: group("enemy", ["witch", "amazon"]) -> {"witch": ..., "amazon": ...}
+        """
+        if names is None:
+            prefix_len = len(prefix) + 1
+            return {name[prefix_len:]: t for name, t in self.templates.items()
+                    if name.startswith(prefix + "/") and "/" not in name[prefix_len:]}
+        return {n: self.templates[f"{prefix}/{n}"] for n in names if f"{prefix}/{n}" in self.templates}
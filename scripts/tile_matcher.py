@@ -0,0 +1,127 @@
+# -*- coding: utf-8 -*-
+"""
+Tile Matcher - Template matching incremental por tiles sujos
+Guarda o mapa de correlação da tela inteira de cada template e um crc32 por
+tile do frame. A cada frame novo só os tiles cujo hash mudou são refeitos -
+mais a margem do tamanho do template, já que um match que encosta no tile
+também muda. O custo em regime passa a acompanhar o quanto a tela mudou,
+não a resolução.
+As áreas sujas também podem vir prontas (regions, ex: MotionGate), sem hash.
+"""
+
+import zlib
+import cv2
+import numpy as np
+from vision import Hit, load_template
+
+TILE_SIZE = 128  # Lado do tile (px) do hash
+
+
+class TiledMatcher:
+    """Mapas de correlação em cache para um grupo fixo de templates (inimigos, loot)"""
+
+    def __init__(self, templates, tile=TILE_SIZE):
+        self.templates = dict(templates)
+        self.tile = tile
+        self.hashes = None
+        self.shape = None
+        self.maps = {}
+        self.recomputed = 0  # Tiles recalculados
+        self.reused = 0      # Tiles servidos do cache
+
+    def _hash_tiles(self, image):
+        t = self.tile
+        rows, cols = -(-image.shape[0] // t), -(-image.shape[1] // t)
+        hashes = np.empty((rows, cols), dtype=np.uint32)
+        for row in range(rows):
+            band = image[row * t:(row + 1) * t]
+            for col in range(cols):
+                hashes[row, col] = zlib.crc32(np.ascontiguousarray(band[:, col * t:(col + 1) * t]))
+        return hashes
+
+    def _region_tiles(self, regions, shape):
+        """Máscara dos tiles que encostam em alguma região (left, top, width, height)"""
+        t = self.tile
+        dirty = np.zeros((-(-shape[0] // t), -(-shape[1] // t)), dtype=np.uint8)
+        for left, top, width, height in regions:
+            dirty[top // t:-(-(top + height) // t), left // t:-(-(left + width) // t)] = 1
+        return dirty
+
+    def update(self, frame, regions=None):
+        """
+        Atualiza os mapas para o frame; retorna quantos tiles foram recalculados
+        regions: áreas que mudaram, já conhecidas (ex: MotionGate) - dispensa o hash
+        None = descobre pelo crc32 dos tiles (comparado com o último hash calculado,
+        então pega também o que mudou nos frames atualizados por regions)
+        """
+        image = frame.image
+        if self.shape != image.shape:
+            # Primeiro frame (ou resolução nova): mapas da tela inteira
+            hashes = self._hash_tiles(image)
+            self.shape, self.hashes = image.shape, hashes
+            self.maps = {}
+            for name, template in self.templates.items():
+                needle = load_template(template)
+                if needle is not None and needle.shape[0] <= image.shape[0] and needle.shape[1] <= image.shape[1]:
+                    self.maps[name] = cv2.matchTemplate(image, needle, cv2.TM_CCOEFF_NORMED)
+            self.recomputed += hashes.size
+            return hashes.size
+
+        if regions is None:
+            hashes = self._hash_tiles(image)
+            dirty = (hashes != self.hashes).astype(np.uint8)
+            self.hashes = hashes
+        else:
+            dirty = self._region_tiles(regions, image.shape)
+        count = int(dirty.sum())
+        self.recomputed += count
+        self.reused += dirty.size - count
+        if not count:
+            return 0
+
+        # Tiles sujos vizinhos viram uma caixa só; cada caixa refaz, em cada mapa,
+        # as posições cujo recorte do template encosta nela
+        _, _, boxes, _ = cv2.connectedComponentsWithStats(dirty, connectivity=8)
+        for x, y, w, h, _ in boxes[1:].tolist():
+            px0, py0 = x * self.tile, y * self.tile
+            px1 = min(image.shape[1], (x + w) * self.tile)
+            py1 = min(image.shape[0], (y + h) * self.tile)
+            for name, scores in self.maps.items():
+                needle = load_template(self.templates[name])
+                th, tw = needle.shape[:2]
+                sx0, sy0 = max(0, px0 - tw + 1), max(0, py0 - th + 1)
+                sx1, sy1 = min(scores.shape[1], px1), min(scores.shape[0], py1)
+                if sx1 <= sx0 or sy1 <= sy0:
+                    continue
+                patch = image[sy0:sy1 + th - 1, sx0:sx1 + tw - 1]
+                scores[sy0:sy1, sx0:sx1] = cv2.matchTemplate(patch, needle, cv2.TM_CCOEFF_NORMED)
+        return count
+
+    def result(self, name):
+        """Mesmo formato do vision.match_template: (mapa, 0, 0, altura, largura) ou None"""
+        scores = self.maps.get(name)
+        if scores is None:
+            return None
+        h, w = load_template(self.templates[name]).shape[:2]
+        return scores, 0, 0, h, w
+
+    def hits(self, confidence=0.8, priorities=None, names=None):
+        """Melhor match de cada template (mapas em cache) com score >= confidence, maior prioridade primeiro"""
+        priorities = priorities or {}
+        hits = []
+        for name in names or self.maps:
+            result = self.result(name)
+            if result is None:
+                continue
+            scores, _, _, h, w = result
+            _, max_val, _, max_loc = cv2.minMaxLoc(scores)
+            if max_val >= confidence:
+                hits.append(Hit(name, float(max_val), (max_loc[0] + w // 2, max_loc[1] + h // 2),
+                                priorities.get(name, 0)))
+        hits.sort(key=lambda hit: (hit.priority, hit.score), reverse=True)
+        return hits
+
+    def stats(self):
+        total = self.recomputed + self.reused
+        rate = 100.0 * self.reused / total if total else 0.0
+        return f"{self.reused}/{total} tiles reaproveitados do cache ({rate:.0f}%)"
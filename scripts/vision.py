@@ -0,0 +1,292 @@
+# -*- coding: utf-8 -*-
+"""
+Vision - Template matching sobre um frame já capturado
+Mesmo algoritmo do pyautogui (cv2.TM_CCOEFF_NORMED), mas sem screenshot próprio:
+quem chama passa o Frame do tick atual (ver frame_source.py).
+"""
+
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
+import cv2
+import numpy as np
+
+
+# Templates lidos por caminho (bots que ainda não usam o registro): 1 leitura por arquivo
+_PATH_CACHE = {}
+_GRAY_CACHE = {}
+_SCALED_CACHE = {}
+
+# Pirâmide (pyramid_match): candidatos no frame reduzido, confirmação em janelas
+PYRAMID_FACTORS = (4, 2)   # Reduções tentadas, da maior para a menor
+PYRAMID_MIN_SIDE = 5       # Menor lado (px) do template reduzido; abaixo disso, resolução cheia
+PYRAMID_CANDIDATES = 5     # Picos do mapa reduzido confirmados em resolução cheia
+
+# Resultado do match_many: nome do template, score, centro (x, y) e prioridade
+Hit = namedtuple("Hit", "name score pos priority")
+
+# Pools de threads do match_many (o cv2.matchTemplate solta o GIL)
+_POOLS = {}
+
+
+def load_template(template):
+    """Aceita Template do registro (templates.py), array BGR ou caminho do PNG"""
+    if hasattr(template, "image"):
+        return template.image
+    if isinstance(template, np.ndarray):
+        return template
+    if template not in _PATH_CACHE:
+        _PATH_CACHE[template] = cv2.imread(template, cv2.IMREAD_COLOR)
+    return _PATH_CACHE[template]
+
+
+def load_gray(template):
+    """Versão em tons de cinza do template (pré-calculada no registro ou em cache)"""
+    if hasattr(template, "gray"):
+        return template.gray
+    if isinstance(template, np.ndarray):
+        return cv2.cvtColor(template, cv2.COLOR_BGR2GRAY)
+    if template not in _GRAY_CACHE:
+        image = load_template(template)
+        _GRAY_CACHE[template] = None if image is None else cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
+    return _GRAY_CACHE[template]
+
+
+def _scaled_needle(template, factor, grayscale=False):
+    """Template reduzido 1/factor (pré-calculado no registro ou em cache)"""
+    scaled = getattr(template, "scaled_gray" if grayscale else "scaled", {})
+    if factor in scaled:
+        return scaled[factor]
+    key = (template, factor, grayscale) if isinstance(template, str) else None
+    if key in _SCALED_CACHE:
+        return _SCALED_CACHE[key]
+    needle = load_gray(template) if grayscale else load_template(template)
+    h, w = needle.shape[:2]
+    small = cv2.resize(needle, (max(1, w // factor), max(1, h // factor)), interpolation=cv2.INTER_AREA)
+    if key is not None:
+        _SCALED_CACHE[key] = small
+    return small
+
+
+def _haystack(frame, region, grayscale=False):
+    """Retorna (imagem, offset_x, offset_y) da área de busca"""
+    image = frame.gray if grayscale else frame.image
+    if region is None:
+        return image, 0, 0
+    left, top = max(0, region[0]), max(0, region[1])
+    return image[top:top + region[3], left:left + region[2]], left, top
+
+
+def match_template(template, frame, region=None, grayscale=False):
+    """
+    Calcula o mapa de correlação do template no frame
+    Retorna (mapa, offset_x, offset_y, altura, largura) ou None se não couber
+    grayscale=True usa o cinza do frame (convertido uma vez) e do template
+    """
+    needle = load_gray(template) if grayscale else load_template(template)
+    if needle is None:
+        return None
+    haystack, off_x, off_y = _haystack(frame, region, grayscale)
+    h, w = needle.shape[:2]
+    if haystack.shape[0] < h or haystack.shape[1] < w:
+        return None
+    scores = cv2.matchTemplate(haystack, needle, cv2.TM_CCOEFF_NORMED)
+    return scores, off_x, off_y, h, w
+
+
+def best_match(template, frame, region=None, grayscale=False):
+    """
+    Melhor posição do template: ((x, y) do centro, score)
+    Retorna (None, -1.0) se o template não couber na área
+    """
+    result = match_template(template, frame, region, grayscale)
+    if result is None:
+        return None, -1.0
+    scores, off_x, off_y, h, w = result
+    _, max_val, _, max_loc = cv2.minMaxLoc(scores)
+    return (off_x + max_loc[0] + w // 2, off_y + max_loc[1] + h // 2), float(max_val)
+
+
+def _pyramid_factor(height, width):
+    for factor in PYRAMID_FACTORS:
+        if min(height, width) // factor >= PYRAMID_MIN_SIDE:
+            return factor
+    return None
+
+
+def pyramid_match(template, frame, region=None, grayscale=False, candidates=PYRAMID_CANDIDATES):
+    """
+    Mesmo contrato do best_match, em dois níveis: procura os melhores picos
+    no frame reduzido (2x/4x) e confirma cada um em resolução cheia numa
+    janela pequena - a posição retornada é a do match em resolução cheia
+    Templates pequenos demais para reduzir vão direto para best_match
+    """
+    needle = load_gray(template) if grayscale else load_template(template)
+    if needle is None:
+        return None, -1.0
+    h, w = needle.shape[:2]
+    factor = _pyramid_factor(h, w)
+    if factor is None:
+        return best_match(template, frame, region, grayscale)
+
+    left, top, width, height = region or (0, 0, frame.width, frame.height)
+    left, top = max(0, left), max(0, top)
+    right, bottom = min(frame.width, left + width), min(frame.height, top + height)
+    small = _scaled_needle(template, factor, grayscale)
+    haystack = frame.scaled(factor, grayscale)[top // factor:bottom // factor, left // factor:right // factor]
+    sh, sw = small.shape[:2]
+    if haystack.shape[0] < sh or haystack.shape[1] < sw:
+        return best_match(template, frame, region, grayscale)
+    scores = cv2.matchTemplate(haystack, small, cv2.TM_CCOEFF_NORMED)
+
+    pad = 2 * factor
+    best_pos, best_score = None, -1.0
+    for _ in range(candidates):
+        _, max_val, _, (cx, cy) = cv2.minMaxLoc(scores)
+        if max_val < -1.0:
+            break  # Mapa já esgotado
+        x = (left // factor + cx) * factor
+        y = (top // factor + cy) * factor
+        x0, y0 = max(left, x - pad), max(top, y - pad)
+        x1, y1 = min(right, x + w + pad), min(bottom, y + h + pad)
+        pos, score = best_match(template, frame, (x0, y0, x1 - x0, y1 - y0), grayscale)
+        if score > best_score:
+            best_pos, best_score = pos, score
+        # Apaga o pico (e a vizinhança do tamanho do template) para achar o próximo
+        scores[max(0, cy - sh // 2):cy + sh // 2 + 1, max(0, cx - sw // 2):cx + sw // 2 + 1] = -2.0
+    return best_pos, best_score
+
+
+def locate_center(template, frame, confidence=0.8, region=None):
+    """
+    Equivalente a pg.locateCenterOnScreen, mas sobre o frame do tick
+    Retorna (x, y) do melhor match com score >= confidence, ou None
+    """
+    pos, score = best_match(template, frame, region)
+    if score < confidence:
+        return None
+    return pos
+
+
+def ladder_rung(score, ladder):
+    """Maior confiança da escada atingida pelo score, ou None"""
+    for confidence in sorted(ladder, reverse=True):
+        if score >= confidence:
+            return confidence
+    return None
+
+
+def locate_cascade(template, frame, ladder=(0.8, 0.7, 0.6), region=None, pyramid=False):
+    """
+    Escada de confiança com UM mapa de correlação: o melhor match é o mesmo
+    para qualquer limiar, só muda se ele é aceito
+    Retorna ((x, y), confiança atingida) ou (None, None)
+    """
+    match = pyramid_match if pyramid else best_match
+    pos, score = match(template, frame, region)
+    rung = ladder_rung(score, ladder)
+    if rung is None:
+        return None, None
+    return pos, rung
+
+
+def _pool(workers):
+    if workers not in _POOLS:
+        _POOLS[workers] = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="match")
+    return _POOLS[workers]
+
+
+def priority_groups(templates, priorities):
+    """Agrupa {nome: template} por prioridade, da maior para a menor (modo early-exit)"""
+    levels = {}
+    for name, template in templates.items():
+        levels.setdefault(priorities.get(name, 0), {})[name] = template
+    return [levels[priority] for priority in sorted(levels, reverse=True)]
+
+
+def match_many(templates, frame, confidence=0.8, priorities=None, regions=None,
+               grayscale=False, workers=0, pyramid=False):
+    """
+    Vários templates sobre o MESMO frame numa chamada
+    templates: {nome: template}; priorities/regions: {nome: valor} opcionais
+    workers > 1 espalha os templates por threads; pyramid=True usa pyramid_match
+    Retorna todos os Hit com score >= confidence, maior prioridade (e score) primeiro
+    """
+    priorities = priorities or {}
+    regions = regions or {}
+    if grayscale:
+        frame.gray  # Converte antes de distribuir: uma conversão para todos os templates
+
+    match = pyramid_match if pyramid else best_match
+
+    def run(item):
+        name, template = item
+        pos, score = match(template, frame, regions.get(name), grayscale)
+        return Hit(name, score, pos, priorities.get(name, 0))
+
+    items = list(templates.items())
+    if workers > 1 and len(items) > 1:
+        results = list(_pool(workers).map(run, items))
+    else:
+        results = [run(item) for item in items]
+    hits = [hit for hit in results if hit.pos is not None and hit.score >= confidence]
+    hits.sort(key=lambda hit: (hit.priority, hit.score), reverse=True)
+    return hits
+
+
+def locate_peaks(templates, frame, confidence=0.8, min_distance=50, region=None, results=None):
+    """
+    Um ponto por objeto para vários templates parecidos (ex: 3 variações do círculo de loot)
+    Os mapas de correlação são alinhados pelo CENTRO do template e fundidos
+    (máximo por pixel); ficam os máximos locais (cv2.dilate) >= confidence,
+    separados por pelo menos min_distance px, maior score primeiro
+    results: mapas já calculados (ex: TiledMatcher.result), no formato do match_template
+    Retorna lista de Hit (prioridade 0)
+    """
+    haystack, off_x, off_y = _haystack(frame, region)
+    merged = np.full(haystack.shape[:2], -1.0, dtype=np.float32)
+    owner = np.full(haystack.shape[:2], -1, dtype=np.int16)
+    names = list(templates)
+    for index, name in enumerate(names):
+        result = results(name) if results else match_template(templates[name], frame, region)
+        if result is None:
+            continue
+        scores, _, _, h, w = result
+        y0, x0 = h // 2, w // 2
+        window = merged[y0:y0 + scores.shape[0], x0:x0 + scores.shape[1]]
+        better = scores > window
+        window[better] = scores[better]
+        owner[y0:y0 + scores.shape[0], x0:x0 + scores.shape[1]][better] = index
+
+    # Máximos locais: pixel igual ao máximo da vizinhança e acima do limiar
+    # (kernel retangular = separável, ~25x mais rápido que elipse no full-HD)
+    kernel = cv2.getStructuringElement(cv2.MORPH_RECT, (min_distance, min_distance))
+    peaks = (merged >= cv2.dilate(merged, kernel)) & (merged >= confidence)
+    ys, xs = np.nonzero(peaks)
+    if len(xs) == 0:
+        return []
+    values = merged[ys, xs]
+    order = np.argsort(-values)
+    ys, xs, values = ys[order], xs[order], values[order]
+
+    # Platôs e picos vizinhos: supressão gulosa com distância ao quadrado
+    keep = np.ones(len(xs), dtype=bool)
+    limit = min_distance * min_distance
+    for i in range(len(xs)):
+        if keep[i]:
+            close = (xs[i + 1:] - xs[i]) ** 2 + (ys[i + 1:] - ys[i]) ** 2 < limit
+            keep[i + 1:][close] = False
+    return [Hit(names[owner[y, x]], float(v), (off_x + int(x), off_y + int(y)), 0)
+            for y, x, v in zip(ys[keep], xs[keep], values[keep])]
+
+
+def locate_all(template, frame, confidence=0.8, region=None):
+    """
+    Equivalente a pg.locateAllOnScreen sobre o frame do tick
+    Retorna lista de caixas (left, top, width, height) com score >= confidence
+    """
+    result = match_template(template, frame, region)
+    if result is None:
+        return []
+    scores, off_x, off_y, h, w = result
+    ys, xs = np.where(scores >= confidence)
+    return [(off_x + int(x), off_y + int(y), w, h) for y, x in zip(ys, xs)]